@@ -0,0 +1,61 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures the overhead of calls made through a circuit breaker: a function
+with positional parameters only and one with a default value, decorated by
+the circuit breaker, and a function passed to ``CircuitBreaker.call``.
+
+Usage::
+
+    $ python benchmarks/decorator.py [calls]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pybreaker import CircuitBreaker
+
+
+def backend(key, value):
+    return value
+
+
+def run(func, calls):
+    """
+    Returns the number of calls per second made to `func`.
+    """
+    start = time.time()
+    for n in range(calls):
+        func(n, n)
+    return calls / (time.time() - start)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    breaker = CircuitBreaker()
+
+    @breaker
+    def positional(key, value):
+        return backend(key, value)
+
+    @breaker
+    def defaults(key, value=None):
+        return backend(key, value)
+
+    def call(key, value):
+        return breaker.call(backend, key, value)
+
+    modes = (
+        ('positional', positional),
+        ('defaults', defaults),
+        ('call', call),
+    )
+    for name, func in modes:
+        print('%-10s %12d calls/s' % (name, run(func, calls)))
+
+
+if __name__ == '__main__':
+    main()
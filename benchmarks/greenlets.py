@@ -0,0 +1,83 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures how many greenlets can share one circuit breaker under gevent: each
+greenlet makes one call to a local fake server that answers after a delay,
+through the same circuit breaker with a cooperative lock. If calls queued
+behind each other, the run would take about `greenlets * delay` seconds; as
+they do not, it takes about `delay`.
+
+Requires gevent; skipped if it is not installed.
+
+Usage::
+
+    $ python benchmarks/greenlets.py [greenlets] [delay]
+"""
+
+import os
+import sys
+import time
+
+try:
+    from gevent import monkey
+except ImportError:
+    print('gevent is not installed, skipping')
+    sys.exit(0)
+monkey.patch_all()
+
+import gevent
+import gevent.lock
+import gevent.pool
+import gevent.server
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pybreaker import CircuitBreaker
+
+
+def serve(delay):
+    """
+    Starts a fake slow server on a local port and returns its address.
+    """
+    def handle(sock, address):
+        sock.recv(16)
+        gevent.sleep(delay)
+        sock.sendall(b'ok')
+        sock.close()
+
+    server = gevent.server.StreamServer(('127.0.0.1', 0), handle,
+                                        spawn=gevent.pool.Pool(None),
+                                        backlog=4096)
+    server.start()
+    return server.address
+
+
+def main():
+    greenlets = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    address = serve(delay)
+    breaker = CircuitBreaker(fail_max=greenlets,
+                             lock_factory=gevent.lock.RLock)
+
+    @breaker
+    def fetch():
+        sock = socket.create_connection(address)
+        try:
+            sock.sendall(b'get')
+            return sock.recv(16)
+        finally:
+            sock.close()
+
+    start = time.time()
+    jobs = [gevent.spawn(fetch) for n in range(greenlets)]
+    gevent.joinall(jobs)
+    elapsed = time.time() - start
+
+    succeeded = sum(1 for job in jobs if job.successful())
+    print('%d greenlets, %d succeeded in %.3fs (%.3fs if serialized)' % (
+        greenlets, succeeded, elapsed, greenlets * delay))
+
+
+if __name__ == '__main__':
+    main()
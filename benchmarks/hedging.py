@@ -0,0 +1,67 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures the tail latency of calls to a synthetic backend that is usually
+fast but occasionally very slow, with and without hedging the calls across
+two replicas with ``HedgedGroup``.
+
+Usage::
+
+    $ python benchmarks/hedging.py [calls]
+
+Requires ``concurrent.futures`` (Python 3, or the 'futures' backport).
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pybreaker import CircuitBreaker, HedgedGroup
+
+FAST, SLOW, SLOW_RATIO = 0.002, 0.1, 0.05
+
+
+def backend(target):
+    """
+    Synthetic backend: 5% of the calls take 50 times longer than the others.
+    """
+    time.sleep(SLOW if random.random() < SLOW_RATIO else FAST)
+    return target
+
+
+def measure(call, calls):
+    """
+    Returns the sorted latencies, in milliseconds, of `calls` calls.
+    """
+    latencies = []
+    for n in range(calls):
+        start = time.time()
+        call()
+        latencies.append((time.time() - start) * 1000)
+    return sorted(latencies)
+
+
+def report(name, latencies):
+    def at(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    print('%-10s p50=%7.2fms p95=%7.2fms p99=%7.2fms max=%7.2fms' % (
+        name, at(0.5), at(0.95), at(0.99), latencies[-1]))
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    breaker = CircuitBreaker()
+    report('single', measure(lambda: breaker.call(backend, 'a'), calls))
+
+    group = HedgedGroup([('a', CircuitBreaker()), ('b', CircuitBreaker())],
+                        percentile=90)
+    report('hedged', measure(lambda: group.call(backend), calls))
+    print('hedge delay: %.2fms' % (group.hedge_delay * 1000))
+
+
+if __name__ == '__main__':
+    main()
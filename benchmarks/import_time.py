@@ -0,0 +1,62 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures how long ``import pybreaker`` takes in a fresh interpreter, alone
+and followed by the lookup of an optional subsystem, and lists the modules
+each of them loads.
+
+Usage::
+
+    $ python benchmarks/import_time.py [runs]
+
+Each run starts a new interpreter; the reported times are the medians. The
+first run is discarded so that bytecode caches are warm.
+"""
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+SCRIPT = """
+import sys, time
+before = set(sys.modules)
+start = time.time()
+%s
+elapsed = time.time() - start
+print(elapsed)
+print(' '.join(sorted(set(sys.modules) - before)))
+"""
+
+CASES = (
+    ('core', 'import pybreaker'),
+    ('retry', 'import pybreaker; pybreaker.RetryPolicy'),
+    ('everything', 'from pybreaker import *'),
+)
+
+
+def run(code, runs):
+    """
+    Returns the median import time, in milliseconds, and the modules loaded.
+    """
+    times = []
+    for n in range(runs + 1):
+        output = subprocess.check_output(
+            [sys.executable, '-c', SCRIPT % code], cwd=SRC)
+        elapsed, modules = output.decode().split('\n', 1)
+        times.append(float(elapsed) * 1000)
+    times = sorted(times[1:])
+    return times[len(times) // 2], modules.split()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for name, code in CASES:
+        elapsed, modules = run(code, runs)
+        print('%-10s %7.2fms %3d modules' % (name, elapsed, len(modules)))
+        print('    %s' % ' '.join(modules))
+
+
+if __name__ == '__main__':
+    main()
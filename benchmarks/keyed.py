@@ -0,0 +1,62 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures the memory taken by the per-key state of ``KeyedCircuitBreaker``,
+compared with keeping one ``CircuitBreaker`` per key, and the cost of a call
+once all the keys are tracked.
+
+Usage::
+
+    $ python benchmarks/keyed.py [keys]
+
+Requires ``tracemalloc`` (Python 3.4+).
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pybreaker import CircuitBreaker, KeyedCircuitBreaker
+
+
+def measure(build):
+    """
+    Returns the object built by `build` and the memory it allocated, in MB.
+    """
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size / 1024.0 / 1024.0
+
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    def keyed():
+        breaker = KeyedCircuitBreaker(lambda key: key, max_keys=keys)
+        for key in range(keys):
+            breaker.call(int, key)
+        return breaker
+
+    def objects():
+        return dict((key, CircuitBreaker()) for key in range(keys))
+
+    breaker, size = measure(keyed)
+    print('%-20s %8.1fMB for %d keys' % ('KeyedCircuitBreaker', size, keys))
+    print('%-20s %8.1fMB for %d keys' % ('CircuitBreaker/key',
+                                         measure(objects)[1], keys))
+
+    start = time.time()
+    for key in range(keys):
+        breaker.call(int, key + keys)
+    elapsed = time.time() - start
+    print('%.2fus per call, evicting a key each time' % (
+        elapsed / keys * 1000000))
+
+
+if __name__ == '__main__':
+    main()
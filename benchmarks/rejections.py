@@ -0,0 +1,58 @@
+#-*- coding:utf-8 -*-
+
+"""
+Measures the throughput of calls rejected by an open circuit breaker, with
+the default rejections (a new ``CircuitBreakerError`` each time), in
+fast-fail mode (a reusable ``CircuitBreakerRejected``) and with a fallback
+value (no exception reaches the caller).
+
+Usage::
+
+    $ python benchmarks/rejections.py [calls]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pybreaker import CircuitBreaker, CircuitBreakerError
+
+
+def backend():
+    return True
+
+
+def run(breaker, calls):
+    """
+    Returns the number of rejected calls per second made through `breaker`.
+    """
+    @breaker
+    def guarded():
+        return backend()
+
+    start = time.time()
+    for n in range(calls):
+        try:
+            guarded()
+        except CircuitBreakerError:
+            pass
+    return calls / (time.time() - start)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    modes = (
+        ('default', {}),
+        ('fast_fail', {'fast_fail': True}),
+        ('fallback', {'fallback': None}),
+    )
+    for name, kwargs in modes:
+        breaker = CircuitBreaker(name='db', **kwargs)
+        breaker.open()
+        print('%-10s %12d rejected calls/s' % (name, run(breaker, calls)))
+
+
+if __name__ == '__main__':
+    main()
@@ -26,7 +26,7 @@ setup(
     author_email = 'daniel.tritone@gmail.com',
     url = 'http://github.com/danielfm/pybreaker',
     package_dir = {'':'src'},
-    py_modules = ['pybreaker'],
+    packages = ['pybreaker'],
     include_package_data = True,
     zip_safe = False,
     test_suite = 'tests'
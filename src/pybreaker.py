@@ -1,503 +0,0 @@
-#-*- coding:utf-8 -*-
-
-"""
-Threadsafe pure-Python implementation of the Circuit Breaker pattern, described
-by Michael T. Nygard in his book 'Release It!'.
-
-For more information on this and other patterns and best practices, buy the
-book at http://pragprog.com/titles/mnee/release-it
-"""
-
-import types
-from datetime import datetime, timedelta
-from functools import wraps
-
-import threading
-
-__all__ = ('CircuitBreaker', 'CircuitBreakerListener', 'CircuitBreakerError',)
-
-
-class CircuitBreaker(object):
-    """
-    More abstractly, circuit breakers exists to allow one subsystem to fail
-    without destroying the entire system.
-
-    This is done by wrapping dangerous operations (typically integration points)
-    with a component that can circumvent calls when the system is not healthy.
-
-    This pattern is described by Michael T. Nygard in his book 'Release It!'.
-    """
-
-    def __init__(self, fail_max=5, reset_timeout=60, exclude=None,
-            listeners=None):
-        """
-        Creates a new circuit breaker with the given parameters.
-        """
-        self._lock = threading.RLock()
-        self._fail_counter = 0
-        self._state = CircuitClosedState(self)
-
-        self._fail_max = fail_max
-        self._reset_timeout = reset_timeout
-
-        self._excluded_exceptions = list(exclude or [])
-        self._listeners = list(listeners or [])
-
-    @property
-    def fail_counter(self):
-        """
-        Returns the current number of consecutive failures.
-        """
-        return self._fail_counter
-
-    @property
-    def fail_max(self):
-        """
-        Returns the maximum number of failures tolerated before the circuit is
-        opened.
-        """
-        return self._fail_max
-
-    @fail_max.setter
-    def fail_max(self, number):
-        """
-        Sets the maximum `number` of failures tolerated before the circuit is
-        opened.
-        """
-        self._fail_max = number
-
-    @property
-    def reset_timeout(self):
-        """
-        Once this circuit breaker is opened, it should remain opened until the
-        timeout period, in seconds, elapses.
-        """
-        return self._reset_timeout
-
-    @reset_timeout.setter
-    def reset_timeout(self, timeout):
-        """
-        Sets the `timeout` period, in seconds, this circuit breaker should be
-        kept open.
-        """
-        self._reset_timeout = timeout
-
-    @property
-    def state(self):
-        """
-        Returns the current state of this circuit breaker.
-        """
-        return self._state
-
-    @property
-    def current_state(self):
-        """
-        Returns a string that identifies this circuit breaker's state, i.e.,
-        'closed', 'open', 'half-open'.
-        """
-        return self._state.name
-
-    @property
-    def excluded_exceptions(self):
-        """
-        Returns the list of excluded exceptions, e.g., exceptions that should
-        not be considered system errors by this circuit breaker.
-        """
-        return tuple(self._excluded_exceptions)
-
-    def add_excluded_exception(self, exception):
-        """
-        Adds an exception to the list of excluded exceptions.
-        """
-        with self._lock:
-            self._excluded_exceptions.append(exception)
-
-    def add_excluded_exceptions(self, *exceptions):
-        """
-        Adds exceptions to the list of excluded exceptions.
-        """
-        for exc in exceptions:
-            self.add_excluded_exception(exc)
-
-    def remove_excluded_exception(self, exception):
-        """
-        Removes an exception from the list of excluded exceptions.
-        """
-        with self._lock:
-            self._excluded_exceptions.remove(exception)
-
-    def _inc_counter(self):
-        """
-        Increments the counter of failed calls.
-        """
-        self._fail_counter += 1
-
-    def is_system_error(self, exception):
-        """
-        Returns whether the exception `exception` is considered a signal of
-        system malfunction. Business exceptions should not cause this circuit
-        breaker to open.
-        """
-        if exception is None:
-            return True
-        texc = type(exception)
-        for exc in self._excluded_exceptions:
-            if issubclass(texc, exc):
-                return False
-        return True
-
-    def call(self, func, *args, **kwargs):
-        """
-        Calls `func` with the given `args` and `kwargs` according to the rules
-        implemented by the current state of this circuit breaker.
-        """
-        with self._lock:
-
-            ret = None
-            self._state.before_call(func, *args, **kwargs)
-
-            for listener in self.listeners:
-                listener.before_call(self, func, *args, **kwargs)
-
-            try:
-                ret = func(*args, **kwargs)
-                if isinstance(ret, types.GeneratorType):
-                    return self._state.generator_call(ret)
-
-            except BaseException as e:
-                self._state._handle_error(e)
-            else:
-                self._state._handle_success()
-            return ret
-
-    def call_future(self, func, *args, **kwargs):
-        """
-        For functions which return a future rather than executing in line,
-        checks the rules implemented by the current state of the circuit breaker
-        and generates the future without checkout for success / error
-
-        If `func` is `None`, we are simply leveraging the circuit breaker gate
-        and we will not attempt to call func()
-        """
-        ret = None
-
-        self._state.before_call(func, *args, **kwargs)
-
-        for listener in self.listeners:
-            listener.before_call(self, func, *args, **kwargs)
-
-        if func:
-            ret = func(*args, **kwargs)
-            return ret
-        else:
-            return None
-
-    def handle_success(self):
-        """
-        Sends a success event to the circuit breaker.
-        """
-        self._state._handle_success()
-
-    def handle_error(self, e, reraise=False):
-        """
-        Sends an error event to the circuit breaker.
-        """
-        self._state._handle_error(e, reraise=reraise)
-
-    def handle_soft_success(self):
-        """
-        Soft success is a 'success' that isn't quite successful enough
-        for us to close the circuit breaker.
-        """
-        with self._lock:
-            if self.current_state == "closed":
-                return self.handle_success()
-            else:
-                return self.handle_error(None)
-
-    def open(self):
-        """
-        Opens the circuit, e.g., the following calls will immediately fail
-        until timeout elapses.
-        """
-        with self._lock:
-            self._state = CircuitOpenState(self, self._state, notify=True)
-
-    def half_open(self):
-        """
-        Half-opens the circuit, e.g. lets the following call pass through and
-        opens the circuit if the call fails (or closes the circuit if the call
-        succeeds).
-        """
-        with self._lock:
-            self._state = CircuitHalfOpenState(self, self._state, notify=True)
-
-    def close(self):
-        """
-        Closes the circuit, e.g. lets the following calls execute as usual.
-        """
-        with self._lock:
-            self._state = CircuitClosedState(self, self._state, notify=True)
-
-    def __call__(self, func):
-        """
-        Returns a wrapper that calls the function `func` according to the rules
-        implemented by the current state of this circuit breaker.
-        """
-        @wraps(func)
-        def _wrapper(*args, **kwargs):
-            return self.call(func, *args, **kwargs)
-        return _wrapper
-
-    @property
-    def listeners(self):
-        """
-        Returns the registered listeners as a tuple.
-        """
-        return tuple(self._listeners)
-
-    def add_listener(self, listener):
-        """
-        Registers a listener for this circuit breaker.
-        """
-        with self._lock:
-            self._listeners.append(listener)
-
-    def add_listeners(self, *listeners):
-        """
-        Registers listeners for this circuit breaker.
-        """
-        for listener in listeners:
-            self.add_listener(listener)
-    def remove_listener(self, listener):
-        """
-        Unregisters a listener of this circuit breaker.
-        """
-        with self._lock:
-            self._listeners.remove(listener)
-
-
-class CircuitBreakerListener(object):
-    """
-    Listener class used to plug code to a ``CircuitBreaker`` instance when
-    certain events happen.
-    """
-
-    def before_call(self, cb, func, *args, **kwargs):
-        """
-        This callback function is called before the circuit breaker `cb` calls
-        `fn`.
-        """
-        pass
-
-    def failure(self, cb, exc=None):
-        """
-        This callback function is called when a function called by the circuit
-        breaker `cb` fails. EXC can be null.
-        """
-        pass
-
-    def success(self, cb):
-        """
-        This callback function is called when a function called by the circuit
-        breaker `cb` succeeds.
-        """
-        pass
-
-    def state_change(self, cb, old_state, new_state):
-        """
-        This callback function is called when the state of the circuit breaker
-        `cb` state changes.
-        """
-        pass
-
-
-class CircuitBreakerState(object):
-    """
-    Implements the behavior needed by all circuit breaker states.
-    """
-
-    def __init__(self, cb, name):
-        """
-        Creates a new instance associated with the circuit breaker `cb` and
-        identified by `name`.
-        """
-        self._breaker = cb
-        self._name = name
-
-    @property
-    def name(self):
-        """
-        Returns a human friendly name that identifies this state.
-        """
-        return self._name
-
-    def _handle_error(self, exc=None, reraise=True):
-        """
-        Handles a failed call to the guarded operation.
-        """
-        if self._breaker.is_system_error(exc):
-            self._breaker._inc_counter()
-
-            try:
-                self.on_failure(exc)
-            except CircuitBreakerError:
-                if reraise:
-                    raise
-
-            for listener in self._breaker.listeners:
-                listener.failure(self._breaker, exc)
-        else:
-            self._handle_success()
-
-        if reraise and exc:
-            raise exc
-
-    def _handle_success(self):
-        """
-        Handles a successful call to the guarded operation.
-        """
-        self._breaker._fail_counter = 0
-        self.on_success()
-        for listener in self._breaker.listeners:
-            listener.success(self._breaker)
-
-    def generator_call(self, wrapped_generator):
-        try:
-            value = yield wrapped_generator.next()
-            while True:
-                value = yield wrapped_generator.send(value)
-        except StopIteration:
-            self._handle_success()
-            raise
-        except BaseException as e:
-            self._handle_error(e)
-
-    def before_call(self, func, *args, **kwargs):
-        """
-        Override this method to be notified before a call to the guarded
-        operation is attempted.
-        """
-        pass
-
-    def on_success(self):
-        """
-        Override this method to be notified when a call to the guarded
-        operation succeeds.
-        """
-        pass
-
-    def on_failure(self, exc=None):
-        """
-        Override this method to be notified when a call to the guarded
-        operation fails.
-        """
-        pass
-
-
-class CircuitClosedState(CircuitBreakerState):
-    """
-    In the normal "closed" state, the circuit breaker executes operations as
-    usual. If the call succeeds, nothing happens. If it fails, however, the
-    circuit breaker makes a note of the failure.
-
-    Once the number of failures exceeds a threshold, the circuit breaker trips
-    and "opens" the circuit.
-    """
-
-    def __init__(self, cb, prev_state=None, notify=False):
-        """
-        Moves the given circuit breaker `cb` to the "closed" state.
-        """
-        super(CircuitClosedState, self).__init__(cb, 'closed')
-        self._breaker._fail_counter = 0
-        if notify:
-            for listener in self._breaker.listeners:
-                listener.state_change(self._breaker, prev_state, self)
-
-    def on_failure(self, exc=None):
-        """
-        Moves the circuit breaker to the "open" state once the failures
-        threshold is reached.
-        """
-        if self._breaker._fail_counter >= self._breaker.fail_max:
-            self._breaker.open()
-
-            error_msg = 'Failures threshold reached, circuit breaker opened'
-            raise CircuitBreakerError(error_msg)
-
-
-class CircuitOpenState(CircuitBreakerState):
-    """
-    When the circuit is "open", calls to the circuit breaker fail immediately,
-    without any attempt to execute the real operation. This is indicated by the
-    ``CircuitBreakerError`` exception.
-
-    After a suitable amount of time, the circuit breaker decides that the
-    operation has a chance of succeeding, so it goes into the "half-open" state.
-    """
-
-    def __init__(self, cb, prev_state=None, notify=False):
-        """
-        Moves the given circuit breaker `cb` to the "open" state.
-        """
-        super(CircuitOpenState, self).__init__(cb, 'open')
-        self.opened_at = datetime.now()
-        if notify:
-            for listener in self._breaker.listeners:
-                listener.state_change(self._breaker, prev_state, self)
-
-
-
-    def before_call(self, func, *args, **kwargs):
-        """
-        After the timeout elapses, move the circuit breaker to the "half-open"
-        state; otherwise, raises ``CircuitBreakerError`` without any attempt
-        to execute the real operation.
-        """
-        timeout = timedelta(seconds=self._breaker.reset_timeout)
-        if datetime.now() < self.opened_at + timeout:
-            error_msg = 'Timeout not elapsed yet, circuit breaker still open'
-            raise CircuitBreakerError(error_msg)
-        else:
-            self._breaker.half_open()
-
-
-class CircuitHalfOpenState(CircuitBreakerState):
-    """
-    In the "half-open" state, the next call to the circuit breaker is allowed
-    to execute the dangerous operation. Should the call succeed, the circuit
-    breaker resets and returns to the "closed" state. If this trial call fails,
-    however, the circuit breaker returns to the "open" state until another
-    timeout elapses.
-    """
-
-    def __init__(self, cb, prev_state=None, notify=False):
-        """
-        Moves the given circuit breaker `cb` to the "half-open" state.
-        """
-        super(CircuitHalfOpenState, self).__init__(cb, 'half-open')
-        if notify:
-            for listener in self._breaker._listeners:
-                listener.state_change(self._breaker, prev_state, self)
-
-    def on_failure(self, exc=None):
-        """
-        Opens the circuit breaker.
-        """
-        self._breaker.open()
-        raise CircuitBreakerError('Trial call failed, circuit breaker opened')
-
-    def on_success(self):
-        """
-        Closes the circuit breaker.
-        """
-        self._breaker.close()
-
-
-class CircuitBreakerError(Exception):
-    """
-    When calls to a service fails because the circuit is open, this error is
-    raised to allow the caller to handle this type of exception differently.
-    """
-    pass
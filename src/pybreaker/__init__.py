@@ -0,0 +1,1627 @@
+#-*- coding:utf-8 -*-
+
+"""
+Threadsafe pure-Python implementation of the Circuit Breaker pattern, described
+by Michael T. Nygard in his book 'Release It!'.
+
+For more information on this and other patterns and best practices, buy the
+book at http://pragprog.com/titles/mnee/release-it
+"""
+
+import sys
+import types
+import time
+from functools import wraps
+
+import threading
+
+__all__ = ('CircuitBreaker', 'CircuitBreakerListener', 'CircuitBreakerError',
+           'CircuitBreakerRejected', 'ResultFailure', 'CircuitBreakerEvent',
+           'CircuitBreakerEventListener',
+           'EVENT_BEFORE_CALL', 'EVENT_SUCCESS', 'EVENT_FAILURE',
+           'EVENT_STATE_CHANGE', 'EVENT_LIMIT_CHANGE', 'EVENT_REJECTED',
+           'AdaptiveLimiter', 'AIMDLimiter', 'GradientLimiter',
+           'RetryBudget', 'RetryPolicy', 'HedgedGroup', 'CircuitBreakerPool',
+           'TracingListener', 'KeyedCircuitBreaker', 'CompositeCircuitBreaker',
+           'BreakerExecutor', 'HealthCheck', 'CallTimeoutError', 'TimeoutPool',
+           'TimerWheel', 'EventRing',)
+
+# Monotonic clock used to measure call durations; falls back to the wall clock
+# on Python versions that lack `time.monotonic`
+_clock = getattr(time, 'monotonic', time.time)
+
+# Kinds of events a circuit breaker emits; they match the names of the
+# ``CircuitBreakerListener`` callbacks
+EVENT_BEFORE_CALL = 'before_call'
+EVENT_SUCCESS = 'success'
+EVENT_FAILURE = 'failure'
+EVENT_STATE_CHANGE = 'state_change'
+EVENT_LIMIT_CHANGE = 'limit_change'
+EVENT_REJECTED = 'rejected'
+
+_EVENT_KINDS = (EVENT_BEFORE_CALL, EVENT_SUCCESS, EVENT_FAILURE,
+                EVENT_STATE_CHANGE, EVENT_LIMIT_CHANGE, EVENT_REJECTED)
+
+# Default of `CircuitBreaker.fallback`: rejected calls raise
+_NO_FALLBACK = object()
+
+# Code flags telling apart the kinds of functions decorated by a circuit breaker
+_CO_VARARGS = 0x04
+_CO_VARKEYWORDS = 0x08
+_CO_GENERATOR = 0x20
+_CO_COROUTINE = 0x80
+_CO_ASYNC_GENERATOR = 0x200
+
+# Share of the calls let through when a slow start begins
+_SLOW_START_RATIO = 0.1
+
+# Per-thread random number generators, so that probabilistic admission checks
+# neither share nor lock a single generator
+_thread_local = threading.local()
+
+
+def _random():
+    """
+    Returns a random float in [0.0, 1.0) from the calling thread's generator.
+    """
+    try:
+        rng = _thread_local.rng
+    except AttributeError:
+        import random
+        rng = _thread_local.rng = random.Random()
+    return rng.random()
+
+
+class CircuitBreaker(object):
+    """
+    More abstractly, circuit breakers exists to allow one subsystem to fail
+    without destroying the entire system.
+
+    This is done by wrapping dangerous operations (typically integration points)
+    with a component that can circumvent calls when the system is not healthy.
+
+    This pattern is described by Michael T. Nygard in his book 'Release It!'.
+    """
+
+    def __init__(self, fail_max=5, reset_timeout=60, exclude=None,
+            listeners=None, limiter=None, throttle_k=None, name=None,
+            slow_start=None, slow_start_mode='linear', fast_fail=False,
+            fallback=_NO_FALLBACK, failure_predicate=None, call_timeout=None,
+            timeout_pool=None, timer_wheel=None, lock_factory=None):
+        """
+        Creates a new circuit breaker with the given parameters. The optional
+        `name` identifies this circuit breaker in events.
+
+        If `limiter` is given (e.g. an ``AIMDLimiter``), the number of calls in
+        flight through this circuit breaker is adaptively limited, and calls
+        above the current limit are rejected with ``CircuitBreakerError``.
+
+        If `throttle_k` is given, the circuit breaker goes through the
+        "throttled" state before opening; see ``CircuitThrottledState``.
+
+        If `slow_start` is given, the traffic let through after the circuit
+        closes again following a successful trial call ramps up over that
+        many seconds; see ``CircuitClosedState``. `slow_start_mode` is either
+        'linear' or 'exponential'.
+
+        Rejected calls raise a new ``CircuitBreakerError`` by default. For
+        cheaper rejections, set `fast_fail` to raise a reusable
+        ``CircuitBreakerRejected`` instead, or give a `fallback` value to be
+        returned by rejected calls without raising.
+
+        Besides exception types, `exclude` accepts predicates that are given
+        the exception raised by a call and return whether to exclude it. Calls
+        that return instead of raising count as failures if
+        `failure_predicate` returns true for the result; it is either a
+        callable, or a dict that maps result types to callables.
+
+        If `call_timeout` is given, calls that take longer than that many
+        seconds fail with ``CallTimeoutError``. The guarded function then runs
+        on a worker thread of `timeout_pool`, by default the shared
+        ``TimeoutPool.default``; calls are rejected with
+        ``CircuitBreakerError`` while all of its workers are busy.
+
+        By default, an open circuit only moves to "half-open" when a call
+        arrives after the reset timeout. If `timer_wheel` is given, e.g.
+        ``TimerWheel.default``, the circuit is half-opened as soon as the
+        timeout elapses, and listeners are notified right away.
+
+        The state of this circuit breaker is guarded by a reentrant lock
+        created by `lock_factory`, by default ``threading.RLock``. The lock is
+        only held to admit calls and record their outcomes, and while the
+        listeners are notified, never during the guarded call. Under gevent or
+        eventlet without monkey-patching, pass a cooperative lock such as
+        ``gevent.lock.RLock``, so that a listener that yields to another
+        greenlet cannot block the whole event loop. Such a lock must not be
+        combined with `call_timeout`, `timer_wheel` or a ``HealthCheck``, which
+        call into the circuit breaker from OS threads of their own; with
+        monkey-patching, those threads are greenlets and the default lock is
+        cooperative already.
+        """
+        self._lock = (lock_factory or threading.RLock)()
+        self._name = name
+        self._parent = None
+        self._health_check = None
+        self._fail_counter = 0
+
+        self._fail_max = fail_max
+        self._reset_timeout = reset_timeout
+        self._limiter = limiter
+        self._throttle_k = throttle_k
+        self._slow_start = slow_start
+        self._slow_start_mode = slow_start_mode
+        self._call_timeout = call_timeout
+        self._timeout_pool = timeout_pool
+        self._timer_wheel = timer_wheel
+        self._fallback = fallback
+        self._rejected = CircuitBreakerRejected(name) if fast_fail else None
+        self._state = CircuitClosedState(self)
+
+        # Both are replaced rather than mutated, so they can be read without
+        # taking the lock
+        self._set_excluded_exceptions(tuple(exclude or ()))
+        self.failure_predicate = failure_predicate
+        self._listeners = tuple(listeners or ())
+        self._mux = _ListenerMux(self._listeners)
+
+    @property
+    def name(self):
+        """
+        Returns the name of this circuit breaker, or `None`.
+        """
+        return self._name
+
+    @property
+    def fail_counter(self):
+        """
+        Returns the current number of consecutive failures.
+        """
+        return self._fail_counter
+
+    @property
+    def fail_max(self):
+        """
+        Returns the maximum number of failures tolerated before the circuit is
+        opened.
+        """
+        return self._fail_max
+
+    @fail_max.setter
+    def fail_max(self, number):
+        """
+        Sets the maximum `number` of failures tolerated before the circuit is
+        opened.
+        """
+        self._fail_max = number
+
+    @property
+    def reset_timeout(self):
+        """
+        Once this circuit breaker is opened, it should remain opened until the
+        timeout period, in seconds, elapses.
+        """
+        return self._reset_timeout
+
+    @reset_timeout.setter
+    def reset_timeout(self, timeout):
+        """
+        Sets the `timeout` period, in seconds, this circuit breaker should be
+        kept open.
+        """
+        self._reset_timeout = timeout
+
+    @property
+    def throttle_k(self):
+        """
+        Returns the multiplier used to compute the rejection probability in
+        the "throttled" state, or `None` if throttling is disabled.
+        """
+        return self._throttle_k
+
+    @throttle_k.setter
+    def throttle_k(self, k):
+        """
+        Sets the multiplier `k` used in the "throttled" state; `None` disables
+        throttling.
+        """
+        self._throttle_k = k
+
+    @property
+    def slow_start(self):
+        """
+        Returns the duration, in seconds, of the warm-up period after the
+        circuit closes, or `None` if slow start is disabled.
+        """
+        return self._slow_start
+
+    @slow_start.setter
+    def slow_start(self, duration):
+        """
+        Sets the `duration` of the warm-up period after the circuit closes;
+        `None` disables slow start.
+        """
+        self._slow_start = duration
+
+    @property
+    def slow_start_mode(self):
+        """
+        Returns how traffic ramps up during the warm-up period, either
+        'linear' or 'exponential'.
+        """
+        return self._slow_start_mode
+
+    @property
+    def call_timeout(self):
+        """
+        Returns the time, in seconds, after which a call fails with
+        ``CallTimeoutError``, or `None` if calls are not timed out.
+        """
+        return self._call_timeout
+
+    @call_timeout.setter
+    def call_timeout(self, timeout):
+        """
+        Sets the `timeout`, in seconds, after which a call fails; `None`
+        disables call timeouts.
+        """
+        self._call_timeout = timeout
+
+    @property
+    def timeout_pool(self):
+        """
+        Returns the ``TimeoutPool`` that runs the calls when a call timeout is
+        set.
+        """
+        if self._timeout_pool is None:
+            from pybreaker.timeouts import TimeoutPool
+            return TimeoutPool.default
+        return self._timeout_pool
+
+    @property
+    def timer_wheel(self):
+        """
+        Returns the ``TimerWheel`` that half-opens the circuit once the reset
+        timeout elapses, or `None`.
+        """
+        return self._timer_wheel
+
+    @property
+    def fast_fail(self):
+        """
+        Returns whether rejected calls raise a reusable
+        ``CircuitBreakerRejected`` rather than a new ``CircuitBreakerError``.
+        """
+        return self._rejected is not None
+
+    @property
+    def fallback(self):
+        """
+        Returns the value returned by rejected calls, if any.
+        """
+        if self._fallback is _NO_FALLBACK:
+            raise AttributeError('no fallback value')
+        return self._fallback
+
+    @property
+    def parent(self):
+        """
+        Returns the ``CompositeCircuitBreaker`` this circuit breaker belongs
+        to, or `None`.
+        """
+        return self._parent
+
+    @property
+    def limiter(self):
+        """
+        Returns the adaptive concurrency limiter used by this circuit breaker,
+        or `None` if the number of calls in flight is not limited.
+        """
+        return self._limiter
+
+    @property
+    def state(self):
+        """
+        Returns the current state of this circuit breaker.
+        """
+        return self._state
+
+    @property
+    def current_state(self):
+        """
+        Returns a string that identifies this circuit breaker's state, i.e.,
+        'closed', 'throttled', 'open', 'half-open'.
+        """
+        return self._state.name
+
+    @property
+    def excluded_exceptions(self):
+        """
+        Returns the list of excluded exceptions, e.g., exceptions that should
+        not be considered system errors by this circuit breaker.
+        """
+        return self._excluded_exceptions
+
+    def add_excluded_exception(self, exception):
+        """
+        Adds an exception, or a predicate on exceptions, to the list of
+        excluded exceptions.
+        """
+        with self._lock:
+            self._set_excluded_exceptions(
+                self._excluded_exceptions + (exception,))
+
+    def add_excluded_exceptions(self, *exceptions):
+        """
+        Adds exceptions to the list of excluded exceptions.
+        """
+        for exc in exceptions:
+            self.add_excluded_exception(exc)
+
+    def remove_excluded_exception(self, exception):
+        """
+        Removes an exception from the list of excluded exceptions.
+        """
+        with self._lock:
+            excluded = list(self._excluded_exceptions)
+            excluded.remove(exception)
+            self._set_excluded_exceptions(tuple(excluded))
+
+    def _set_excluded_exceptions(self, excluded):
+        """
+        Replaces the excluded exceptions, split into the exception types,
+        checked with a single `issubclass`, and the predicates.
+        """
+        self._excluded_types = tuple(e for e in excluded
+                                     if isinstance(e, type))
+        self._excluded_predicates = tuple(e for e in excluded
+                                          if not isinstance(e, type))
+        self._excluded_exceptions = excluded
+
+    @property
+    def failure_predicate(self):
+        """
+        Returns the predicate that tells whether a result counts as a
+        failure, or a dict of such predicates by result type, or `None`.
+        """
+        return self._failure_predicate
+
+    @failure_predicate.setter
+    def failure_predicate(self, predicate):
+        """
+        Sets the `predicate` that tells whether a result counts as a failure,
+        or a dict of such predicates by result type; `None` counts all
+        results as successes.
+        """
+        self._failure_predicate = predicate
+        if predicate is None:
+            self._result_is_failure = None
+        elif isinstance(predicate, dict):
+            self._result_is_failure = _ResultPredicates(predicate)
+        else:
+            self._result_is_failure = predicate
+
+    def _inc_counter(self):
+        """
+        Increments the counter of failed calls.
+        """
+        self._fail_counter += 1
+
+    def _reset_counter(self):
+        """
+        Resets the counter of failed calls.
+        """
+        self._fail_counter = 0
+
+    def is_system_error(self, exception):
+        """
+        Returns whether the exception `exception` is considered a signal of
+        system malfunction. Business exceptions should not cause this circuit
+        breaker to open.
+        """
+        if exception is None:
+            return True
+        if issubclass(type(exception), self._excluded_types):
+            return False
+        for predicate in self._excluded_predicates:
+            if predicate(exception):
+                return False
+        return True
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func` with the given `args` and `kwargs` according to the rules
+        implemented by the current state of this circuit breaker.
+        """
+        return self._guarded(func, args, kwargs)
+
+    def _guarded(self, func, args, kwargs, wrap=None):
+        """
+        Implements `call()`, with the arguments of `func` already packed. If
+        given, `wrap(state, ret)` guards the value `ret` returned by `func`,
+        e.g. a generator, instead of checking whether it is a generator.
+        """
+        state = self._state
+        rejected = state.rejects()
+        if rejected is not None:
+            return self._reject(state, *rejected)
+
+        if self._limiter is None:
+            try:
+                state = self._admit(func, args, kwargs)
+            except CircuitBreakerError:
+                if self._fallback is _NO_FALLBACK:
+                    raise
+                return self._fallback
+            return self._call_admitted(state, func, args, kwargs, wrap)
+
+        try:
+            start = self._acquire_limiter()
+        except CircuitBreakerError:
+            if self._fallback is _NO_FALLBACK:
+                raise
+            return self._fallback
+
+        state = None
+        try:
+            state = self._admit(func, args, kwargs)
+            ret = self._call_admitted(state, func, args, kwargs, wrap)
+        except BaseException as e:
+            self._release_limiter(start, e)
+            if state is None and isinstance(e, CircuitBreakerError) and \
+                    self._fallback is not _NO_FALLBACK:
+                return self._fallback
+            raise
+        self._release_limiter(start)
+        return ret
+
+    def call_async(self, func, *args, **kwargs):
+        """
+        Returns a coroutine that awaits `func` with the given `args` and
+        `kwargs` according to the rules implemented by the current state of
+        this circuit breaker. Requires Python 3.5+.
+        """
+        from pybreaker.aio import call_async
+        return call_async(self, func, *args, **kwargs)
+
+    def _rejection(self, error_msg, remaining=None):
+        """
+        Returns the exception to raise for a rejected call: a new
+        ``CircuitBreakerError`` with `error_msg`, or in fast-fail mode the
+        reusable ``CircuitBreakerRejected``, updated with `error_msg` and the
+        `remaining` open time.
+        """
+        exc = self._rejected
+        if exc is None:
+            return CircuitBreakerError(error_msg)
+        exc.reason, exc.remaining = error_msg, remaining
+        # Drop what the previous rejection kept alive: its traceback and the
+        # exception that was being handled when it was raised
+        exc.__traceback__ = exc.__context__ = exc.__cause__ = None
+        return exc
+
+    def _reject(self, state, error_msg, remaining=None):
+        """
+        Rejects a call early on behalf of `state`: returns the fallback value
+        or raises. The lock is only taken if listeners want to be notified.
+        """
+        mux = self._mux
+        notify = mux.rejected or mux.events[EVENT_REJECTED]
+        if not notify and self._fallback is not _NO_FALLBACK:
+            return self._fallback
+
+        exc = self._rejection(error_msg, remaining)
+        if notify:
+            with self._lock:
+                self._notify_rejected(state, exc)
+        if self._fallback is _NO_FALLBACK:
+            raise exc
+        return self._fallback
+
+    def _acquire_limiter(self):
+        """
+        Takes a slot from the concurrency limiter, or raises
+        ``CircuitBreakerError`` if the limit has been reached. Returns the
+        time the call started.
+        """
+        if not self._limiter.acquire():
+            error_msg = 'Concurrency limit reached, call rejected'
+            exc = self._rejection(error_msg)
+            with self._lock:
+                self._notify_rejected(self._state, exc)
+            raise exc
+        return _clock()
+
+    def _release_limiter(self, start, exc=None):
+        """
+        Gives back the slot taken by a call that started at `start` and failed
+        with `exc`, if any, and notifies the listeners if the limit has
+        changed. Calls rejected by the circuit breaker are not used as samples.
+        """
+        rtt, dropped = _clock() - start, False
+        if isinstance(exc, CircuitBreakerError):
+            rtt = None
+        elif exc is not None:
+            dropped = self.is_system_error(exc)
+
+        old_limit, new_limit = self._limiter.release(rtt, dropped)
+        if old_limit != new_limit:
+            with self._lock:
+                self._notify_limit_change(old_limit, new_limit)
+
+    def _call_admitted(self, state, func, args, kwargs, wrap=None):
+        """
+        Calls `func`, admitted by `state`, and records its outcome.
+        """
+        timeout = self._call_timeout
+        if timeout is not None:
+            # Busy workers say nothing about the backend: reject the call
+            # rather than count it as a failure
+            pool = self.timeout_pool
+            task = pool._submit(func, args, kwargs)
+            if task is None:
+                self._cancel_call(state)
+                return self._reject(state, 'No worker available in the '
+                                    'timeout pool, call rejected')
+
+        start = _clock() if self._mux.timed else None
+
+        try:
+            if timeout is None:
+                ret = func(*args, **kwargs)
+            else:
+                ret = pool._wait(task, timeout)
+            if wrap is not None:
+                return wrap(state, ret)
+            if isinstance(ret, types.GeneratorType):
+                return state.generator_call(ret)
+
+        except BaseException as e:
+            self._record_error(state, e, start=start)
+        else:
+            if self._result_is_failure is None:
+                self._record_success(state, start)
+            else:
+                self._record_result(state, ret, start)
+        return ret
+
+    def _before_call(self, func, *args, **kwargs):
+        """
+        Checks whether the current state allows a call to `func` and notifies
+        the listeners. Returns the state that admitted the call.
+
+        Only the admission check is done under the lock; the guarded operation
+        itself runs outside of it, so calls do not serialize on the lock. Calls
+        rejected by the `rejects()` check of the state do not take the lock,
+        unless listeners want to be notified.
+        """
+        state = self._state
+        rejected = state.rejects()
+        if rejected is not None:
+            exc = self._rejection(*rejected)
+            with self._lock:
+                self._notify_rejected(state, exc)
+            raise exc
+        return self._admit(func, args, kwargs)
+
+    def _admit(self, func, args, kwargs):
+        """
+        Implements `_before_call()` once the `rejects()` check of the state
+        has let the call through. Unless this circuit breaker is open or
+        half-open, the call is also rejected while a composite circuit breaker
+        it belongs to is open.
+        """
+        with self._lock:
+            try:
+                if self._parent is not None and not isinstance(
+                        self._state, (CircuitOpenState, CircuitHalfOpenState)):
+                    self._parent._check()
+                self._state.before_call(func, *args, **kwargs)
+            except CircuitBreakerError as e:
+                self._notify_rejected(self._state, e)
+                raise
+            state = self._state
+
+            # A listener that raises leaves the call without an outcome: give
+            # back its admission, e.g. the trial call of the half-open state
+            try:
+                self._notify_before_call(func, args, kwargs)
+            except BaseException:
+                self._cancel_call(state)
+                raise
+            return state
+
+    def _record_success(self, state, start=None):
+        """
+        Records the success of a call admitted by `state` that started at
+        `start`, if known. Outcomes of calls admitted by a state the circuit
+        breaker has since left are ignored.
+        """
+        duration = None if start is None else _clock() - start
+        with self._lock:
+            if state is self._state:
+                state._handle_success(duration)
+
+    def _record_result(self, state, result, start=None):
+        """
+        Records the outcome of a call admitted by `state` that returned
+        `result`: a failure if the failure predicate says so, otherwise a
+        success. The result is returned to the caller either way; if the
+        failure predicate raises, its exception is recorded as the failure.
+        """
+        is_failure = self._result_is_failure
+        if is_failure is not None:
+            try:
+                failed = is_failure(result)
+            except Exception as e:
+                self._record_error(state, e, reraise=False, start=start)
+                return
+            if failed:
+                self._record_error(state, ResultFailure(result),
+                                   reraise=False, start=start)
+                return
+        self._record_success(state, start)
+
+    def _record_error(self, state, exc, reraise=True, start=None):
+        """
+        Records the failure of a call admitted by `state` that started at
+        `start`, if known. Outcomes of calls admitted by a state the circuit
+        breaker has since left are ignored.
+        """
+        duration = None if start is None else _clock() - start
+        with self._lock:
+            if state is self._state:
+                state._handle_error(exc, reraise=reraise, duration=duration)
+                return
+        if reraise and exc:
+            raise exc
+
+    def _cancel_call(self, state):
+        """
+        Releases the admission of a call made by `state` that was abandoned
+        before its outcome was known, e.g. a cancelled call. The call counts
+        neither as a success nor as a failure.
+        """
+        with self._lock:
+            if state is self._state:
+                state.on_cancel()
+
+    def call_future(self, func, *args, **kwargs):
+        """
+        For functions which return a future rather than executing in line,
+        checks the rules implemented by the current state of the circuit breaker
+        and generates the future without checkout for success / error
+
+        If `func` is `None`, we are simply leveraging the circuit breaker gate
+        and we will not attempt to call func()
+
+        As the outcome is only known if the caller reports it, through
+        `handle_success()` or `handle_error()`, the call does not hold its
+        admission, e.g. the trial call of the half-open state.
+        """
+        ret = None
+
+        state = self._before_call(func, *args, **kwargs)
+        self._cancel_call(state)
+
+        if func:
+            ret = func(*args, **kwargs)
+            return ret
+        else:
+            return None
+
+    def handle_success(self):
+        """
+        Sends a success event to the circuit breaker.
+        """
+        with self._lock:
+            self._state._handle_success()
+
+    def handle_error(self, e, reraise=False):
+        """
+        Sends an error event to the circuit breaker.
+        """
+        with self._lock:
+            self._state._handle_error(e, reraise=reraise)
+
+    def handle_soft_success(self):
+        """
+        Soft success is a 'success' that isn't quite successful enough
+        for us to close the circuit breaker.
+        """
+        with self._lock:
+            if self.current_state == "closed":
+                return self.handle_success()
+            else:
+                return self.handle_error(None)
+
+    def open(self):
+        """
+        Opens the circuit, e.g., the following calls will immediately fail
+        until timeout elapses.
+        """
+        with self._lock:
+            self._state.on_leave()
+            self._state = CircuitOpenState(self, self._state, notify=True)
+
+    def throttle(self):
+        """
+        Throttles the circuit, e.g. the following calls are rejected with a
+        probability that follows the recent failure rate.
+        """
+        with self._lock:
+            self._state.on_leave()
+            self._state = CircuitThrottledState(self, self._state, notify=True)
+
+    def half_open(self):
+        """
+        Half-opens the circuit, e.g. lets the following call pass through and
+        opens the circuit if the call fails (or closes the circuit if the call
+        succeeds).
+        """
+        with self._lock:
+            self._state.on_leave()
+            self._state = CircuitHalfOpenState(self, self._state, notify=True)
+
+    def close(self):
+        """
+        Closes the circuit, e.g. lets the following calls execute as usual.
+        """
+        with self._lock:
+            self._state.on_leave()
+            self._state = CircuitClosedState(self, self._state, notify=True)
+
+    def __call__(self, func):
+        """
+        Returns a wrapper that calls the function `func` according to the rules
+        implemented by the current state of this circuit breaker.
+
+        The wrapper is chosen once, when `func` is decorated: coroutine
+        functions get a coroutine function that awaits them like
+        `call_async()`, generator and async generator functions get wrappers
+        that guard the iteration of what they return, and functions whose
+        parameters are all positional, without defaults, get a wrapper with
+        the same parameters, so that their arguments are not repacked.
+        """
+        flags = 0
+        if isinstance(func, (types.FunctionType, types.MethodType)):
+            flags = func.__code__.co_flags
+
+        if flags & _CO_COROUTINE:
+            from pybreaker.aio import coroutine_wrapper
+            return coroutine_wrapper(self, func)
+        if flags & _CO_ASYNC_GENERATOR:
+            from pybreaker.aio import async_generator_call as wrap
+        elif flags & _CO_GENERATOR:
+            wrap = CircuitBreakerState.generator_call
+        else:
+            wrap = None
+        return _make_wrapper(self._guarded, func, wrap)
+
+    @property
+    def listeners(self):
+        """
+        Returns the registered listeners as a tuple.
+        """
+        return self._listeners
+
+    def add_listener(self, listener):
+        """
+        Registers a listener for this circuit breaker. It can either be a
+        ``CircuitBreakerListener`` or a ``CircuitBreakerEventListener``.
+        """
+        with self._lock:
+            self._listeners += (listener,)
+            self._mux = _ListenerMux(self._listeners)
+
+    def add_listeners(self, *listeners):
+        """
+        Registers listeners for this circuit breaker.
+        """
+        for listener in listeners:
+            self.add_listener(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregisters a listener of this circuit breaker.
+        """
+        with self._lock:
+            listeners = list(self._listeners)
+            listeners.remove(listener)
+            self._listeners = tuple(listeners)
+            self._mux = _ListenerMux(self._listeners)
+
+    def _emit(self, listeners, kind, **fields):
+        """
+        Delivers a single event of the given `kind` to the event `listeners`.
+        """
+        event = CircuitBreakerEvent(self, kind, **fields)
+        for listener in listeners:
+            listener.on_event(event)
+
+    def _notify_before_call(self, func, args, kwargs):
+        """
+        Notifies the listeners that `func` is about to be called.
+        """
+        mux = self._mux
+        for callback in mux.before_call:
+            callback(self, func, *args, **kwargs)
+        if mux.events[EVENT_BEFORE_CALL]:
+            self._emit(mux.events[EVENT_BEFORE_CALL], EVENT_BEFORE_CALL)
+
+    def _notify_success(self, state, duration=None, exc=None):
+        """
+        Notifies the listeners that a call admitted by `state` succeeded after
+        `duration` seconds, or raised the excluded exception `exc`.
+        """
+        mux = self._mux
+        for callback in mux.success:
+            callback(self)
+        if mux.events[EVENT_SUCCESS]:
+            self._emit(mux.events[EVENT_SUCCESS], EVENT_SUCCESS, state=state,
+                       duration=duration, exception=exc)
+
+    def _notify_failure(self, state, exc, duration=None):
+        """
+        Notifies the listeners that a call admitted by `state` failed with
+        `exc` after `duration` seconds.
+        """
+        mux = self._mux
+        for callback in mux.failure:
+            callback(self, exc)
+        if mux.events[EVENT_FAILURE]:
+            self._emit(mux.events[EVENT_FAILURE], EVENT_FAILURE, state=state,
+                       duration=duration, exception=exc)
+
+    def _notify_rejected(self, state, exc):
+        """
+        Notifies the listeners that `state` rejected a call with `exc`.
+        """
+        mux = self._mux
+        for callback in mux.rejected:
+            callback(self, exc)
+        if mux.events[EVENT_REJECTED]:
+            self._emit(mux.events[EVENT_REJECTED], EVENT_REJECTED, state=state,
+                       exception=exc)
+
+    def _notify_state_change(self, old_state, new_state):
+        """
+        Notifies the listeners that the state changed.
+        """
+        mux = self._mux
+        for callback in mux.state_change:
+            callback(self, old_state, new_state)
+        if mux.events[EVENT_STATE_CHANGE]:
+            self._emit(mux.events[EVENT_STATE_CHANGE], EVENT_STATE_CHANGE,
+                       old_state=old_state, new_state=new_state)
+
+    def _notify_limit_change(self, old_limit, new_limit):
+        """
+        Notifies the listeners that the concurrency limit changed.
+        """
+        mux = self._mux
+        for callback in mux.limit_change:
+            callback(self, old_limit, new_limit)
+        if mux.events[EVENT_LIMIT_CHANGE]:
+            self._emit(mux.events[EVENT_LIMIT_CHANGE], EVENT_LIMIT_CHANGE,
+                       old_limit=old_limit, new_limit=new_limit)
+
+
+class CircuitBreakerListener(object):
+    """
+    Listener class used to plug code to a ``CircuitBreaker`` instance when
+    certain events happen.
+    """
+
+    def before_call(self, cb, func, *args, **kwargs):
+        """
+        This callback function is called before the circuit breaker `cb` calls
+        `fn`.
+        """
+        pass
+
+    def failure(self, cb, exc=None):
+        """
+        This callback function is called when a function called by the circuit
+        breaker `cb` fails. EXC can be null.
+        """
+        pass
+
+    def success(self, cb):
+        """
+        This callback function is called when a function called by the circuit
+        breaker `cb` succeeds.
+        """
+        pass
+
+    def state_change(self, cb, old_state, new_state):
+        """
+        This callback function is called when the state of the circuit breaker
+        `cb` state changes.
+        """
+        pass
+
+    def limit_change(self, cb, old_limit, new_limit):
+        """
+        This callback function is called when the adaptive concurrency limit of
+        the circuit breaker `cb` changes.
+        """
+        pass
+
+    def rejected(self, cb, exc):
+        """
+        This callback function is called when the circuit breaker `cb` rejects
+        a call with the ``CircuitBreakerError`` `exc`.
+        """
+        pass
+
+
+class CircuitBreakerEvent(object):
+    """
+    Record of something that happened in a circuit breaker, delivered to
+    ``CircuitBreakerEventListener`` instances. Fields that do not apply to the
+    event `kind` are `None`. For calls, `state` is the state that admitted or
+    rejected the call.
+    """
+
+    __slots__ = ('breaker', 'name', 'kind', 'state', 'duration', 'exception',
+                 'old_state', 'new_state', 'old_limit', 'new_limit')
+
+    def __init__(self, cb, kind, state=None, duration=None, exception=None,
+            old_state=None, new_state=None, old_limit=None, new_limit=None):
+        self.breaker = cb
+        self.name = cb.name
+        self.kind = kind
+        self.state = state
+        self.duration = duration
+        self.exception = exception
+        self.old_state = old_state
+        self.new_state = new_state
+        self.old_limit = old_limit
+        self.new_limit = new_limit
+
+    def __repr__(self):
+        return '<CircuitBreakerEvent %s %s>' % (self.name, self.kind)
+
+
+class CircuitBreakerEventListener(object):
+    """
+    Listener that receives the events of a circuit breaker as single
+    ``CircuitBreakerEvent`` records, instead of one callback per kind of
+    event. Only the event kinds listed in `kinds`, e.g. ``EVENT_FAILURE``,
+    are delivered, so the other kinds cost nothing.
+
+    The duration of calls is only measured if an event listener subscribes
+    to ``EVENT_SUCCESS`` or ``EVENT_FAILURE``.
+    """
+
+    kinds = ()
+
+    def on_event(self, event):
+        """
+        This callback function is called for each `event` of the subscribed
+        kinds.
+        """
+        pass
+
+
+class _ListenerMux(object):
+    """
+    Dispatch table built from the listeners of a circuit breaker every time
+    they change. It holds, for each kind of event, the callbacks that
+    ``CircuitBreakerListener`` instances actually override, and the
+    ``CircuitBreakerEventListener`` instances that subscribe to it.
+    """
+
+    __slots__ = _EVENT_KINDS + ('events', 'timed')
+
+    def __init__(self, listeners):
+        self.events = {}
+        for kind in _EVENT_KINDS:
+            setattr(self, kind, tuple(
+                getattr(listener, kind) for listener in listeners
+                if not isinstance(listener, CircuitBreakerEventListener) and
+                _overrides(listener, kind)))
+            self.events[kind] = tuple(
+                listener for listener in listeners
+                if isinstance(listener, CircuitBreakerEventListener) and
+                kind in listener.kinds)
+        self.timed = bool(self.events[EVENT_SUCCESS] or
+                          self.events[EVENT_FAILURE])
+
+
+def _make_wrapper(guarded, func, wrap):
+    """
+    Returns a wrapper that calls ``guarded(func, args, kwargs, wrap)``. If the
+    parameters of `func` are all positional, without defaults, the wrapper
+    takes the same parameters instead of ``*args, **kwargs``.
+    """
+    names = _fixed_arity(func)
+    if names is None:
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            return guarded(func, args, kwargs, wrap)
+        return _wrapper
+
+    factory = _wrapper_factories.get(names)
+    if factory is None:
+        params = ', '.join(names)
+        source = _WRAPPER_TEMPLATE % {
+            'params': params,
+            'args': '(%s)' % ''.join(name + ', ' for name in names)}
+        namespace = {}
+        exec(compile(source, '<pybreaker wrapper>', 'exec'), namespace)
+        factory = _wrapper_factories[names] = namespace['_factory']
+    return wraps(func)(factory(guarded, func, wrap))
+
+
+# Source of the wrappers of functions with a fixed number of positional
+# parameters, compiled once per list of parameter names
+_WRAPPER_TEMPLATE = '''
+def _factory(_pybreaker_guarded, _pybreaker_func, _pybreaker_wrap):
+    def _wrapper(%(params)s):
+        return _pybreaker_guarded(_pybreaker_func, %(args)s, {},
+                                  _pybreaker_wrap)
+    return _wrapper
+'''
+
+_wrapper_factories = {}
+
+
+def _fixed_arity(func):
+    """
+    Returns the names of the parameters of the function `func` if they are
+    all positional, without defaults, or `None`.
+    """
+    if not isinstance(func, types.FunctionType) or func.__defaults__:
+        return None
+    code = func.__code__
+    if code.co_flags & (_CO_VARARGS | _CO_VARKEYWORDS) or \
+            getattr(code, 'co_kwonlyargcount', 0):
+        return None
+    names = code.co_varnames[:code.co_argcount]
+    for name in names:
+        # Python 2 names unpacked tuple parameters '.0', '.1', ...
+        if name.startswith(('.', '_pybreaker_')):
+            return None
+    return names
+
+
+def _overrides(listener, callback):
+    """
+    Returns whether `listener` implements `callback` rather than inheriting
+    the no-op from ``CircuitBreakerListener``. Callbacks set on the instance,
+    e.g. by mocks, count as implemented.
+    """
+    method = getattr(listener, callback, None)
+    if method is None:
+        return False
+    default = getattr(CircuitBreakerListener, callback)
+    return (getattr(method, '__func__', method) is not
+            getattr(default, '__func__', default))
+
+
+class CircuitBreakerState(object):
+    """
+    Implements the behavior needed by all circuit breaker states.
+    """
+
+    def __init__(self, cb, name):
+        """
+        Creates a new instance associated with the circuit breaker `cb` and
+        identified by `name`.
+        """
+        self._breaker = cb
+        self._name = name
+
+    @property
+    def name(self):
+        """
+        Returns a human friendly name that identifies this state.
+        """
+        return self._name
+
+    def _handle_error(self, exc=None, reraise=True, duration=None):
+        """
+        Handles a failed call to the guarded operation.
+        """
+        if self._breaker.is_system_error(exc):
+            self._breaker._inc_counter()
+
+            # The listeners are notified even if this failure trips the
+            # circuit breaker
+            tripped = None
+            try:
+                self.on_failure(exc)
+            except CircuitBreakerError as e:
+                tripped = e
+
+            self._breaker._notify_failure(self, exc, duration)
+            if tripped is not None and reraise:
+                raise tripped
+        else:
+            self._handle_success(duration, exc)
+
+        if reraise and exc:
+            raise exc
+
+    def _handle_success(self, duration=None, exc=None):
+        """
+        Handles a successful call to the guarded operation, i.e. a call that
+        returned or raised the excluded exception `exc`.
+        """
+        self._breaker._reset_counter()
+        self.on_success()
+        self._breaker._notify_success(self, duration, exc)
+
+    def generator_call(self, wrapped_generator):
+        """
+        Guards the generator `wrapped_generator`, created by a call admitted by
+        this state, and records its outcome once it is exhausted or fails. If
+        it is closed before it is exhausted, e.g. when a loop over it breaks
+        early, the call counts neither as a success nor as a failure.
+        """
+        try:
+            value = yield next(wrapped_generator)
+            while True:
+                value = yield wrapped_generator.send(value)
+        except StopIteration:
+            self._breaker._record_success(self)
+            return
+        except GeneratorExit:
+            self._breaker._cancel_call(self)
+            raise
+        except BaseException as e:
+            self._breaker._record_error(self, e)
+
+    def before_call(self, func, *args, **kwargs):
+        """
+        Override this method to be notified before a call to the guarded
+        operation is attempted.
+        """
+        pass
+
+    def rejects(self):
+        """
+        Override this method to reject calls early, before the circuit
+        breaker's lock is taken. Returns the message and the remaining open
+        time of the error, or `None` to let `before_call` decide.
+        """
+        return None
+
+    def on_success(self):
+        """
+        Override this method to be notified when a call to the guarded
+        operation succeeds.
+        """
+        pass
+
+    def on_failure(self, exc=None):
+        """
+        Override this method to be notified when a call to the guarded
+        operation fails.
+        """
+        pass
+
+    def on_cancel(self):
+        """
+        Override this method to be notified when a call admitted by this state
+        is abandoned before its outcome is known.
+        """
+        pass
+
+    def on_leave(self):
+        """
+        Override this method to be notified when the circuit breaker is about
+        to leave this state.
+        """
+        pass
+
+
+class CircuitClosedState(CircuitBreakerState):
+    """
+    In the normal "closed" state, the circuit breaker executes operations as
+    usual. If the call succeeds, nothing happens. If it fails, however, the
+    circuit breaker makes a note of the failure.
+
+    Once the number of failures exceeds a threshold, the circuit breaker trips
+    and "opens" the circuit.
+
+    If slow start is enabled and the circuit closes after a successful trial
+    call, the share of calls let through ramps up over the breaker's
+    `slow_start` seconds, from 10% to all of them, either linearly or
+    exponentially; the other calls are rejected. During that warm-up, the
+    failures threshold is scaled down by the same share.
+    """
+
+    def __init__(self, cb, prev_state=None, notify=False):
+        """
+        Moves the given circuit breaker `cb` to the "closed" state.
+        """
+        super(CircuitClosedState, self).__init__(cb, 'closed')
+        self._breaker._reset_counter()
+        self._warmup_started = None
+        if cb.slow_start and isinstance(prev_state, CircuitHalfOpenState):
+            self._warmup_started = _clock()
+        if notify:
+            self._breaker._notify_state_change(prev_state, self)
+
+    def admitted_ratio(self):
+        """
+        Returns the share of calls currently let through, which is below 1.0
+        during the warm-up period only.
+        """
+        if self._warmup_started is None:
+            return 1.0
+        elapsed = (_clock() - self._warmup_started) / self._breaker.slow_start
+        if elapsed >= 1.0:
+            self._warmup_started = None
+            return 1.0
+        if self._breaker.slow_start_mode == 'exponential':
+            return _SLOW_START_RATIO ** (1.0 - elapsed)
+        return _SLOW_START_RATIO + (1.0 - _SLOW_START_RATIO) * elapsed
+
+    def before_call(self, func, *args, **kwargs):
+        """
+        Raises ``CircuitBreakerError`` if the call is not let through during
+        the warm-up period.
+        """
+        if self._warmup_started is not None and \
+                _random() >= self.admitted_ratio():
+            error_msg = 'Call rejected, circuit breaker warming up'
+            raise self._breaker._rejection(error_msg)
+
+    def on_failure(self, exc=None):
+        """
+        Moves the circuit breaker to the "open" state once the failures
+        threshold is reached, or to the "throttled" state if throttling is
+        enabled.
+        """
+        fail_max = self._breaker.fail_max
+        if self._warmup_started is not None:
+            fail_max = max(1, int(fail_max * self.admitted_ratio()))
+
+        if self._breaker.fail_counter >= fail_max:
+            if self._breaker.throttle_k is not None:
+                self._breaker.throttle()
+                return
+
+            self._breaker.open()
+
+            error_msg = 'Failures threshold reached, circuit breaker opened'
+            raise CircuitBreakerError(error_msg)
+
+
+class CircuitThrottledState(CircuitBreakerState):
+    """
+    The "throttled" state sits between "closed" and "open": instead of
+    rejecting every call, the circuit breaker rejects each call with a
+    probability that follows the recent failure rate, in the same way as
+    client-side adaptive throttling::
+
+        p = max(0, (requests - k * accepts) / (requests + 1))
+
+    where `requests` is the number of calls that went through in this state,
+    `accepts` the number of those that succeeded, and `k` the breaker's
+    `throttle_k`. The failures that tripped the circuit breaker are counted
+    as requests, so throttling starts aggressively and eases off as calls
+    succeed again.
+
+    Once the rejection probability drops to zero the circuit is closed; if
+    `fail_max` consecutive calls fail in this state, the circuit is opened.
+    """
+
+    def __init__(self, cb, prev_state=None, notify=False):
+        """
+        Moves the given circuit breaker `cb` to the "throttled" state.
+        """
+        super(CircuitThrottledState, self).__init__(cb, 'throttled')
+        self._requests = self._breaker.fail_counter
+        self._accepts = 0
+        self._breaker._reset_counter()
+        self._update_reject_probability()
+        if notify:
+            self._breaker._notify_state_change(prev_state, self)
+
+    @property
+    def reject_probability(self):
+        """
+        Returns the probability of a call being rejected in this state.
+        """
+        return self._reject_probability
+
+    def _update_reject_probability(self):
+        """
+        Recomputes the rejection probability from the request counters.
+        """
+        k = self._breaker.throttle_k or 1
+        requests = float(self._requests)
+        self._reject_probability = max(
+            0.0, (requests - k * self._accepts) / (requests + 1))
+
+    def rejects(self):
+        """
+        Rejects the call with the current rejection probability. This check
+        takes no lock; `before_call` then admits the calls it let through.
+        """
+        if _random() < self._reject_probability:
+            return 'Call rejected, circuit breaker throttled', None
+        return None
+
+    def on_success(self):
+        """
+        Closes the circuit breaker once the rejection probability drops to
+        zero.
+        """
+        self._requests += 1
+        self._accepts += 1
+        self._update_reject_probability()
+        if self._reject_probability <= 0:
+            self._breaker.close()
+
+    def on_failure(self, exc=None):
+        """
+        Opens the circuit breaker once the failures threshold is reached.
+        """
+        self._requests += 1
+        self._update_reject_probability()
+        if self._breaker.fail_counter >= self._breaker.fail_max:
+            self._breaker.open()
+
+            error_msg = 'Failures threshold reached, circuit breaker opened'
+            raise CircuitBreakerError(error_msg)
+
+
+class CircuitOpenState(CircuitBreakerState):
+    """
+    When the circuit is "open", calls to the circuit breaker fail immediately,
+    without any attempt to execute the real operation. This is indicated by the
+    ``CircuitBreakerError`` exception.
+
+    After a suitable amount of time, the circuit breaker decides that the
+    operation has a chance of succeeding, so it goes into the "half-open" state.
+    """
+
+    def __init__(self, cb, prev_state=None, notify=False):
+        """
+        Moves the given circuit breaker `cb` to the "open" state.
+        """
+        super(CircuitOpenState, self).__init__(cb, 'open')
+        self._opened_at = _clock()
+        self._opened_wall = time.time()
+        self._timer = None
+        if cb.timer_wheel is not None:
+            self._timer = cb.timer_wheel.schedule(cb.reset_timeout,
+                                                  self._expire)
+        if notify:
+            self._breaker._notify_state_change(prev_state, self)
+
+    def _expire(self):
+        """
+        Called by the circuit breaker's timer wheel once the timeout elapses:
+        moves the circuit breaker to the "half-open" state, unless it has left
+        this state already or a ``HealthCheck`` is attached.
+        """
+        cb = self._breaker
+        with cb._lock:
+            if cb._state is self and cb._health_check is None:
+                cb.half_open()
+
+    def on_leave(self):
+        """
+        Cancels the timer that would half-open the circuit breaker.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+
+    @property
+    def opened_at(self):
+        """
+        Local date and time at which the circuit was opened.
+        """
+        from datetime import datetime
+        return datetime.fromtimestamp(self._opened_wall)
+
+
+
+    def before_call(self, func, *args, **kwargs):
+        """
+        After the timeout elapses, move the circuit breaker to the "half-open"
+        state; otherwise, raises ``CircuitBreakerError`` without any attempt
+        to execute the real operation. If a ``HealthCheck`` is attached, only
+        the health check closes the circuit.
+        """
+        rejected = self.rejects()
+        if rejected is not None:
+            raise self._breaker._rejection(*rejected)
+        else:
+            self._breaker.half_open()
+            self._breaker.state.before_call(func, *args, **kwargs)
+
+    def rejects(self):
+        """
+        Returns the message and the remaining open time (or `None`) of the
+        error rejecting calls, or `None` once the timeout has elapsed. This
+        check takes no lock and does not change the state.
+        """
+        if self._breaker._health_check is not None:
+            return 'Circuit breaker open, waiting for a health check', None
+        remaining = self._opened_at + self._breaker.reset_timeout - _clock()
+        if remaining > 0:
+            return ('Timeout not elapsed yet, circuit breaker still open',
+                    remaining)
+        return None
+
+
+class CircuitHalfOpenState(CircuitBreakerState):
+    """
+    In the "half-open" state, the next call to the circuit breaker is allowed
+    to execute the dangerous operation. Should the call succeed, the circuit
+    breaker resets and returns to the "closed" state. If this trial call fails,
+    however, the circuit breaker returns to the "open" state until another
+    timeout elapses.
+
+    The trial call holds its admission for the breaker's `reset_timeout` at
+    most: if its outcome is still unknown by then, e.g. because the caller
+    dropped it, another trial call is let through.
+    """
+
+    def __init__(self, cb, prev_state=None, notify=False):
+        """
+        Moves the given circuit breaker `cb` to the "half-open" state.
+        """
+        super(CircuitHalfOpenState, self).__init__(cb, 'half-open')
+        self._trial_started = None
+        if notify:
+            self._breaker._notify_state_change(prev_state, self)
+
+    def before_call(self, func, *args, **kwargs):
+        """
+        Lets a single trial call through. Other calls are rejected with
+        ``CircuitBreakerError`` until the outcome of the trial call is known,
+        or its lease of `reset_timeout` seconds runs out.
+        """
+        now = _clock()
+        started = self._trial_started
+        if started is not None and now < started + self._breaker.reset_timeout:
+            error_msg = 'Trial call in progress, circuit breaker half-open'
+            raise self._breaker._rejection(error_msg)
+        self._trial_started = now
+
+    def on_failure(self, exc=None):
+        """
+        Opens the circuit breaker.
+        """
+        self._breaker.open()
+        raise CircuitBreakerError('Trial call failed, circuit breaker opened')
+
+    def on_success(self):
+        """
+        Closes the circuit breaker.
+        """
+        self._breaker.close()
+
+    def on_cancel(self):
+        """
+        Lets another trial call through, as the outcome of this one will never
+        be known.
+        """
+        self._trial_started = None
+
+
+class CircuitBreakerError(Exception):
+    """
+    When calls to a service fails because the circuit is open, this error is
+    raised to allow the caller to handle this type of exception differently.
+    """
+    pass
+
+
+class ResultFailure(Exception):
+    """
+    Stands for a call that returned a `result` deemed a failure by the
+    circuit breaker's failure predicate, e.g. when notifying the listeners.
+    It is never raised to the caller, who gets the result.
+    """
+
+    def __init__(self, result):
+        super(ResultFailure, self).__init__(result)
+        self.result = result
+
+
+class _ResultPredicates(object):
+    """
+    Dispatch table of failure predicates by result type. The predicate of a
+    type is looked up along its MRO the first time a result of that type is
+    seen, then cached, so checking a result costs a dict lookup.
+    """
+
+    def __init__(self, predicates):
+        self._predicates = dict(predicates)
+        self._by_type = {}
+
+    def __call__(self, result):
+        cls = type(result)
+        try:
+            predicate = self._by_type[cls]
+        except KeyError:
+            predicate = self._by_type[cls] = self._lookup(cls)
+        return predicate is not None and predicate(result)
+
+    def _lookup(self, cls):
+        for base in getattr(cls, '__mro__', (cls,)):
+            if base in self._predicates:
+                return self._predicates[base]
+        return None
+
+
+class CircuitBreakerRejected(CircuitBreakerError):
+    """
+    Lightweight ``CircuitBreakerError`` raised by circuit breakers in
+    fast-fail mode. Each circuit breaker reuses a single instance, updated
+    before each rejection with its `reason` and, while the circuit is open,
+    the `remaining` time in seconds until a trial call is let through; with
+    concurrent rejections, these may describe another rejected call. The
+    message is only formatted when the exception is printed.
+    """
+
+    def __init__(self, name=None):
+        super(CircuitBreakerRejected, self).__init__()
+        self.name = name
+        self.reason = None
+        self.remaining = None
+
+    def __str__(self):
+        msg = self.reason or 'Call rejected'
+        if self.name is not None:
+            msg = '%s: %s' % (self.name, msg)
+        if self.remaining is not None:
+            msg = '%s (%.3fs remaining)' % (msg, self.remaining)
+        return msg
+
+
+# Optional subsystems live in submodules that are only imported when one of
+# their names is first looked up, so that ``import pybreaker`` pays for the
+# core circuit breaker alone
+_LAZY = {
+    'AdaptiveLimiter': 'limiters',
+    'AIMDLimiter': 'limiters',
+    'GradientLimiter': 'limiters',
+    'RetryBudget': 'retry',
+    'RetryPolicy': 'retry',
+    'HedgedGroup': 'hedging',
+    'CircuitBreakerPool': 'pool',
+    'TracingListener': 'tracing',
+    'KeyedCircuitBreaker': 'keyed',
+    'CompositeCircuitBreaker': 'composite',
+    'BreakerExecutor': 'executor',
+    'HealthCheck': 'health',
+    'CallTimeoutError': 'timeouts',
+    'TimeoutPool': 'timeouts',
+    'TimerWheel': 'timers',
+    'EventRing': 'diagnostics',
+}
+
+
+def __getattr__(name):
+    """
+    Imports the submodule that defines `name` on first access (PEP 562).
+    """
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(__import__('%s.%s' % (__name__, module), fromlist=[name]),
+                    name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+if sys.version_info < (3, 7):
+    # Module-level __getattr__ is not supported; import everything eagerly
+    for _name in _LAZY:
+        __getattr__(_name)
+    del _name
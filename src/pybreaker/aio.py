@@ -0,0 +1,301 @@
+#-*- coding:utf-8 -*-
+
+"""
+asyncio support for pybreaker. This module requires Python 3.5+ and is only
+imported when one of the asyncio variants, e.g. ``CircuitBreaker.call_async``,
+is used.
+"""
+
+import asyncio
+from functools import wraps
+
+from pybreaker import CircuitBreakerError, _NO_FALLBACK, _clock
+from pybreaker.timeouts import CallTimeoutError
+
+__all__ = ('call_async', 'coroutine_wrapper', 'async_generator_call',
+           'retry_async', 'hedged_call_async', 'AsyncioScheduler',
+           'probe_async',)
+
+
+async def call_async(cb, func, *args, **kwargs):
+    """
+    Awaits `func` with the given `args` and `kwargs` according to the rules
+    implemented by the current state of the circuit breaker `cb`.
+    """
+    state = cb.state
+    rejected = state.rejects()
+    if rejected is not None:
+        return cb._reject(state, *rejected)
+
+    if cb.limiter is None:
+        try:
+            state = cb._admit(func, args, kwargs)
+        except CircuitBreakerError:
+            if cb._fallback is _NO_FALLBACK:
+                raise
+            return cb._fallback
+        return await _call_async(cb, state, func, *args, **kwargs)
+
+    try:
+        start = cb._acquire_limiter()
+    except CircuitBreakerError:
+        if cb._fallback is _NO_FALLBACK:
+            raise
+        return cb._fallback
+
+    state = None
+    try:
+        state = cb._admit(func, args, kwargs)
+        ret = await _call_async(cb, state, func, *args, **kwargs)
+    except BaseException as e:
+        cb._release_limiter(start, e)
+        if state is None and isinstance(e, CircuitBreakerError) and \
+                cb._fallback is not _NO_FALLBACK:
+            return cb._fallback
+        raise
+    cb._release_limiter(start)
+    return ret
+
+
+async def _call_async(cb, state, func, *args, **kwargs):
+    """
+    Awaits `func`, admitted by the state `state` of `cb`, and records its
+    outcome.
+    """
+    start = _clock() if cb._mux.timed else None
+
+    try:
+        if cb.call_timeout is None:
+            ret = await func(*args, **kwargs)
+        else:
+            try:
+                ret = await asyncio.wait_for(func(*args, **kwargs),
+                                             cb.call_timeout)
+            except asyncio.TimeoutError:
+                # Not a TimeoutError before Python 3.11
+                raise CallTimeoutError(
+                    'Call timed out after %ss' % cb.call_timeout) from None
+    except asyncio.CancelledError:
+        cb._cancel_call(state)
+        raise
+    except BaseException as e:
+        cb._record_error(state, e, start=start)
+    else:
+        cb._record_result(state, ret, start)
+    return ret
+
+
+def coroutine_wrapper(cb, func):
+    """
+    Returns a coroutine function that awaits the coroutine function `func`
+    through the circuit breaker `cb`, for ``CircuitBreaker.__call__``.
+    """
+    @wraps(func)
+    async def _wrapper(*args, **kwargs):
+        return await call_async(cb, func, *args, **kwargs)
+    return _wrapper
+
+
+def async_generator_call(state, agen):
+    """
+    Guards the async generator `agen`, created by a call admitted by `state`,
+    and records its outcome once it is exhausted or fails.
+    """
+    return _AsyncGeneratorCall(state, agen)
+
+
+class _AsyncGeneratorCall(object):
+    """
+    Async iterator over a guarded async generator. If it is closed,
+    cancelled or dropped before it is exhausted, e.g. when an ``async for``
+    loop over it breaks early, the call counts neither as a success nor as a
+    failure.
+    """
+
+    def __init__(self, state, agen):
+        self._state = state
+        self._agen = agen
+        self._done = False
+
+    def __del__(self):
+        if not self._done:
+            self._done = True
+            self._state._breaker._cancel_call(self._state)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.asend(None)
+
+    async def asend(self, value):
+        return await self._step(self._agen.asend(value))
+
+    async def athrow(self, *args):
+        return await self._step(self._agen.athrow(*args))
+
+    async def aclose(self):
+        try:
+            await self._agen.aclose()
+        finally:
+            if not self._done:
+                self._done = True
+                self._state._breaker._cancel_call(self._state)
+
+    async def _step(self, awaitable):
+        """
+        Awaits a step of the async generator and records its outcome if it
+        was the last one.
+        """
+        if self._done:
+            return await awaitable
+        cb = self._state._breaker
+        try:
+            return await awaitable
+        except StopAsyncIteration:
+            self._done = True
+            cb._record_success(self._state)
+            raise
+        except asyncio.CancelledError:
+            self._done = True
+            cb._cancel_call(self._state)
+            raise
+        except BaseException as e:
+            self._done = True
+            cb._record_error(self._state, e)
+
+
+async def retry_async(policy, cb, func, *args, **kwargs):
+    """
+    Awaits `func` with the given `args` and `kwargs` through the circuit
+    breaker `cb`, retrying according to the ``RetryPolicy`` `policy`.
+    """
+    policy.budget.deposit()
+    attempt = 1
+    while True:
+        try:
+            return await call_async(cb, func, *args, **kwargs)
+        except Exception as e:
+            if not policy.should_retry(cb, e, attempt):
+                raise
+        await asyncio.sleep(policy.backoff(attempt))
+        attempt += 1
+
+
+async def hedged_call_async(group, func, *args, **kwargs):
+    """
+    Awaits `func(target, *args, **kwargs)` on one replica of the
+    ``HedgedGroup`` `group`, hedging the call on a second replica if it takes
+    longer than the hedge delay, and returns the first result.
+    """
+    primary = group._admit(func)
+    tasks = {_hedged_task(group, primary, func, args, kwargs): primary}
+    pending = set(tasks)
+    try:
+        done, pending = await asyncio.wait(pending, timeout=group.hedge_delay)
+        if not done:
+            try:
+                hedge = group._admit(func, skip=primary.cb)
+            except CircuitBreakerError:
+                pass
+            else:
+                tasks[_hedged_task(group, hedge, func, args, kwargs)] = hedge
+
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in pending:
+            task.cancel()
+            tasks[task].cb._cancel_call(tasks[task].state)
+
+
+def _hedged_task(group, call, func, args, kwargs):
+    """
+    Schedules `call` as a task.
+    """
+    return asyncio.ensure_future(
+        _hedged_attempt(group, call, func, args, kwargs))
+
+
+async def _hedged_attempt(group, call, func, args, kwargs):
+    """
+    Awaits `func` on the replica of `call` and records the outcome. Cancelled
+    attempts are released by the caller and not recorded.
+    """
+    start = _clock()
+    try:
+        ret = await func(call.target, *args, **kwargs)
+    except asyncio.CancelledError:
+        raise
+    except BaseException as e:
+        group._latency.add(_clock() - start)
+        call.cb._record_error(call.state, e, start=start)
+    group._latency.add(_clock() - start)
+    call.cb._record_result(call.state, ret, start)
+    return ret
+
+
+class AsyncioScheduler(object):
+    """
+    Runs callbacks after a delay on an asyncio event loop, for the health
+    checks whose check is a coroutine function.
+    """
+
+    def __init__(self, loop=None):
+        """
+        Creates a new scheduler for `loop`, by default the running event loop.
+        Raises ``RuntimeError`` if no loop is given and none is running.
+        """
+        if loop is None:
+            loop = _running_loop()
+            if loop is None:
+                raise RuntimeError('No running event loop; create the '
+                                   'scheduler from a coroutine or pass the '
+                                   'loop')
+        self._loop = loop
+
+    def schedule(self, delay, callback):
+        """
+        Calls `callback` with no arguments in `delay` seconds. Can be called
+        from any thread.
+        """
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, callback)
+
+
+def _running_loop():
+    """
+    Returns the running event loop, or `None`.
+    """
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:
+        # Python < 3.7
+        return asyncio._get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def probe_async(health, state):
+    """
+    Runs the coroutine check of the ``HealthCheck`` `health`, made while its
+    circuit breaker is in the open `state`, as a task of the running loop.
+    """
+    health._task = asyncio.ensure_future(_probe_async(health, state))
+
+
+async def _probe_async(health, state):
+    """
+    Awaits the check of `health` and reports whether it succeeded.
+    """
+    try:
+        healthy = bool(await health._check())
+    except Exception:
+        healthy = False
+    health._done(state, healthy)
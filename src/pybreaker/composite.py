@@ -0,0 +1,169 @@
+#-*- coding:utf-8 -*-
+
+"""
+Composite circuit breakers, whose state is aggregated from their children.
+"""
+
+import threading
+
+from pybreaker import CircuitBreakerError, CircuitBreakerListener
+
+__all__ = ('CompositeCircuitBreaker',)
+
+# States in which a child circuit breaker counts as open
+_DOWN_STATES = ('open', 'half-open')
+
+
+class CompositeCircuitBreaker(object):
+    """
+    Groups circuit breakers, e.g. the circuit breakers of the hosts of a
+    datacenter, and opens once a `threshold` share of them is open. While a
+    composite circuit breaker is open, calls through its closed or throttled
+    children are rejected as well; children that are open keep letting their
+    own trial calls through, so that the composite closes again once enough
+    of them have recovered.
+
+    Children can be ``CircuitBreaker`` instances or other composite circuit
+    breakers, which makes up a hierarchy (e.g. host, rack, datacenter). The
+    number of open children is updated incrementally from the children's
+    state changes, and a call is checked against each level above its
+    circuit breaker with a single read per level. The call is rejected by the
+    highest open level.
+    """
+
+    def __init__(self, children=(), threshold=0.5, name=None):
+        """
+        Creates a new composite circuit breaker that opens when at least a
+        `threshold` share (between 0 and 1) of its `children` are open.
+        """
+        self._lock = threading.Lock()
+        self._threshold = threshold
+        self._name = name
+        self._parent = None
+        self._children = ()
+        self._open_count = 0
+        self._open = False
+
+        for child in children:
+            self.add(child)
+
+    @property
+    def name(self):
+        """
+        Returns the name of this circuit breaker, or `None`.
+        """
+        return self._name
+
+    @property
+    def threshold(self):
+        """
+        Returns the share of open children at which this circuit breaker
+        opens.
+        """
+        return self._threshold
+
+    @property
+    def parent(self):
+        """
+        Returns the composite circuit breaker this one belongs to, or `None`.
+        """
+        return self._parent
+
+    @property
+    def children(self):
+        """
+        Returns the children of this circuit breaker.
+        """
+        return self._children
+
+    @property
+    def open_count(self):
+        """
+        Returns the number of children that are currently open.
+        """
+        return self._open_count
+
+    @property
+    def current_state(self):
+        """
+        Returns a string that identifies this circuit breaker's state, either
+        'open' or 'closed'.
+        """
+        return 'open' if self._open else 'closed'
+
+    def add(self, child):
+        """
+        Adds `child`, a ``CircuitBreaker`` or a composite circuit breaker that
+        does not belong to another composite yet.
+        """
+        if child.parent is not None:
+            raise ValueError('%r already belongs to %r' % (child, child.parent))
+
+        # The state of the child is read under its lock, which it holds when
+        # it reports its changes of state, so that none is missed or counted
+        # twice. Locks are taken child first, as when changes are reported.
+        with child._lock:
+            child._parent = self
+            if isinstance(child, CompositeCircuitBreaker):
+                is_open = child._open
+            else:
+                child.add_listener(_CompositeListener(self))
+                is_open = child.current_state in _DOWN_STATES
+
+            with self._lock:
+                self._children += (child,)
+                self._update(int(is_open))
+
+    def _child_changed(self, was_open, is_open):
+        """
+        Updates the number of open children after a child went from
+        `was_open` to `is_open`.
+        """
+        if was_open != is_open:
+            with self._lock:
+                self._update(1 if is_open else -1)
+
+    def _update(self, delta):
+        """
+        Adds `delta` to the number of open children, then opens or closes
+        this circuit breaker and notifies the parent if that changed its
+        state. Must be called with the lock held.
+        """
+        self._open_count += delta
+        was_open = self._open
+        self._open = (self._open_count > 0 and self._open_count >=
+                      self._threshold * len(self._children))
+
+        if self._parent is not None:
+            self._parent._child_changed(was_open, self._open)
+
+    def _check(self):
+        """
+        Raises ``CircuitBreakerError`` if this circuit breaker or one of its
+        ancestors is open, on behalf of the highest open one.
+        """
+        node, rejecting = self, None
+        while node is not None:
+            if node._open:
+                rejecting = node
+            node = node._parent
+
+        if rejecting is not None:
+            error_msg = 'Too many children open, circuit breaker %s open' % (
+                rejecting._name or '')
+            raise CircuitBreakerError(error_msg.rstrip())
+
+
+class _CompositeListener(CircuitBreakerListener):
+    """
+    Reports the state changes of a ``CircuitBreaker`` to the composite circuit
+    breaker it belongs to.
+    """
+
+    def __init__(self, composite):
+        self._composite = composite
+
+    def state_change(self, cb, old_state, new_state):
+        was_open = old_state is not None and old_state.name in _DOWN_STATES
+        self._composite._child_changed(was_open,
+                                       new_state.name in _DOWN_STATES)
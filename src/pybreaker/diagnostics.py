@@ -0,0 +1,177 @@
+#-*- coding:utf-8 -*-
+
+"""
+In-memory event ring buffers for post-mortem diagnostics.
+"""
+
+import itertools
+import sys
+import time
+import weakref
+from array import array
+
+from pybreaker import (CircuitBreakerEventListener, EVENT_SUCCESS,
+                       EVENT_FAILURE, EVENT_STATE_CHANGE, EVENT_REJECTED)
+
+__all__ = ('EventRing', 'dump_on_signal',)
+
+_KINDS = (EVENT_SUCCESS, EVENT_FAILURE, EVENT_STATE_CHANGE, EVENT_REJECTED)
+_KIND_CODES = dict((kind, code) for code, kind in enumerate(_KINDS))
+
+# Event rings alive in this process, dumped by the signal handler
+_rings = weakref.WeakValueDictionary()
+
+
+class EventRing(CircuitBreakerEventListener):
+    """
+    Keeps the last `size` events of a circuit breaker in preallocated arrays:
+    the time, kind and duration of calls and state changes, and for calls
+    that raised, the type name and message of the exception. Exceptions are
+    not kept, so neither are their tracebacks and frames.
+
+    Rejected calls are only recorded if `rejections` is set, so that during
+    an outage they do not push the failures that opened the circuit out of
+    the ring. Events are recorded without taking a lock; an event recorded
+    while the ring is being read may be missing from what is read.
+    """
+
+    def __init__(self, cb, size=256, rejections=False, max_message=200):
+        """
+        Attaches a new event ring of `size` events to the circuit breaker
+        `cb`. Exception messages are truncated to `max_message` characters.
+        """
+        self._breaker = cb
+        self._size = size
+        self._max_message = max_message
+        self._seq = itertools.count()
+        self._seqs = array('d', [-1.0]) * size
+        self._times = array('d', [0.0]) * size
+        self._durations = array('d', [-1.0]) * size
+        self._kinds = bytearray(size)
+        self._errors = [None] * size
+        self._messages = [None] * size
+
+        if rejections:
+            self.kinds = _KINDS
+        else:
+            self.kinds = _KINDS[:-1]
+        _rings[id(self)] = self
+        cb.add_listener(self)
+
+    @property
+    def breaker(self):
+        """
+        Returns the circuit breaker whose events are recorded.
+        """
+        return self._breaker
+
+    @property
+    def size(self):
+        """
+        Returns the maximum number of events kept.
+        """
+        return self._size
+
+    def stop(self):
+        """
+        Detaches this event ring from its circuit breaker. Events already
+        recorded are kept.
+        """
+        self._breaker.remove_listener(self)
+        _rings.pop(id(self), None)
+
+    def clear(self):
+        """
+        Forgets the events recorded so far.
+        """
+        for i in range(self._size):
+            self._seqs[i] = -1.0
+
+    def on_event(self, event):
+        """
+        Records `event` in the ring, in place of the oldest event.
+        """
+        seq = next(self._seq)
+        i = seq % self._size
+        self._seqs[i] = -1.0
+        self._times[i] = time.time()
+        self._kinds[i] = _KIND_CODES[event.kind]
+
+        if event.kind == EVENT_STATE_CHANGE:
+            self._durations[i] = -1.0
+            self._errors[i] = None
+            self._messages[i] = '%s -> %s' % (event.old_state.name,
+                                              event.new_state.name)
+        else:
+            duration = event.duration
+            self._durations[i] = -1.0 if duration is None else duration
+            exc = event.exception
+            if exc is None:
+                self._errors[i] = self._messages[i] = None
+            else:
+                self._errors[i] = type(exc).__name__
+                try:
+                    self._messages[i] = str(exc)[:self._max_message]
+                except Exception:
+                    self._messages[i] = '<unprintable>'
+        self._seqs[i] = seq
+
+    def events(self):
+        """
+        Returns the recorded events, oldest first, as tuples of the time of
+        the event (as returned by ``time.time()``), its kind (e.g.
+        ``EVENT_FAILURE``), the duration of the call or `None`, the type name
+        of the exception or `None`, and its message or, for state changes,
+        the old and new states, e.g. ``'closed -> open'``.
+        """
+        slots = [(seq, i) for i, seq in enumerate(self._seqs) if seq >= 0]
+        slots.sort()
+        events = []
+        for seq, i in slots:
+            duration = self._durations[i]
+            events.append((self._times[i], _KINDS[self._kinds[i]],
+                           None if duration < 0 else duration,
+                           self._errors[i], self._messages[i]))
+        return events
+
+    def dump(self, file=None):
+        """
+        Writes the recorded events to `file`, by default ``sys.stderr``, one
+        line per event.
+        """
+        if file is None:
+            file = sys.stderr
+        name = self._breaker.name or 'circuit breaker %x' % id(self._breaker)
+        lines = []
+        for timestamp, kind, duration, error, message in self.events():
+            line = '%s.%03d %s %s' % (
+                time.strftime('%Y-%m-%d %H:%M:%S',
+                              time.localtime(timestamp)),
+                int(timestamp * 1000) % 1000, name, kind)
+            if duration is not None:
+                line += ' %.6fs' % duration
+            if error is not None:
+                line += ' %s: %s' % (error, message)
+            elif message is not None:
+                line += ' ' + message
+            lines.append(line + '\n')
+        file.write(''.join(lines))
+
+
+def dump_on_signal(path, signum=None):
+    """
+    Installs a handler for the signal `signum`, by default ``SIGUSR1``, that
+    appends the events of all the event rings in this process to the file at
+    `path`. Must be called from the main thread; returns the previous
+    handler.
+    """
+    import signal
+    if signum is None:
+        signum = signal.SIGUSR1
+
+    def handler(signum, frame):
+        with open(path, 'a') as file:
+            for ring in list(_rings.values()):
+                ring.dump(file)
+
+    return signal.signal(signum, handler)
@@ -0,0 +1,125 @@
+#-*- coding:utf-8 -*-
+
+"""
+Executor wrapper that guards the submitted calls with a circuit breaker.
+"""
+
+from functools import partial
+
+from pybreaker import _clock
+
+__all__ = ('BreakerExecutor',)
+
+
+class BreakerExecutor(object):
+    """
+    Wraps a ``concurrent.futures`` executor, e.g. a ``ThreadPoolExecutor`` or
+    a ``ProcessPoolExecutor``, so that calls are only submitted if the circuit
+    breaker admits them, and their outcome is recorded once their future is
+    done.
+
+    Outcomes are recorded by done-callbacks, which run in the process that
+    submitted the calls: with a process pool, only the function and its
+    arguments are sent to the workers, and the results and exceptions they
+    send back are counted by the circuit breaker of the parent process. Call
+    durations are measured from the submission, so they include the time
+    spent waiting for a worker.
+    """
+
+    def __init__(self, cb, executor):
+        """
+        Creates a new wrapper that submits the calls admitted by the circuit
+        breaker `cb` to `executor`.
+        """
+        self._breaker = cb
+        self._executor = executor
+
+    @property
+    def breaker(self):
+        """
+        Returns the circuit breaker guarding the submitted calls.
+        """
+        return self._breaker
+
+    @property
+    def executor(self):
+        """
+        Returns the wrapped executor.
+        """
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Submits `fn` to be called with the given `args` and `kwargs`, and
+        returns its future. Raises ``CircuitBreakerError`` without submitting
+        the call if the circuit breaker does not admit it.
+        """
+        cb = self._breaker
+        state = cb._before_call(fn, *args, **kwargs)
+        start = _clock() if cb._mux.timed else None
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            cb._cancel_call(state)
+            raise
+        future.add_done_callback(partial(self._done, state, start))
+        return future
+
+    def map(self, fn, *iterables, **kwargs):
+        """
+        Returns an iterator over the results of `fn` called with the items of
+        `iterables`, like ``Executor.map``. All the calls are submitted up
+        front, so a rejected call raises before any result is returned, and
+        the calls submitted before it are cancelled.
+        """
+        timeout = kwargs.get('timeout')
+        end = None if timeout is None else _clock() + timeout
+        fs = []
+        try:
+            for args in zip(*iterables):
+                fs.append(self.submit(fn, *args))
+        except BaseException:
+            for future in fs:
+                future.cancel()
+            raise
+
+        def result_iterator():
+            try:
+                for future in fs:
+                    if end is None:
+                        yield future.result()
+                    else:
+                        yield future.result(end - _clock())
+            finally:
+                for future in fs:
+                    future.cancel()
+        return result_iterator()
+
+    def shutdown(self, wait=True):
+        """
+        Shuts the wrapped executor down.
+        """
+        self._executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+        return False
+
+    def _done(self, state, start, future):
+        """
+        Records the outcome of a call admitted by `state`, once its `future`
+        is done. Cancelled calls count neither as successes nor as failures.
+        """
+        if future.cancelled():
+            self._breaker._cancel_call(state)
+            return
+
+        exc = future.exception()
+        if exc is None:
+            self._breaker._record_result(state, future.result(), start)
+        else:
+            self._breaker._record_error(state, exc, reraise=False,
+                                        start=start)
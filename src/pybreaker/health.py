@@ -0,0 +1,155 @@
+#-*- coding:utf-8 -*-
+
+"""
+Health checks that recover open circuit breakers without live traffic.
+"""
+
+import inspect
+from functools import partial
+
+from pybreaker import CircuitBreakerListener
+from pybreaker.timeouts import TimeoutPool
+
+__all__ = ('HealthCheck',)
+
+_iscoroutinefunction = getattr(inspect, 'iscoroutinefunction',
+                               lambda func: False)
+
+
+class HealthCheck(CircuitBreakerListener):
+    """
+    Probes the backend guarded by a circuit breaker while its circuit is
+    open, instead of letting a live call through as the trial call.
+
+    Every `interval` seconds while the circuit is open, `check` is called; as
+    soon as it returns a true value, the circuit is closed (or half-opened, if
+    `half_open` is set, so that the next call is a trial call). Exceptions
+    raised by `check` count as failed checks. As long as the health check is
+    attached, the open circuit no longer moves to half-open on its own once
+    the reset timeout elapses.
+
+    Checks are scheduled on a `scheduler`, by default ``TimerWheel.default``,
+    and run on the worker threads of `pool`, by default a ``TimeoutPool``
+    shared by all health checks, so that a slow check delays neither the
+    timers of the scheduler nor the other checks. A check that finds no idle
+    worker counts as failed. If `check` is a coroutine function, checks run
+    as tasks of an asyncio event loop instead, scheduled by default by a
+    ``pybreaker.aio.AsyncioScheduler`` for the running event loop; without a
+    `scheduler`, such a health check must be created from a coroutine.
+    """
+
+    def __init__(self, cb, check, interval=None, half_open=False,
+            scheduler=None, pool=None):
+        """
+        Attaches a new health check to the circuit breaker `cb`. `interval`
+        defaults to the circuit breaker's reset timeout.
+        """
+        self._breaker = cb
+        self._check = check
+        self._interval = interval
+        self._half_open = half_open
+        self._async = _iscoroutinefunction(check)
+
+        if scheduler is None:
+            if self._async:
+                from pybreaker.aio import AsyncioScheduler
+                scheduler = AsyncioScheduler()
+            else:
+                from pybreaker.timers import TimerWheel
+                scheduler = TimerWheel.default
+        self._scheduler = scheduler
+        self._pool = pool or HealthCheck.pool
+
+        with cb._lock:
+            cb._health_check = self
+            cb.add_listener(self)
+            if cb.current_state == 'open':
+                self._schedule(cb.state)
+
+    @property
+    def breaker(self):
+        """
+        Returns the circuit breaker this health check recovers.
+        """
+        return self._breaker
+
+    @property
+    def interval(self):
+        """
+        Returns the time, in seconds, between two checks.
+        """
+        if self._interval is None:
+            return self._breaker.reset_timeout
+        return self._interval
+
+    def stop(self):
+        """
+        Detaches this health check from its circuit breaker. Pending checks
+        are dropped.
+        """
+        with self._breaker._lock:
+            if self._breaker._health_check is self:
+                self._breaker._health_check = None
+            self._breaker.remove_listener(self)
+
+    def state_change(self, cb, old_state, new_state):
+        if new_state.name == 'open':
+            self._schedule(new_state)
+
+    def _schedule(self, state):
+        """
+        Schedules a check while the circuit breaker is in the open `state`.
+        """
+        self._scheduler.schedule(self.interval, partial(self._probe, state))
+
+    def _probe(self, state):
+        """
+        Runs a check, unless the circuit breaker has left the open `state` or
+        this health check was stopped.
+        """
+        if not self._is_current(state):
+            return
+        if self._async:
+            from pybreaker.aio import probe_async
+            probe_async(self, state)
+            return
+
+        if self._pool._submit(self._run_check, (state,), {}) is None:
+            self._done(state, False)
+
+    def _run_check(self, state):
+        """
+        Runs a check on a worker thread and reports whether it succeeded.
+        """
+        try:
+            healthy = bool(self._check())
+        except Exception:
+            healthy = False
+        self._done(state, healthy)
+
+    def _done(self, state, healthy):
+        """
+        Closes or half-opens the circuit breaker if the check made while it
+        was in the open `state` succeeded, or schedules the next check.
+        """
+        cb = self._breaker
+        with cb._lock:
+            if not self._is_current(state):
+                return
+            if not healthy:
+                self._schedule(state)
+            elif self._half_open:
+                cb.half_open()
+            else:
+                cb.close()
+
+    def _is_current(self, state):
+        """
+        Returns whether the circuit breaker is still in the open `state` and
+        this health check is still attached.
+        """
+        return (self._breaker._health_check is self and
+                self._breaker._state is state)
+
+
+HealthCheck.pool = TimeoutPool(max_workers=8)
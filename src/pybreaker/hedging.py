@@ -0,0 +1,218 @@
+#-*- coding:utf-8 -*-
+
+"""
+Hedged requests across replicas guarded by their own circuit breakers.
+"""
+
+import itertools
+import threading
+
+from pybreaker import CircuitBreakerError, _clock
+
+__all__ = ('HedgedGroup',)
+
+
+class HedgedGroup(object):
+    """
+    Group of replicas of the same service, each guarded by its own circuit
+    breaker, for latency-critical reads.
+
+    A call is sent to one replica and, if it has not returned after the hedge
+    delay, a duplicate is sent to a second replica; the first result wins.
+    Replicas whose circuit breaker rejects the call (e.g. because it is open)
+    are skipped, and the losing call is cancelled: it counts neither as a
+    success nor as a failure of its replica.
+    """
+
+    def __init__(self, replicas, executor=None, hedge_delay=None,
+            percentile=95, initial_delay=0.05, window=100):
+        """
+        Creates a new group from `replicas`, a sequence of `(target, cb)`
+        pairs where `cb` is the circuit breaker guarding `target`.
+
+        Calls run on `executor`, a ``concurrent.futures`` executor; a thread
+        pool is created on first use if none is given. Unless `hedge_delay` is
+        given, the hedge delay is the `percentile` of the latency of the last
+        `window` calls, or `initial_delay` until enough calls were made.
+        """
+        self._replicas = tuple(replicas)
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+        self._hedge_delay = hedge_delay
+        self._initial_delay = initial_delay
+        self._latency = _LatencyTracker(window, percentile)
+        self._counter = itertools.count()
+
+    @property
+    def replicas(self):
+        """
+        Returns the `(target, cb)` pairs of this group.
+        """
+        return self._replicas
+
+    @property
+    def hedge_delay(self):
+        """
+        Returns the number of seconds to wait for a call before hedging it.
+        """
+        if self._hedge_delay is not None:
+            return self._hedge_delay
+        delay = self._latency.percentile()
+        if delay is None:
+            return self._initial_delay
+        return delay
+
+    def _admit(self, func, skip=None):
+        """
+        Returns a ``_HedgedCall`` for the next replica, other than the one
+        guarded by `skip`, whose circuit breaker admits a call to `func`.
+        Raises ``CircuitBreakerError`` if there is none.
+        """
+        count = len(self._replicas)
+        start = next(self._counter)
+        for i in range(count):
+            target, cb = self._replicas[(start + i) % count]
+            if cb is skip:
+                continue
+            try:
+                state = cb._before_call(func, target)
+            except CircuitBreakerError:
+                continue
+            return _HedgedCall(target, cb, state)
+        raise CircuitBreakerError('No replica available, circuit breakers open')
+
+    def _run(self, call, func, args, kwargs):
+        """
+        Calls `func` on the replica of `call` and records the outcome, unless
+        the call has been cancelled in the meantime.
+        """
+        start = _clock()
+        try:
+            ret = func(call.target, *args, **kwargs)
+        except BaseException as e:
+            self._latency.add(_clock() - start)
+            if call.cancelled:
+                call.cb._cancel_call(call.state)
+                raise
+            call.cb._record_error(call.state, e, start=start)
+        self._latency.add(_clock() - start)
+        if call.cancelled:
+            call.cb._cancel_call(call.state)
+        else:
+            call.cb._record_result(call.state, ret, start)
+        return ret
+
+    def _submit(self, call, func, args, kwargs):
+        """
+        Runs `call` on the executor.
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=4 * len(self._replicas))
+        call.future = self._executor.submit(self._run, call, func, args, kwargs)
+        return call
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func(target, *args, **kwargs)` on one replica, hedging the call
+        on a second replica if it takes longer than the hedge delay, and
+        returns the first result. Requires ``concurrent.futures``.
+        """
+        from concurrent.futures import wait, FIRST_COMPLETED
+
+        primary = self._submit(self._admit(func), func, args, kwargs)
+        calls = [primary]
+        done, _ = wait([primary.future], timeout=self.hedge_delay)
+        if not done:
+            try:
+                calls.append(self._submit(
+                    self._admit(func, skip=primary.cb), func, args, kwargs))
+            except CircuitBreakerError:
+                pass
+
+        pending = dict((call.future, call) for call in calls)
+        while True:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                if future.exception() is None or not pending:
+                    for call in pending.values():
+                        call.cancel()
+                    return future.result()
+
+    def call_async(self, func, *args, **kwargs):
+        """
+        Returns a coroutine that awaits `func(target, *args, **kwargs)` on one
+        replica, hedging the call on a second replica if it takes longer than
+        the hedge delay. Requires Python 3.5+.
+        """
+        from pybreaker.aio import hedged_call_async
+        return hedged_call_async(self, func, *args, **kwargs)
+
+
+class _HedgedCall(object):
+    """
+    Call to one of the replicas of a ``HedgedGroup``.
+    """
+
+    __slots__ = ('target', 'cb', 'state', 'future', 'cancelled')
+
+    def __init__(self, target, cb, state):
+        self.target = target
+        self.cb = cb
+        self.state = state
+        self.future = None
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Cancels this call. If it is already running, its outcome is discarded
+        once it returns.
+        """
+        self.cancelled = True
+        if self.future.cancel():
+            self.cb._cancel_call(self.state)
+
+
+class _LatencyTracker(object):
+    """
+    Keeps the durations of the last `window` calls to compute a percentile
+    of their latency. The percentile is only recomputed every `window / 10`
+    calls.
+    """
+
+    def __init__(self, window=100, percentile=95):
+        self._lock = threading.Lock()
+        self._samples = [0.0] * window
+        self._percentile = percentile
+        self._count = 0
+        self._cached = None
+        self._cached_at = 0
+        self._refresh = max(1, window // 10)
+
+    def add(self, duration):
+        """
+        Records the duration of a call, in seconds.
+        """
+        with self._lock:
+            self._samples[self._count % len(self._samples)] = duration
+            self._count += 1
+
+    def percentile(self):
+        """
+        Returns the configured percentile of the recorded durations, or `None`
+        until enough calls were recorded.
+        """
+        count = self._count
+        if count < self._refresh * 2:
+            return None
+        if self._cached is None or count - self._cached_at >= self._refresh:
+            with self._lock:
+                samples = sorted(self._samples[:min(count, len(self._samples))])
+            index = int(len(samples) * self._percentile / 100.0)
+            self._cached = samples[min(index, len(samples) - 1)]
+            self._cached_at = count
+        return self._cached
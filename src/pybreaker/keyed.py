@@ -0,0 +1,315 @@
+#-*- coding:utf-8 -*-
+
+"""
+Circuit breakers keyed by the arguments of the guarded calls.
+"""
+
+import threading
+from array import array
+from functools import wraps
+
+from pybreaker import CircuitBreakerError, _clock
+
+__all__ = ('KeyedCircuitBreaker',)
+
+_CLOSED, _OPEN, _HALF_OPEN = 0, 1, 2
+_STATE_NAMES = ('closed', 'open', 'half-open')
+
+# Multiplier of the Fibonacci hashing of keys into the index
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+class KeyedCircuitBreaker(object):
+    """
+    Keeps a separate circuit per key, e.g. per tenant or per shard, where the
+    key of each call is derived from its arguments by `key_func`. A failing
+    key opens its own circuit only, without affecting calls for other keys.
+
+    Each key follows the rules of the ``CircuitBreaker`` states (closed, open,
+    half-open with a single trial call), but rather than a circuit breaker
+    object per key, the state of the keys is kept in parallel arrays indexed
+    by a slot number: a state byte, a failure count and the time the circuit
+    was opened. Keys are found through an open-addressing index of slot
+    numbers rather than a dict, so that each key is only referenced once, by
+    the list of the keys of the slots. At most `max_keys` keys are tracked;
+    once full, the slot of a key that has not been used recently is reused,
+    following the CLOCK approximation of LRU eviction. An evicted key starts
+    over as closed.
+    """
+
+    def __init__(self, key_func, fail_max=5, reset_timeout=60, exclude=None,
+            max_keys=10000, name=None):
+        """
+        Creates a new keyed circuit breaker that tracks at most `max_keys`
+        keys. The other parameters apply to each key as they do to a
+        ``CircuitBreaker``.
+        """
+        self._lock = threading.Lock()
+        self._key_func = key_func
+        self._fail_max = fail_max
+        self._reset_timeout = reset_timeout
+        self._excluded_exceptions = tuple(exclude or ())
+        self._max_keys = max_keys
+        self._name = name
+
+        # Index of the slots by key (-1 for free entries, probed linearly from
+        # the home entry of each key), and the key, state, failure count,
+        # opening time and reference bit of each slot
+        self._index = array('i', [-1]) * 8
+        self._shift = 64 - 3
+        self._keys = []
+        self._states = array('b')
+        self._fails = array('i')
+        self._opened_at = array('d')
+        self._referenced = bytearray()
+        self._hand = 0
+
+    @property
+    def name(self):
+        """
+        Returns the name of this circuit breaker, or `None`.
+        """
+        return self._name
+
+    @property
+    def fail_max(self):
+        """
+        Returns the maximum number of failures tolerated by a key before its
+        circuit is opened.
+        """
+        return self._fail_max
+
+    @property
+    def reset_timeout(self):
+        """
+        Once a key's circuit is opened, returns the time it stays open before
+        letting a trial call through.
+        """
+        return self._reset_timeout
+
+    @property
+    def max_keys(self):
+        """
+        Returns the maximum number of keys tracked at a time.
+        """
+        return self._max_keys
+
+    def __len__(self):
+        """
+        Returns the number of keys currently tracked.
+        """
+        return len(self._keys)
+
+    def key(self, *args, **kwargs):
+        """
+        Returns the key of a call with the given `args` and `kwargs`.
+        """
+        return self._key_func(*args, **kwargs)
+
+    def current_state(self, key):
+        """
+        Returns the name of the state of the circuit of `key`. Keys that are
+        not tracked are closed.
+        """
+        with self._lock:
+            slot = self._find(key)[0]
+            return 'closed' if slot is None else _STATE_NAMES[self._states[slot]]
+
+    def fail_counter(self, key):
+        """
+        Returns the current number of consecutive failures of `key`.
+        """
+        with self._lock:
+            slot = self._find(key)[0]
+            return 0 if slot is None else self._fails[slot]
+
+    def is_system_error(self, exception):
+        """
+        Returns whether the exception `exception` is considered a signal of
+        system malfunction.
+        """
+        return not issubclass(type(exception), self._excluded_exceptions)
+
+    def open(self, key):
+        """
+        Opens the circuit of `key`.
+        """
+        with self._lock:
+            slot = self._slot(key)
+            self._states[slot] = _OPEN
+            self._opened_at[slot] = _clock()
+
+    def close(self, key):
+        """
+        Closes the circuit of `key`.
+        """
+        with self._lock:
+            slot = self._find(key)[0]
+            if slot is not None:
+                self._states[slot] = _CLOSED
+                self._fails[slot] = 0
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func` with the given `args` and `kwargs` according to the rules
+        implemented by the state of the circuit of the call's key.
+        """
+        key = self._key_func(*args, **kwargs)
+        slot, trial = self._before_call(key)
+        try:
+            ret = func(*args, **kwargs)
+        except BaseException as e:
+            self._record(key, slot, trial, self.is_system_error(e))
+            raise
+        self._record(key, slot, trial, False)
+        return ret
+
+    def __call__(self, func):
+        """
+        Returns a wrapper that calls the function `func` according to the rules
+        implemented by the state of the circuit of each call's key.
+        """
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return _wrapper
+
+    def _before_call(self, key):
+        """
+        Checks whether the circuit of `key` allows a call. Returns the slot of
+        the key and whether the call is the trial call of a half-open circuit.
+        """
+        with self._lock:
+            slot = self._slot(key)
+            self._referenced[slot] = 1
+            state = self._states[slot]
+            if state == _CLOSED:
+                return slot, False
+            if state == _HALF_OPEN:
+                error_msg = 'Trial call in progress, circuit breaker half-open'
+            elif _clock() < self._opened_at[slot] + self._reset_timeout:
+                error_msg = 'Timeout not elapsed yet, circuit breaker still open'
+            else:
+                self._states[slot] = _HALF_OPEN
+                return slot, True
+        raise CircuitBreakerError(error_msg)
+
+    def _record(self, key, slot, trial, failed):
+        """
+        Records the outcome of a call admitted for `key`. Outcomes of calls
+        whose key has since been evicted, or whose circuit has since changed
+        state, are ignored. Raises ``CircuitBreakerError`` if the failure
+        opens the circuit.
+        """
+        with self._lock:
+            if self._keys[slot] != key:
+                return
+            if self._states[slot] != (_HALF_OPEN if trial else _CLOSED):
+                return
+            if not failed:
+                self._states[slot] = _CLOSED
+                self._fails[slot] = 0
+                return
+            self._fails[slot] += 1
+            if not trial and self._fails[slot] < self._fail_max:
+                return
+            self._states[slot] = _OPEN
+            self._opened_at[slot] = _clock()
+
+        if trial:
+            raise CircuitBreakerError('Trial call failed, circuit breaker opened')
+        error_msg = 'Failures threshold reached, circuit breaker opened'
+        raise CircuitBreakerError(error_msg)
+
+    def _home(self, key):
+        """
+        Returns the entry of the index where the probing for `key` starts.
+        """
+        return ((hash(key) * _GOLDEN) & _MASK64) >> self._shift
+
+    def _find(self, key):
+        """
+        Returns the slot of `key`, or `None` if the key is not tracked, and
+        the entry of the index that holds the slot or, if none does, the free
+        entry where it would go.
+        """
+        index, keys = self._index, self._keys
+        mask = len(index) - 1
+        entry = self._home(key)
+        while True:
+            slot = index[entry]
+            if slot < 0:
+                return None, entry
+            if keys[slot] == key:
+                return slot, entry
+            entry = (entry + 1) & mask
+
+    def _slot(self, key):
+        """
+        Returns the slot of `key`, assigning one if the key is not tracked.
+        """
+        slot, entry = self._find(key)
+        if slot is not None:
+            return slot
+
+        slot = len(self._keys)
+        if slot < self._max_keys:
+            self._keys.append(key)
+            self._states.append(_CLOSED)
+            self._fails.append(0)
+            self._opened_at.append(0.0)
+            self._referenced.append(0)
+            if 2 * len(self._keys) > len(self._index):
+                self._grow()
+                return slot
+        else:
+            slot = self._evict()
+            self._keys[slot] = key
+            self._states[slot] = _CLOSED
+            self._fails[slot] = 0
+            entry = self._find(key)[1]
+        self._index[entry] = slot
+        return slot
+
+    def _grow(self):
+        """
+        Doubles the size of the index, keeping it at most half full, and
+        indexes all the slots anew.
+        """
+        self._index = array('i', [-1]) * (2 * len(self._index))
+        self._shift -= 1
+        for slot, key in enumerate(self._keys):
+            self._index[self._find(key)[1]] = slot
+
+    def _remove(self, entry):
+        """
+        Frees the entry `entry` of the index, moving back the entries probed
+        past it so that they can still be found.
+        """
+        index, keys = self._index, self._keys
+        mask = len(index) - 1
+        free = entry
+        while True:
+            entry = (entry + 1) & mask
+            slot = index[entry]
+            if slot < 0:
+                break
+            home = self._home(keys[slot])
+            if (entry - home) & mask >= (entry - free) & mask:
+                index[free] = slot
+                free = entry
+        index[free] = -1
+
+    def _evict(self):
+        """
+        Frees the slot of a key that has not been used since the clock hand
+        last went past it, and returns that slot.
+        """
+        referenced, hand = self._referenced, self._hand
+        while referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % self._max_keys
+        self._hand = (hand + 1) % self._max_keys
+        self._remove(self._find(self._keys[hand])[1])
+        return hand
@@ -0,0 +1,169 @@
+#-*- coding:utf-8 -*-
+
+"""
+Adaptive concurrency limiters for ``CircuitBreaker``.
+"""
+
+import threading
+
+__all__ = ('AdaptiveLimiter', 'AIMDLimiter', 'GradientLimiter',)
+
+
+class AdaptiveLimiter(object):
+    """
+    Base class for adaptive concurrency limiters.
+
+    A limiter keeps track of the number of calls in flight and rejects calls
+    once that number reaches the current limit. The limit itself is adjusted
+    after every call from the observed round trip time (`rtt`) and whether the
+    call failed (`dropped`). Subclasses implement the adjustment algorithm by
+    overriding `_compute_limit`.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=1000):
+        """
+        Creates a new limiter that starts at `initial_limit` and is kept
+        between `min_limit` and `max_limit`.
+        """
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = self._clamp(initial_limit)
+
+    @property
+    def limit(self):
+        """
+        Returns the current maximum number of calls allowed in flight.
+        """
+        return self._limit
+
+    @property
+    def inflight(self):
+        """
+        Returns the number of calls currently in flight.
+        """
+        return self._inflight
+
+    def acquire(self):
+        """
+        Takes a slot for a new call. Returns `False` if the limit has been
+        reached, in which case the call should be rejected.
+        """
+        with self._lock:
+            if self._inflight >= self._limit:
+                return False
+            self._inflight += 1
+            return True
+
+    def release(self, rtt=None, dropped=False):
+        """
+        Gives back the slot taken by a call that took `rtt` seconds and
+        returns the `(old_limit, new_limit)` pair. If `rtt` is `None`, the call
+        is not used as a sample to adjust the limit.
+        """
+        with self._lock:
+            inflight = self._inflight
+            self._inflight -= 1
+            old_limit = self._limit
+            if rtt is not None:
+                self._limit = self._clamp(
+                    self._compute_limit(rtt, inflight, dropped))
+            return old_limit, self._limit
+
+    def _clamp(self, limit):
+        """
+        Keeps `limit` within the configured bounds.
+        """
+        return int(max(self._min_limit, min(self._max_limit, limit)))
+
+    def _compute_limit(self, rtt, inflight, dropped):
+        """
+        Override this method to compute the new limit after a call that took
+        `rtt` seconds with `inflight` calls in flight.
+        """
+        return self._limit
+
+
+class AIMDLimiter(AdaptiveLimiter):
+    """
+    Additive increase / multiplicative decrease limiter. The limit grows by one
+    after each successful call made while the limiter is well utilized, and is
+    multiplied by `backoff_ratio` after each failure or each call slower than
+    `timeout` seconds.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=1000,
+            backoff_ratio=0.9, timeout=None):
+        """
+        Creates a new AIMD limiter with the given parameters.
+        """
+        super(AIMDLimiter, self).__init__(initial_limit, min_limit, max_limit)
+        self._backoff_ratio = backoff_ratio
+        self._timeout = timeout
+
+    def _compute_limit(self, rtt, inflight, dropped):
+        """
+        Backs off on failures and slow calls; grows otherwise.
+        """
+        limit = self._limit
+        if dropped or (self._timeout is not None and rtt > self._timeout):
+            return limit * self._backoff_ratio
+        if inflight * 2 >= limit:
+            return limit + 1
+        return limit
+
+
+class GradientLimiter(AdaptiveLimiter):
+    """
+    Gradient based limiter, in the spirit of TCP Vegas. The limit follows the
+    ratio between the long term average round trip time and the latest one:
+    when latency grows because requests start queueing on the backend, the
+    limit shrinks; when latency is stable, the limit grows by a small queue
+    allowance. Failures are handled as in ``AIMDLimiter``.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=1000,
+            smoothing=0.2, tolerance=1.5, long_window=600, backoff_ratio=0.9):
+        """
+        Creates a new gradient limiter with the given parameters. The long
+        term round trip time is an exponential moving average over roughly
+        `long_window` samples.
+        """
+        super(GradientLimiter, self).__init__(
+            initial_limit, min_limit, max_limit)
+        self._smoothing = smoothing
+        self._tolerance = tolerance
+        self._long_decay = 2.0 / (long_window + 1)
+        self._backoff_ratio = backoff_ratio
+        self._long_rtt = None
+        self._estimate = float(self._limit)
+
+    def _compute_limit(self, rtt, inflight, dropped):
+        """
+        Moves the limit towards `limit * gradient + sqrt(limit)`.
+        """
+        if dropped:
+            self._estimate = max(
+                self._min_limit, self._estimate * self._backoff_ratio)
+            return self._estimate
+
+        if self._long_rtt is None:
+            self._long_rtt = rtt
+        else:
+            self._long_rtt += (rtt - self._long_rtt) * self._long_decay
+
+        # Do not grow the limit when the application does not use it
+        if inflight * 2 < self._estimate:
+            return self._estimate
+
+        gradient = 1.0
+        if rtt > 0:
+            gradient = max(0.5, min(1.0,
+                self._tolerance * self._long_rtt / rtt))
+        new_limit = self._estimate * gradient + self._estimate ** 0.5
+        self._estimate = ((1 - self._smoothing) * self._estimate +
+                          self._smoothing * new_limit)
+        self._estimate = max(self._min_limit,
+                             min(self._max_limit, self._estimate))
+        return self._estimate
@@ -0,0 +1,192 @@
+#-*- coding:utf-8 -*-
+
+"""
+Breaker-aware load balancing across a pool of endpoints.
+"""
+
+import threading
+
+from pybreaker import (CircuitBreakerError, CircuitBreakerListener, _clock,
+                       _random)
+
+__all__ = ('CircuitBreakerPool',)
+
+
+class CircuitBreakerPool(object):
+    """
+    Load balances calls across a pool of endpoints, each guarded by its own
+    circuit breaker, choosing only among endpoints that admit calls.
+
+    Endpoints are kept in two lists, updated from the circuit breakers' state
+    changes: "available" endpoints (closed or throttled) and "recovering"
+    endpoints (open or half-open). Each pick is O(1): two random available
+    endpoints are compared by their number of calls in flight, weighted by
+    their recent failure rate, and the best one wins (power of two choices).
+    A `probe_ratio` share of the picks goes to a random recovering endpoint
+    instead, so that half-open endpoints only get a small probe share of the
+    traffic.
+    """
+
+    def __init__(self, endpoints, probe_ratio=0.05, decay=0.9):
+        """
+        Creates a new pool from `endpoints`, a sequence of `(target, cb)`
+        pairs where `cb` is the circuit breaker guarding `target`. The failure
+        rate of each endpoint is an exponential moving average with the given
+        `decay`.
+        """
+        self._lock = threading.Lock()
+        self._probe_ratio = probe_ratio
+        self._decay = decay
+        self._endpoints = tuple(_PoolEndpoint(target, cb)
+                                for target, cb in endpoints)
+        self._available = ()
+        self._recovering = ()
+
+        for endpoint in self._endpoints:
+            self._move(endpoint, endpoint.cb.current_state)
+            endpoint.cb.add_listener(_PoolListener(self, endpoint))
+
+    @property
+    def endpoints(self):
+        """
+        Returns the `(target, cb)` pairs of this pool.
+        """
+        return tuple((e.target, e.cb) for e in self._endpoints)
+
+    @property
+    def available(self):
+        """
+        Returns the targets of the endpoints whose circuit is closed or
+        throttled.
+        """
+        return tuple(e.target for e in self._available)
+
+    def _move(self, endpoint, state_name):
+        """
+        Moves `endpoint` to the list that matches its new state. The lists are
+        replaced rather than mutated, so picks can read them without the lock.
+        """
+        available = state_name in ('closed', 'throttled')
+        with self._lock:
+            self._available = tuple(e for e in self._available
+                                    if e is not endpoint)
+            self._recovering = tuple(e for e in self._recovering
+                                     if e is not endpoint)
+            if available:
+                self._available += (endpoint,)
+            else:
+                self._recovering += (endpoint,)
+
+    def _pick(self, probe=True):
+        """
+        Returns the endpoint the next call should go to, or `None` if there
+        is none.
+        """
+        available, recovering = self._available, self._recovering
+        if recovering and probe and (
+                not available or _random() < self._probe_ratio):
+            return recovering[int(_random() * len(recovering))]
+        if not available:
+            return None
+
+        count = len(available)
+        i = int(_random() * count)
+        if count == 1:
+            return available[i]
+        j = int(_random() * (count - 1))
+        if j >= i:
+            j += 1
+
+        first, second = available[i], available[j]
+        if second.score() < first.score():
+            return second
+        return first
+
+    def _admit(self, func):
+        """
+        Returns a `(endpoint, state)` pair for the endpoint whose circuit
+        breaker admitted a call to `func`. Raises ``CircuitBreakerError`` if
+        no endpoint admits the call.
+        """
+        for probe in (True, False):
+            endpoint = self._pick(probe)
+            if endpoint is None:
+                continue
+            try:
+                return endpoint, endpoint.cb._before_call(func, endpoint.target)
+            except CircuitBreakerError:
+                pass
+        raise CircuitBreakerError('No endpoint available, circuit breakers open')
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func(target, *args, **kwargs)` on the endpoint chosen by this
+        pool, according to the rules implemented by the current state of its
+        circuit breaker.
+        """
+        endpoint, state = self._admit(func)
+        start = _clock() if endpoint.cb._mux.timed else None
+        endpoint.acquire()
+        try:
+            ret = func(endpoint.target, *args, **kwargs)
+        except BaseException as e:
+            endpoint.cb._record_error(state, e, start=start)
+        else:
+            endpoint.cb._record_result(state, ret, start)
+        finally:
+            endpoint.release()
+        return ret
+
+
+class _PoolEndpoint(object):
+    """
+    Endpoint of a ``CircuitBreakerPool``.
+    """
+
+    __slots__ = ('target', 'cb', 'inflight', 'failure_rate', '_lock')
+
+    def __init__(self, target, cb):
+        self.target = target
+        self.cb = cb
+        self.inflight = 0
+        self.failure_rate = 0.0
+        self._lock = threading.Lock()
+
+    def score(self):
+        """
+        Returns the load of this endpoint; lower is better.
+        """
+        return (self.inflight + 1) * (1 + 10 * self.failure_rate)
+
+    def acquire(self):
+        with self._lock:
+            self.inflight += 1
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+
+class _PoolListener(CircuitBreakerListener):
+    """
+    Keeps the state and failure rate of an endpoint of a
+    ``CircuitBreakerPool`` up to date.
+    """
+
+    def __init__(self, pool, endpoint):
+        self._pool = pool
+        self._endpoint = endpoint
+
+    def state_change(self, cb, old_state, new_state):
+        self._pool._move(self._endpoint, new_state.name)
+
+    def success(self, cb):
+        self._update(0.0)
+
+    def failure(self, cb, exc=None):
+        self._update(1.0)
+
+    def _update(self, outcome):
+        decay = self._pool._decay
+        self._endpoint.failure_rate = (self._endpoint.failure_rate * decay +
+                                       outcome * (1 - decay))
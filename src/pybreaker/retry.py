@@ -0,0 +1,143 @@
+#-*- coding:utf-8 -*-
+
+"""
+Breaker-aware retries.
+"""
+
+import threading
+import time
+
+from pybreaker import CircuitBreakerError, _random
+
+__all__ = ('RetryBudget', 'RetryPolicy',)
+
+
+class RetryBudget(object):
+    """
+    Token bucket that keeps retries below a fraction of first attempts. Each
+    first attempt deposits `ratio` tokens and each retry withdraws one, so in
+    the long run at most `ratio` retries are made per first attempt. The
+    bucket starts full and holds up to `max_tokens`, which allows a few
+    retries when traffic is low.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        """
+        Creates a new retry budget with the given parameters.
+        """
+        self._lock = threading.Lock()
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = float(max_tokens)
+
+    @property
+    def tokens(self):
+        """
+        Returns the number of retries currently available.
+        """
+        return self._tokens
+
+    def deposit(self):
+        """
+        Records a first attempt.
+        """
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self):
+        """
+        Takes a token for a retry. Returns `False` if the budget is exhausted,
+        in which case the call should not be retried.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Retries calls guarded by a circuit breaker, with exponential backoff and
+    full jitter. A call is only retried if:
+
+    * it failed with one of the `retry_on` exceptions, but not with a
+      ``CircuitBreakerError``;
+    * the circuit breaker is still closed, so retries do not pile up on a
+      backend that is recovering;
+    * the retry budget has tokens left. Unless a budget is given, all the
+      policies share the process-wide `default_budget`.
+    """
+
+    default_budget = RetryBudget()
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=10,
+            multiplier=2, jitter=True, budget=None, retry_on=(Exception,)):
+        """
+        Creates a new retry policy with the given parameters.
+        """
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._multiplier = multiplier
+        self._jitter = jitter
+        self._budget = budget
+        self._retry_on = tuple(retry_on)
+
+    @property
+    def budget(self):
+        """
+        Returns the retry budget used by this policy.
+        """
+        return self._budget or self.default_budget
+
+    def backoff(self, attempt):
+        """
+        Returns the number of seconds to wait after the failed attempt number
+        `attempt`, starting at 1.
+        """
+        delay = min(self._max_backoff,
+                    self._backoff * self._multiplier ** (attempt - 1))
+        if self._jitter:
+            delay *= _random()
+        return delay
+
+    def should_retry(self, cb, exc, attempt):
+        """
+        Returns whether the call guarded by the circuit breaker `cb` should be
+        retried after the attempt number `attempt` failed with `exc`.
+        """
+        if attempt >= self._max_attempts:
+            return False
+        if isinstance(exc, CircuitBreakerError):
+            return False
+        if not isinstance(exc, self._retry_on):
+            return False
+        if cb.current_state != 'closed':
+            return False
+        return self.budget.withdraw()
+
+    def call(self, cb, func, *args, **kwargs):
+        """
+        Calls `func` with the given `args` and `kwargs` through the circuit
+        breaker `cb`, retrying according to this policy.
+        """
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return cb.call(func, *args, **kwargs)
+            except Exception as e:
+                if not self.should_retry(cb, e, attempt):
+                    raise
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def call_async(self, cb, func, *args, **kwargs):
+        """
+        Returns a coroutine that awaits `func` with the given `args` and
+        `kwargs` through the circuit breaker `cb`, retrying according to this
+        policy. Requires Python 3.5+.
+        """
+        from pybreaker.aio import retry_async
+        return retry_async(self, cb, func, *args, **kwargs)
@@ -0,0 +1,179 @@
+#-*- coding:utf-8 -*-
+
+"""
+Enforcement of call timeouts for ``CircuitBreaker``.
+"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+__all__ = ('CallTimeoutError', 'TimeoutPool',)
+
+try:
+    _TimeoutError = TimeoutError
+except NameError:
+    _TimeoutError = Exception
+
+
+class CallTimeoutError(_TimeoutError):
+    """
+    Raised when a guarded call does not complete within the circuit breaker's
+    call timeout. Counts as a failure, like any other exception.
+    """
+    pass
+
+
+class TimeoutPool(object):
+    """
+    Bounded pool of reusable worker threads that run the calls of circuit
+    breakers with a call timeout, so that the caller can give up on a call
+    without spawning a thread per call.
+
+    A call that times out is abandoned: its worker is only given back once the
+    call completes. Abandoned calls are counted, and once all `max_workers`
+    workers are busy, new calls fail right away instead of growing the pool:
+    `run()` raises ``CallTimeoutError``, and circuit breakers reject the call
+    without counting it as a failure. Workers idle for `idle_timeout` seconds
+    exit. Unless given a `timeout_pool`, circuit breakers share the `default`
+    one.
+    """
+
+    def __init__(self, max_workers=32, idle_timeout=60):
+        """
+        Creates a new pool of at most `max_workers` threads; threads are only
+        started when needed.
+        """
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._max_workers = max_workers
+        self._idle_timeout = idle_timeout
+        self._workers = 0
+        self._idle = 0
+        self._abandoned = 0
+
+    @property
+    def max_workers(self):
+        """
+        Returns the maximum number of worker threads.
+        """
+        return self._max_workers
+
+    @property
+    def workers(self):
+        """
+        Returns the number of worker threads.
+        """
+        return self._workers
+
+    @property
+    def abandoned(self):
+        """
+        Returns the number of calls that timed out but are still running.
+        """
+        return self._abandoned
+
+    def run(self, timeout, func, *args, **kwargs):
+        """
+        Calls `func` with the given `args` and `kwargs` on a worker thread and
+        returns its result, or raises ``CallTimeoutError`` if it does not
+        complete within `timeout` seconds.
+        """
+        task = self._submit(func, args, kwargs)
+        if task is None:
+            raise CallTimeoutError(
+                'No worker available, %d calls abandoned' % self._abandoned)
+        return self._wait(task, timeout)
+
+    def _submit(self, func, args, kwargs):
+        """
+        Hands the call of `func` over to a worker and returns its task, or
+        `None` if all the workers are busy.
+        """
+        task = _Task(func, args, kwargs)
+        with self._lock:
+            if self._idle > 0:
+                self._idle -= 1
+            elif self._workers < self._max_workers:
+                self._workers += 1
+                self._start_worker()
+            else:
+                return None
+        self._queue.put(task)
+        return task
+
+    def _wait(self, task, timeout):
+        """
+        Returns the result of `task`, or raises ``CallTimeoutError`` if it does
+        not complete within `timeout` seconds.
+        """
+        if not task.done.wait(timeout):
+            with self._lock:
+                if not task.done.is_set():
+                    task.abandoned = True
+                    self._abandoned += 1
+                    raise CallTimeoutError(
+                        'Call timed out after %ss' % timeout)
+        return task.result()
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self._work, name='pybreaker-timeouts')
+        worker.daemon = True
+        worker.start()
+
+    def _work(self):
+        """
+        Runs tasks until the worker has been idle for too long.
+        """
+        while True:
+            try:
+                task = self._queue.get(timeout=self._idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    # A caller may have counted on this worker meanwhile
+                    if self._idle > 0:
+                        self._idle -= 1
+                        self._workers -= 1
+                        return
+                continue
+
+            task.run()
+            with self._lock:
+                task.done.set()
+                if task.abandoned:
+                    self._abandoned -= 1
+                self._idle += 1
+
+
+TimeoutPool.default = TimeoutPool()
+
+
+class _Task(object):
+    """
+    Call run by a ``TimeoutPool`` worker.
+    """
+
+    __slots__ = ('func', 'args', 'kwargs', 'done', 'abandoned', 'value',
+                 'error')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.abandoned = False
+        self.value = self.error = None
+
+    def run(self):
+        try:
+            self.value = self.func(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.error = e
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
@@ -0,0 +1,188 @@
+#-*- coding:utf-8 -*-
+
+"""
+Hierarchical timer wheel that runs the scheduled work of circuit breakers on
+a single background thread.
+"""
+
+import threading
+
+from pybreaker import _clock
+
+__all__ = ('TimerWheel',)
+
+
+class TimerWheel(object):
+    """
+    Runs callbacks after a delay, for any number of circuit breakers, on one
+    background thread. Time advances in ticks of `tick` seconds.
+
+    Timers are kept in `levels` wheels of `wheel_size` buckets: a bucket of
+    the first wheel holds the timers due in one tick, a bucket of the second
+    wheel those due in `wheel_size` ticks, and so on. Scheduling and
+    cancelling a timer are O(1) set operations; when a wheel wraps around,
+    the next bucket of the wheel above is spread over the wheel below.
+    Timers beyond the range of the last wheel are parked in its farthest
+    bucket and spread again later.
+
+    The thread only wakes up every tick while timers are pending, and
+    callbacks run one after the other on it, so they should be quick.
+    Unless given a wheel, circuit breakers and health checks share the
+    `default` one.
+    """
+
+    def __init__(self, tick=0.1, wheel_size=64, levels=4):
+        """
+        Creates a new timer wheel; its thread is started when the first timer
+        is scheduled.
+        """
+        self._cond = threading.Condition()
+        self._tick = tick
+        self._size = wheel_size
+        self._spans = [wheel_size ** level for level in range(levels)]
+        self._wheels = [[set() for i in range(wheel_size)]
+                        for level in range(levels)]
+        self._epoch = _clock()
+        self._ticks = 0
+        self._pending = 0
+        self._thread = None
+
+    @property
+    def tick(self):
+        """
+        Returns the resolution of the timers, in seconds.
+        """
+        return self._tick
+
+    @property
+    def pending(self):
+        """
+        Returns the number of timers that are neither due nor cancelled.
+        """
+        return self._pending
+
+    def schedule(self, delay, callback):
+        """
+        Calls `callback` with no arguments in `delay` seconds, rounded up to
+        the next tick. Returns a timer that can be cancelled.
+        """
+        with self._cond:
+            now = self._current_tick()
+            if self._pending == 0:
+                # No timer in the wheels: skip the idle ticks at once
+                self._ticks = max(self._ticks, now)
+            due = int((_clock() - self._epoch + delay) / self._tick) + 1
+            timer = _Timer(self, callback, max(due, self._ticks + 1))
+            self._insert(timer)
+            self._pending += 1
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='pybreaker-timers')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        return timer
+
+    def _cancel(self, timer):
+        """
+        Removes `timer` from its bucket, if it is still pending.
+        """
+        with self._cond:
+            if timer.bucket is not None:
+                timer.bucket.discard(timer)
+                timer.bucket = None
+                self._pending -= 1
+
+    def _current_tick(self):
+        return int((_clock() - self._epoch) / self._tick)
+
+    def _insert(self, timer):
+        """
+        Puts `timer` in the bucket of the lowest wheel that spans its due
+        tick. Must be called with the lock held.
+        """
+        delta = timer.due - self._ticks
+        for level, span in enumerate(self._spans):
+            if delta < span * self._size:
+                break
+        else:
+            # Beyond the last wheel: park the timer in its farthest bucket
+            delta = span * (self._size - 1)
+        bucket = self._wheels[level][
+            ((self._ticks + delta) // span) % self._size]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def _advance(self):
+        """
+        Moves to the next tick and returns the timers due. Must be called
+        with the lock held.
+        """
+        self._ticks += 1
+        ticks = self._ticks
+
+        # Spread the buckets of the upper wheels that are now in range, from
+        # the top down, so timers can trickle down to the first wheel
+        for level in range(len(self._spans) - 1, 0, -1):
+            span = self._spans[level]
+            if ticks % span == 0:
+                bucket = self._wheels[level][(ticks // span) % self._size]
+                timers = list(bucket)
+                bucket.clear()
+                for timer in timers:
+                    self._insert(timer)
+
+        bucket = self._wheels[0][ticks % self._size]
+        due = [timer for timer in bucket if timer.due <= ticks]
+        for timer in due:
+            bucket.discard(timer)
+            timer.bucket = None
+        self._pending -= len(due)
+        return due
+
+    def _run(self):
+        """
+        Advances the wheels as time goes by and calls the due callbacks.
+        """
+        while True:
+            with self._cond:
+                while self._pending == 0:
+                    self._cond.wait()
+                now = self._current_tick()
+                if now <= self._ticks:
+                    wait = (self._ticks + 1) * self._tick + self._epoch
+                    self._cond.wait(max(0, wait - _clock()))
+                    continue
+                due = []
+                while self._ticks < now:
+                    due.extend(self._advance())
+
+            for timer in due:
+                try:
+                    timer.callback()
+                except Exception:
+                    pass
+
+
+TimerWheel.default = TimerWheel()
+
+
+class _Timer(object):
+    """
+    Callback scheduled on a ``TimerWheel`` for the tick `due`.
+    """
+
+    __slots__ = ('wheel', 'callback', 'due', 'bucket')
+
+    def __init__(self, wheel, callback, due):
+        self.wheel = wheel
+        self.callback = callback
+        self.due = due
+        self.bucket = None
+
+    def cancel(self):
+        """
+        Cancels this timer, unless its callback has already been called.
+        """
+        self.wheel._cancel(self)
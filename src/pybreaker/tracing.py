@@ -0,0 +1,103 @@
+#-*- coding:utf-8 -*-
+
+"""
+OpenTelemetry-compatible tracing of guarded calls.
+"""
+
+import time
+
+from pybreaker import (CircuitBreakerEventListener, EVENT_SUCCESS,
+                       EVENT_FAILURE, EVENT_REJECTED, _random)
+
+__all__ = ('TracingListener',)
+
+
+class TracingListener(CircuitBreakerEventListener):
+    """
+    Records guarded calls in an OpenTelemetry-compatible tracer, with the
+    state of the circuit breaker, its decision ('admitted', 'trial' or
+    'rejected'), the duration of the call and its outcome ('success',
+    'failure', 'excluded' or 'rejected').
+
+    By default, each call is recorded as a child span of the current span,
+    created from `tracer.start_span(name, attributes=..., start_time=...)`;
+    `tracer` defaults to ``opentelemetry.trace.get_tracer('pybreaker')``.
+    If `annotate` is set, the call is recorded as an event added to the
+    current span instead, as returned by `get_current_span()` (defaults to
+    ``opentelemetry.trace.get_current_span``).
+
+    Only a `sample_rate` share of the calls is recorded. As with any event
+    listener, nothing is done when no ``TracingListener`` is registered.
+    """
+
+    kinds = (EVENT_SUCCESS, EVENT_FAILURE, EVENT_REJECTED)
+
+    def __init__(self, tracer=None, sample_rate=1.0, annotate=False,
+            get_current_span=None):
+        """
+        Creates a new tracing listener with the given parameters.
+        """
+        if annotate and get_current_span is None:
+            from opentelemetry.trace import get_current_span
+        if not annotate and tracer is None:
+            from opentelemetry.trace import get_tracer
+            tracer = get_tracer('pybreaker')
+        self._tracer = tracer
+        self._sample_rate = sample_rate
+        self._annotate = annotate
+        self._get_current_span = get_current_span
+
+    def on_event(self, event):
+        """
+        Records a guarded call in the current trace.
+        """
+        if self._sample_rate < 1.0 and _random() >= self._sample_rate:
+            return
+
+        state = event.state.name if event.state is not None else None
+        if event.kind == EVENT_REJECTED:
+            decision, outcome = 'rejected', 'rejected'
+        else:
+            decision = 'trial' if state == 'half-open' else 'admitted'
+            if event.kind == EVENT_FAILURE:
+                outcome = 'failure'
+            elif event.exception is not None:
+                outcome = 'excluded'
+            else:
+                outcome = 'success'
+
+        attributes = {
+            'circuit_breaker.state': state,
+            'circuit_breaker.decision': decision,
+            'circuit_breaker.outcome': outcome,
+        }
+        if event.name is not None:
+            attributes['circuit_breaker.name'] = event.name
+        if event.duration is not None:
+            attributes['circuit_breaker.duration'] = event.duration
+
+        if self._annotate:
+            self._get_current_span().add_event(
+                'circuit_breaker', attributes=attributes)
+        else:
+            self._record_span(event, attributes)
+
+    def _record_span(self, event, attributes):
+        """
+        Records the call as a span that ends now and started `duration`
+        seconds ago.
+        """
+        end = int(time.time() * 1e9)
+        start = end
+        if event.duration is not None:
+            start = end - int(event.duration * 1e9)
+
+        name = 'circuit_breaker'
+        if event.name is not None:
+            name += ' ' + event.name
+
+        span = self._tracer.start_span(name, attributes=attributes,
+                                       start_time=start)
+        if event.exception is not None:
+            span.record_exception(event.exception)
+        span.end(end_time=end)
@@ -3,6 +3,17 @@
 from pybreaker import *
 from time import sleep
 
+import pybreaker
+import os
+import signal
+import sys
+import tempfile
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
 import unittest
 
 class AsyncCircuitBreakerTestCase(unittest.TestCase):
@@ -59,7 +70,7 @@ class AsyncCircuitBreakerTestCase(unittest.TestCase):
                 self.out += ','
 
             def failure(self, cb, exc):
-                print str(exc)
+                print(str(exc))
 
         listener = Listener()
         self.breaker = CircuitBreaker(listeners=(listener,))
@@ -525,14 +536,2074 @@ class CircuitBreakerTestCase(unittest.TestCase):
 
         s = suc(True)
         e = err(True)
-        e.next()
+        next(e)
         self.assertRaises(NotImplementedError, e.send, True)
         self.assertEqual(1, self.breaker.fail_counter)
 
-        self.assertTrue(s.next())
-        self.assertRaises(StopIteration, s.next)
+        self.assertTrue(next(s))
+        self.assertRaises(StopIteration, next, s)
+        self.assertEqual(0, self.breaker.fail_counter)
+
+    def test_generator_break(self):
+        """CircuitBreaker: it should count a generator closed before it is
+        exhausted neither as a success nor as a failure.
+        """
+        @self.breaker
+        def gen():
+            yield 1
+            yield 2
+
+        for value in gen():
+            break
+        self.assertEqual(0, self.breaker.fail_counter)
+
+        self.breaker.half_open()
+        for value in gen():
+            break
+        self.assertEqual('half-open', self.breaker.current_state)
+        self.assertEqual(0, self.breaker.call(int))
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_raising_before_call_listener(self):
+        """CircuitBreaker: it should let another trial call through after a
+        before_call listener raised.
+        """
+        class Listener(CircuitBreakerListener):
+            def before_call(self, cb, func, *args, **kwargs):
+                if args:
+                    raise ValueError()
+
+        self.breaker.add_listener(Listener())
+        self.breaker.half_open()
+        self.assertRaises(ValueError, self.breaker.call, len, [])
+        self.assertEqual('half-open', self.breaker.current_state)
+        self.assertEqual(0, self.breaker.call(int))
+
+    def test_call_future_gate(self):
+        """CircuitBreaker: it should not hold the trial call of a half-open
+        circuit for a call_future() whose outcome is not reported.
+        """
+        self.breaker.half_open()
+        self.assertEqual(None, self.breaker.call_future(None))
+        self.assertEqual(0, self.breaker.call(int))
+        self.assertEqual('closed', self.breaker.current_state)
+
+        breaker = CircuitBreaker(fail_max=1, reset_timeout=0)
+        self.assertRaises(CircuitBreakerError, breaker.call, len, 1)
+        breaker.call_future(None)
+        self.assertEqual(0, breaker.call(int))
+        self.assertEqual('closed', breaker.current_state)
+
+    def test_unstarted_generator_trial(self):
+        """CircuitBreaker: it should let another trial call through once the
+        lease of a trial call that never ends, e.g. a generator that is never
+        iterated, runs out.
+        """
+        breaker = CircuitBreaker(reset_timeout=0.05)
+
+        @breaker
+        def gen():
+            yield 1
+
+        breaker.half_open()
+        g = gen()
+        self.assertRaises(CircuitBreakerError, breaker.call, int)
+        sleep(0.1)
+        self.assertEqual(0, breaker.call(int))
+        self.assertEqual('closed', breaker.current_state)
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_lock_factory(self):
+        """CircuitBreaker: it should guard its state with a lock from the lock
+        factory, without holding it during the guarded call.
+        """
+        class Lock(object):
+            def __init__(self):
+                self._lock = threading.RLock()
+                self.held = 0
+                self.acquired = 0
+
+            def __enter__(self):
+                self._lock.acquire()
+                self.held += 1
+                self.acquired += 1
+
+            def __exit__(self, *exc_info):
+                self.held -= 1
+                self._lock.release()
+
+        breaker = CircuitBreaker(lock_factory=Lock)
+        lock = breaker._lock
+        self.assertTrue(isinstance(lock, Lock))
+        self.assertEqual(0, breaker.call(lambda: lock.held))
+        self.assertTrue(lock.acquired > 0)
+        self.assertEqual(0, lock.held)
+
+    def test_decorate_fixed_arity(self):
+        """CircuitBreaker: it should decorate functions with positional
+        parameters only.
+        """
+        @self.breaker
+        def func(a, b):
+            "Docstring"
+            if a is None:
+                raise NotImplementedError()
+            return a + b
+
+        self.assertEqual('func', func.__name__)
+        self.assertEqual('Docstring', func.__doc__)
+        self.assertEqual(3, func(1, 2))
+        self.assertEqual(3, func(1, b=2))
+        self.assertEqual(3, func(b=2, a=1))
+        self.assertRaises(TypeError, func, 1)
+        self.assertRaises(NotImplementedError, func, None, 2)
+        self.assertEqual(1, self.breaker.fail_counter)
+
+    def test_decorate_method(self):
+        """CircuitBreaker: it should decorate methods and bound methods.
+        """
+        breaker = self.breaker
+
+        class Client(object):
+            @breaker
+            def get(self, key):
+                return key
+
+            def put(self, key, value=None):
+                raise NotImplementedError()
+
+        client = Client()
+        self.assertEqual(1, client.get(1))
+        self.assertRaises(NotImplementedError, breaker(client.put), 1)
+        self.assertEqual(1, breaker.fail_counter)
+
+    def test_decorate_wrapped_generator(self):
+        """CircuitBreaker: it should inspect generator values returned by
+        functions that are not generator functions.
+        """
+        def gen(value):
+            yield value
+            raise NotImplementedError()
+
+        @self.breaker
+        def func(value):
+            return gen(value)
+
+        g = func(True)
+        self.assertTrue(next(g))
+        self.assertRaises(NotImplementedError, next, g)
+        self.assertEqual(1, self.breaker.fail_counter)
+
+
+class CircuitBreakerEventTestCase(unittest.TestCase):
+    """
+    Tests for the event API.
+    """
+
+    class EventListener(CircuitBreakerEventListener):
+        kinds = (EVENT_FAILURE, EVENT_STATE_CHANGE)
+
+        def __init__(self):
+            self.events = []
+
+        def on_event(self, event):
+            self.events.append(event)
+
+    def test_subscribed_events(self):
+        """CircuitBreaker: it should deliver the subscribed kinds of events
+        to event listeners.
+        """
+        listener = self.EventListener()
+        breaker = CircuitBreaker(fail_max=1, name='db', listeners=[listener])
+        def err(): raise NotImplementedError()
+
+        breaker.call(lambda: True)
+        self.assertEqual([], listener.events)
+
+        breaker.fail_max = 2
+        self.assertRaises(NotImplementedError, breaker.call, err)
+        event = listener.events[0]
+        self.assertEqual((EVENT_FAILURE, 'db', breaker),
+                         (event.kind, event.name, event.breaker))
+        self.assertTrue(isinstance(event.exception, NotImplementedError))
+        self.assertTrue(event.duration >= 0)
+
+        breaker.open()
+        event = listener.events[1]
+        self.assertEqual(EVENT_STATE_CHANGE, event.kind)
+        self.assertEqual(('closed', 'open'),
+                         (event.old_state.name, event.new_state.name))
+        self.assertEqual(None, event.duration)
+        self.assertEqual(2, len(listener.events))
+
+    def test_unused_callbacks(self):
+        """CircuitBreaker: it should only dispatch to the callbacks listeners
+        implement.
+        """
+        class Listener(CircuitBreakerListener):
+            def success(self, cb):
+                pass
+
+        breaker = CircuitBreaker(listeners=[Listener()])
+        self.assertEqual((), breaker._mux.before_call)
+        self.assertEqual((), breaker._mux.failure)
+        self.assertEqual(1, len(breaker._mux.success))
+        self.assertFalse(breaker._mux.timed)
+
+        listener = self.EventListener()
+        breaker.add_listener(listener)
+        self.assertTrue(breaker._mux.timed)
+        self.assertEqual((listener,), breaker._mux.events[EVENT_FAILURE])
+        self.assertEqual((), breaker._mux.events[EVENT_SUCCESS])
+
+        breaker.remove_listener(listener)
+        self.assertFalse(breaker._mux.timed)
+
+    def test_instance_callbacks(self):
+        """CircuitBreaker: it should dispatch to callbacks set on listener
+        instances.
+        """
+        failures = []
+        listener = CircuitBreakerListener()
+        listener.failure = lambda cb, exc: failures.append(exc)
+
+        breaker = CircuitBreaker(listeners=[listener])
+        self.assertRaises(KeyError, breaker.call, {}.__getitem__, 1)
+        self.assertEqual(1, len(failures))
+        self.assertEqual((), breaker._mux.success)
+
+    @unittest.skipIf(sys.version_info < (3, 3), 'requires unittest.mock')
+    def test_mock_listener(self):
+        """CircuitBreaker: it should call the callbacks of mock listeners.
+        """
+        from unittest import mock
+        listener = mock.Mock(spec=CircuitBreakerListener)
+        breaker = CircuitBreaker(listeners=[listener])
+        breaker.call(len, [])
+        self.assertTrue(listener.before_call.called)
+        listener.success.assert_called_once_with(breaker)
+
+
+class InMemorySpan(object):
+    """
+    Span recorded by ``InMemoryTracer``.
+    """
+
+    def __init__(self, name, attributes=None, start_time=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_time = start_time
+        self.end_time = None
+        self.exceptions = []
+        self.events = []
+
+    def record_exception(self, exc):
+        self.exceptions.append(exc)
+
+    def add_event(self, name, attributes=None):
+        self.events.append((name, attributes))
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class InMemoryTracer(object):
+    """
+    Tracer with the same interface as OpenTelemetry's, that keeps the spans in
+    memory.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None, start_time=None):
+        span = InMemorySpan(name, attributes, start_time)
+        self.spans.append(span)
+        return span
+
+
+class TracingListenerTestCase(unittest.TestCase):
+    """
+    Tests for the TracingListener class.
+    """
+
+    def setUp(self):
+        self.tracer = InMemoryTracer()
+        self.breaker = CircuitBreaker(
+            fail_max=1, exclude=[LookupError], name='db',
+            listeners=[TracingListener(self.tracer)])
+
+    def _attributes(self, span):
+        return tuple(span.attributes.get('circuit_breaker.' + key)
+                     for key in ('state', 'decision', 'outcome'))
+
+    def test_trace_calls(self):
+        """TracingListener: it should record a span for each call.
+        """
+        def err(): raise NotImplementedError()
+        def excluded(): raise KeyError()
+
+        self.breaker.call(lambda: True)
+        self.assertRaises(KeyError, self.breaker.call, excluded)
+        self.assertRaises(CircuitBreakerError, self.breaker.call, err)
+        self.assertRaises(CircuitBreakerError, self.breaker.call, err)
+
+        spans = self.tracer.spans
+        self.assertEqual(['circuit_breaker db'] * 4, [s.name for s in spans])
+        self.assertEqual(('closed', 'admitted', 'success'),
+                         self._attributes(spans[0]))
+        self.assertEqual(('closed', 'admitted', 'excluded'),
+                         self._attributes(spans[1]))
+        self.assertEqual(('open', 'rejected', 'rejected'),
+                         self._attributes(spans[3]))
+        self.assertEqual('db', spans[0].attributes['circuit_breaker.name'])
+        self.assertTrue(spans[0].start_time <= spans[0].end_time)
+        self.assertTrue(isinstance(spans[1].exceptions[0], KeyError))
+
+    def test_trace_trial_call(self):
+        """TracingListener: it should tell trial calls apart.
+        """
+        def err(): raise NotImplementedError()
+
+        self.breaker.half_open()
+        self.breaker.fail_max = 2
+        self.assertRaises(CircuitBreakerError, self.breaker.call, err)
+        self.assertEqual(('half-open', 'trial', 'failure'),
+                         self._attributes(self.tracer.spans[0]))
+
+    def test_sampling(self):
+        """TracingListener: it should only record the sampled calls.
+        """
+        breaker = CircuitBreaker(
+            listeners=[TracingListener(self.tracer, sample_rate=0)])
+        breaker.call(lambda: True)
+        self.assertEqual([], self.tracer.spans)
+
+    def test_default_tracer(self):
+        """TracingListener: it should use OpenTelemetry's tracer by default.
+        """
+        import types
+        tracer = InMemoryTracer()
+        otel = types.ModuleType('opentelemetry')
+        otel.trace = types.ModuleType('opentelemetry.trace')
+        otel.trace.get_tracer = lambda name: tracer
+        saved = dict((name, sys.modules.get(name))
+                     for name in ('opentelemetry', 'opentelemetry.trace'))
+        sys.modules.update({'opentelemetry': otel,
+                            'opentelemetry.trace': otel.trace})
+        try:
+            listener = TracingListener()
+        finally:
+            for name, module in saved.items():
+                if module is None:
+                    del sys.modules[name]
+                else:
+                    sys.modules[name] = module
+
+        breaker = CircuitBreaker(listeners=[listener])
+        self.assertTrue(breaker.call(lambda: True))
+        self.assertEqual(1, len(tracer.spans))
+        self.assertEqual(0, breaker.fail_counter)
+
+    def test_annotate(self):
+        """TracingListener: it should annotate the current span if asked to.
+        """
+        span = InMemorySpan('request')
+        listener = TracingListener(annotate=True,
+                                   get_current_span=lambda: span)
+        breaker = CircuitBreaker(listeners=[listener])
+        breaker.call(lambda: True)
+        self.assertEqual('circuit_breaker', span.events[0][0])
+        self.assertEqual('success',
+                         span.events[0][1]['circuit_breaker.outcome'])
+
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+    """
+    Tests for the adaptive concurrency limiters.
+    """
+
+    def test_reject_above_limit(self):
+        """AdaptiveLimiter: it should reject calls once the limit is reached.
+        """
+        limiter = AIMDLimiter(initial_limit=1)
+        breaker = CircuitBreaker(limiter=limiter)
+        self.assertEqual(limiter, breaker.limiter)
+
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        self.assertRaises(CircuitBreakerError, breaker.call, lambda: True)
+        self.assertEqual(0, breaker.fail_counter)
+
+        limiter.release()
+        self.assertTrue(breaker.call(lambda: True))
+        self.assertEqual(0, limiter.inflight)
+
+    def test_aimd_limit(self):
+        """AIMDLimiter: it should grow additively and shrink
+        multiplicatively.
+        """
+        limiter = AIMDLimiter(initial_limit=10, backoff_ratio=0.5, timeout=1)
+        [limiter.acquire() for n in range(5)]
+        self.assertEqual((10, 11), limiter.release(0.1, False))
+        [limiter.release() for n in range(4)]
+
+        # Under-utilized limiters do not grow
+        limiter.acquire()
+        self.assertEqual((11, 11), limiter.release(0.1, False))
+
+        limiter.acquire()
+        self.assertEqual((11, 5), limiter.release(0.1, True))
+        limiter.acquire()
+        self.assertEqual((5, 2), limiter.release(2, False))
+
+    def test_gradient_limit(self):
+        """GradientLimiter: it should shrink the limit when latency grows.
+        """
+        limiter = GradientLimiter(initial_limit=10)
+        for i in range(10):
+            [limiter.acquire() for n in range(10)]
+            [limiter.release(0.01, False) for n in range(10)]
+        grown = limiter.limit
+        self.assertTrue(grown > 10)
+
+        for i in range(10):
+            [limiter.acquire() for n in range(grown)]
+            [limiter.release(0.2, False) for n in range(grown)]
+        self.assertTrue(limiter.limit < grown)
+
+    def test_limit_change_events(self):
+        """CircuitBreaker: it should notify listeners when the concurrency
+        limit changes.
+        """
+        class Listener(CircuitBreakerListener):
+            def __init__(self):
+                self.changes = []
+            def limit_change(self, cb, old_limit, new_limit):
+                assert cb
+                self.changes.append((old_limit, new_limit))
+
+        def err(): raise NotImplementedError()
+
+        listener = Listener()
+        breaker = CircuitBreaker(listeners=[listener],
+                                 limiter=AIMDLimiter(initial_limit=1))
+        self.assertTrue(breaker.call(lambda: True))
+        self.assertRaises(NotImplementedError, breaker.call, err)
+        self.assertEqual([(1, 2), (2, 1)], listener.changes)
+
+
+
+class CircuitThrottledStateTestCase(unittest.TestCase):
+    """
+    Tests for the "throttled" state.
+    """
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(fail_max=3, throttle_k=2)
+        self._random = pybreaker._random
+
+    def tearDown(self):
+        pybreaker._random = self._random
+
+    def _trip(self):
+        def err(): raise NotImplementedError()
+        for i in range(3):
+            self.assertRaises(NotImplementedError, self.breaker.call, err)
+
+    def test_throttle_instead_of_open(self):
+        """CircuitBreaker: it should throttle the circuit instead of opening
+        it when throttling is enabled.
+        """
+        self._trip()
+        self.assertEqual('throttled', self.breaker.current_state)
+        self.assertEqual(0, self.breaker.fail_counter)
+        self.assertEqual(0.75, self.breaker.state.reject_probability)
+
+    def test_reject_with_probability(self):
+        """CircuitBreaker: it should reject calls according to the rejection
+        probability when throttled.
+        """
+        self._trip()
+        pybreaker._random = lambda: 0.7
+        self.assertRaises(CircuitBreakerError, self.breaker.call, lambda: 1)
+        pybreaker._random = lambda: 0.8
+        self.assertEqual(1, self.breaker.call(lambda: 1))
+
+    def test_reject_without_lock(self):
+        """CircuitBreaker: it should reject throttled calls without taking
+        its lock, and only draw once per call.
+        """
+        self._trip()
+        draws = []
+        pybreaker._random = lambda: draws.append(1) or 0.0
+        lock = self.breaker._lock
+        self.breaker._lock = None
+        try:
+            self.assertRaises(CircuitBreakerError, self.breaker.call, int)
+        finally:
+            self.breaker._lock = lock
+        self.assertEqual(1, len(draws))
+
+        pybreaker._random = lambda: draws.append(1) or 0.99
+        self.assertEqual(0, self.breaker.call(int))
+        self.assertEqual(2, len(draws))
+
+    def test_close_when_recovered(self):
+        """CircuitBreaker: it should close the circuit once calls succeed
+        again.
+        """
+        self._trip()
+        pybreaker._random = lambda: 0.99
+        self.breaker.call(lambda: 1)
+        self.assertEqual('throttled', self.breaker.current_state)
+        self.breaker.call(lambda: 1)
+        self.breaker.call(lambda: 1)
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_open_when_failing(self):
+        """CircuitBreaker: it should open the circuit if calls keep failing
+        when throttled.
+        """
+        def err(): raise NotImplementedError()
+        self._trip()
+        pybreaker._random = lambda: 0.99
+        self.assertRaises(NotImplementedError, self.breaker.call, err)
+        self.assertRaises(NotImplementedError, self.breaker.call, err)
+        self.assertRaises(CircuitBreakerError, self.breaker.call, err)
+        self.assertEqual('open', self.breaker.current_state)
+
+    def test_throttle_transition_events(self):
+        """CircuitBreaker: it should notify listeners when entering and
+        leaving the "throttled" state.
+        """
+        class Listener(CircuitBreakerListener):
+            def __init__(self):
+                self.out = []
+            def state_change(self, cb, old_state, new_state):
+                self.out.append((old_state.name, new_state.name))
+
+        listener = Listener()
+        self.breaker.add_listener(listener)
+        self._trip()
+        self.breaker.close()
+        self.assertEqual([('closed', 'throttled'), ('throttled', 'closed')],
+                         listener.out)
+
+
+
+class Response(object):
+    def __init__(self, status):
+        self.status = status
+
+
+class FailurePredicateTestCase(unittest.TestCase):
+    """
+    Tests for result-based failures and exception predicates.
+    """
+
+    def test_failure_predicate(self):
+        """CircuitBreaker: it should count results as failures according to
+        the failure predicate, and still return them.
+        """
+        breaker = CircuitBreaker(fail_max=2,
+                                 failure_predicate=lambda r: r is None)
+        self.assertEqual(None, breaker.call(lambda: None))
+        self.assertEqual(1, breaker.fail_counter)
+        self.assertEqual(1, breaker.call(lambda: 1))
+        self.assertEqual(0, breaker.fail_counter)
+
+        breaker.call(lambda: None)
+        self.assertEqual(None, breaker.call(lambda: None))
+        self.assertEqual('open', breaker.current_state)
+
+    def test_predicates_by_type(self):
+        """CircuitBreaker: it should dispatch results to the failure predicate
+        of their type, including subclasses.
+        """
+        class Redirect(Response):
+            pass
+
+        breaker = CircuitBreaker(failure_predicate={
+            Response: lambda r: r.status >= 500})
+        breaker.call(Response, 503)
+        self.assertEqual(1, breaker.fail_counter)
+        breaker.call(Redirect, 502)
+        self.assertEqual(2, breaker.fail_counter)
+        breaker.call(Response, 200)
+        self.assertEqual(0, breaker.fail_counter)
+        breaker.call(lambda: 503)
+        self.assertEqual(0, breaker.fail_counter)
+
+    def test_result_failure_listener(self):
+        """CircuitBreaker: it should notify the listeners of failed results.
+        """
+        failures = []
+        class Listener(CircuitBreakerListener):
+            def failure(self, cb, exc):
+                failures.append(exc)
+
+        response = Response(500)
+        breaker = CircuitBreaker(listeners=[Listener()],
+                                 failure_predicate=lambda r: r.status >= 500)
+        self.assertTrue(breaker.call(lambda: response) is response)
+        self.assertTrue(isinstance(failures[0], ResultFailure))
+        self.assertTrue(failures[0].result is response)
+
+    def test_raising_failure_predicate(self):
+        """CircuitBreaker: it should count the result as a failure if the
+        failure predicate raises.
+        """
+        failures = []
+        class Listener(CircuitBreakerListener):
+            def failure(self, cb, exc):
+                failures.append(exc)
+
+        breaker = CircuitBreaker(listeners=[Listener()],
+                                 failure_predicate=lambda r: r.status >= 500)
+        self.assertEqual(None, breaker.call(lambda: None))
+        self.assertEqual(1, breaker.fail_counter)
+        self.assertTrue(isinstance(failures[0], AttributeError))
+
+        breaker.half_open()
+        self.assertEqual(None, breaker.call(lambda: None))
+        self.assertEqual('open', breaker.current_state)
+
+    def test_exclude_predicate(self):
+        """CircuitBreaker: it should accept predicates among the excluded
+        exceptions.
+        """
+        def client_error(e):
+            return getattr(e, 'status', 500) < 500
+        breaker = CircuitBreaker(exclude=[client_error])
+
+        def err(status):
+            e = IOError()
+            e.status = status
+            raise e
+        self.assertRaises(IOError, breaker.call, err, 404)
+        self.assertEqual(0, breaker.fail_counter)
+        self.assertRaises(IOError, breaker.call, err, 503)
+        self.assertEqual(1, breaker.fail_counter)
+
+        breaker.remove_excluded_exception(client_error)
+        self.assertRaises(IOError, breaker.call, err, 404)
+        self.assertEqual(2, breaker.fail_counter)
+
+
+class CallTimeoutTestCase(unittest.TestCase):
+    """
+    Tests for call timeouts.
+    """
+
+    def test_call_timeout(self):
+        """CircuitBreaker: it should fail calls that exceed the call timeout.
+        """
+        breaker = CircuitBreaker(call_timeout=0.05)
+        self.assertEqual(0.05, breaker.call_timeout)
+        self.assertRaises(CallTimeoutError, breaker.call, sleep, 0.5)
+        self.assertEqual(1, breaker.fail_counter)
+
+        self.assertEqual(2, breaker.call(lambda x: x, 2))
+        self.assertEqual(0, breaker.fail_counter)
+
+        def err(): raise NotImplementedError()
+        self.assertRaises(NotImplementedError, breaker.call, err)
+        self.assertEqual(1, breaker.fail_counter)
+
+    def test_bounded_pool(self):
+        """TimeoutPool: it should track abandoned calls and not grow beyond
+        its maximum number of workers.
+        """
+        pool = TimeoutPool(max_workers=1)
+        event = threading.Event()
+        self.assertRaises(CallTimeoutError, pool.run, 0.01, event.wait)
+        self.assertEqual(1, pool.abandoned)
+        self.assertRaises(CallTimeoutError, pool.run, 1, len, [])
+        self.assertEqual(1, pool.workers)
+
+        event.set()
+        for i in range(100):
+            if not pool.abandoned:
+                break
+            sleep(0.01)
+        self.assertEqual(0, pool.abandoned)
+        self.assertEqual(0, pool.run(1, len, []))
+        self.assertEqual(1, pool.workers)
+
+    def test_busy_pool(self):
+        """CircuitBreaker: it should reject calls without counting a failure
+        while all the workers of its timeout pool are busy.
+        """
+        pool = TimeoutPool(max_workers=1)
+        slow = CircuitBreaker(call_timeout=1, timeout_pool=pool)
+        breaker = CircuitBreaker(fail_max=1, call_timeout=1, timeout_pool=pool)
+        self.assertTrue(breaker.timeout_pool is pool)
+        self.assertTrue(CircuitBreaker().timeout_pool is TimeoutPool.default)
+
+        event = threading.Event()
+        thread = threading.Thread(target=slow.call, args=(event.wait, 1))
+        thread.start()
+        try:
+            for i in range(100):
+                if pool.workers and not pool._idle:
+                    break
+                sleep(0.01)
+            self.assertRaises(CircuitBreakerError, breaker.call, len, [])
+            self.assertEqual(0, breaker.fail_counter)
+            self.assertEqual('closed', breaker.current_state)
+        finally:
+            event.set()
+            thread.join()
+        self.assertEqual(0, breaker.call(len, []))
+
+    @unittest.skipIf(sys.version_info < (3, 5), 'requires asyncio')
+    def test_call_async_timeout(self):
+        """CircuitBreaker: it should fail coroutines that exceed the call
+        timeout.
+        """
+        import asyncio
+        loop = asyncio.new_event_loop()
+        breaker = CircuitBreaker(call_timeout=0.01)
+        try:
+            self.assertRaises(CallTimeoutError, loop.run_until_complete,
+                              breaker.call_async(asyncio.sleep, 1))
+            self.assertEqual(1, breaker.fail_counter)
+        finally:
+            loop.close()
+
+
+class CheapRejectionTestCase(unittest.TestCase):
+    """
+    Tests for the fast-fail and fallback rejection modes.
+    """
+
+    def test_fast_fail(self):
+        """CircuitBreaker: it should raise a reusable lightweight error in
+        fast-fail mode.
+        """
+        breaker = CircuitBreaker(reset_timeout=60, fast_fail=True, name='db')
+        self.assertTrue(breaker.fast_fail)
+        breaker.open()
+
+        errors = []
+        for i in range(2):
+            try:
+                breaker.call(lambda: True)
+            except CircuitBreakerError as e:
+                errors.append(e)
+        self.assertTrue(errors[0] is errors[1])
+        self.assertTrue(isinstance(errors[0], CircuitBreakerRejected))
+        self.assertEqual('db', errors[0].name)
+        self.assertTrue(0 < errors[0].remaining <= 60)
+        self.assertTrue(str(errors[0]).startswith('db: Timeout not elapsed'))
+
+    @unittest.skipIf(sys.version_info < (3, 0), 'requires exception chaining')
+    def test_fast_fail_context(self):
+        """CircuitBreaker: it should not chain the reusable error to the
+        exception handled when it was previously raised.
+        """
+        breaker = CircuitBreaker(fast_fail=True)
+        breaker.open()
+        try:
+            try:
+                raise KeyError()
+            except KeyError:
+                breaker.call(lambda: True)
+        except CircuitBreakerError as e:
+            self.assertTrue(isinstance(e.__context__, KeyError))
+
+        try:
+            breaker.call(lambda: True)
+        except CircuitBreakerError as e:
+            self.assertTrue(e.__context__ is None)
+            self.assertTrue(e.__cause__ is None)
+
+    def test_fast_fail_traceback(self):
+        """CircuitBreaker: it should not let the traceback of the reusable
+        error grow across rejections.
+        """
+        breaker = CircuitBreaker(fast_fail=True)
+        breaker.open()
+
+        def depth():
+            try:
+                breaker.call(lambda: True)
+            except CircuitBreakerError:
+                tb, n = sys.exc_info()[2], 0
+                while tb is not None:
+                    tb, n = tb.tb_next, n + 1
+                return n
+        self.assertEqual(depth(), depth())
+
+    def test_default_error(self):
+        """CircuitBreaker: it should raise a new CircuitBreakerError for each
+        rejection by default.
+        """
+        breaker = CircuitBreaker()
+        self.assertFalse(breaker.fast_fail)
+        self.assertRaises(AttributeError, getattr, breaker, 'fallback')
+        breaker.open()
+        try:
+            breaker.call(lambda: True)
+        except CircuitBreakerError as e:
+            self.assertFalse(isinstance(e, CircuitBreakerRejected))
+
+    def test_fallback(self):
+        """CircuitBreaker: it should return the fallback value instead of
+        raising for rejected calls.
+        """
+        breaker = CircuitBreaker(fail_max=1, fallback=None)
+        self.assertEqual(None, breaker.fallback)
+        self.assertEqual(1, breaker.call(lambda: 1))
+
+        def err(): raise NotImplementedError()
+        self.assertRaises(CircuitBreakerError, breaker.call, err)
+        self.assertEqual(None, breaker.call(lambda: 1))
+
+    def test_rejected_listener(self):
+        """CircuitBreaker: it should notify the listeners of cheap rejections.
+        """
+        rejections = []
+        class Listener(CircuitBreakerListener):
+            def rejected(self, cb, exc):
+                rejections.append(exc)
+
+        breaker = CircuitBreaker(fallback=None, listeners=[Listener()])
+        breaker.open()
+        self.assertEqual(None, breaker.call(lambda: 1))
+        self.assertEqual(1, len(rejections))
+        self.assertTrue(isinstance(rejections[0], CircuitBreakerError))
+
+    def test_fallback_limiter(self):
+        """CircuitBreaker: it should return the fallback value for calls
+        rejected by the concurrency limiter.
+        """
+        limiter = AIMDLimiter(initial_limit=1)
+        breaker = CircuitBreaker(limiter=limiter, fallback='busy')
+        limiter.acquire()
+        self.assertEqual('busy', breaker.call(lambda: 1))
+
+        limiter.release()
+        breaker.open()
+        self.assertEqual('busy', breaker.call(lambda: 1))
+        self.assertEqual(0, limiter.inflight)
+
+
+class SlowStartTestCase(unittest.TestCase):
+    """
+    Tests for the slow start after the circuit closes.
+    """
+
+    def setUp(self):
+        self.now = 100.0
+        self._clock, self._random = pybreaker._clock, pybreaker._random
+        pybreaker._clock = lambda: self.now
+        self.breaker = CircuitBreaker(fail_max=10, slow_start=10)
+
+    def tearDown(self):
+        pybreaker._clock, pybreaker._random = self._clock, self._random
+
+    def _recover(self):
+        self.breaker.half_open()
+        self.breaker.call(lambda: 1)
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_ramp_up(self):
+        """CircuitBreaker: it should ramp up the share of calls let through
+        after a successful trial call.
+        """
+        self._recover()
+        self.assertAlmostEqual(0.1, self.breaker.state.admitted_ratio())
+        pybreaker._random = lambda: 0.5
+        self.assertRaises(CircuitBreakerError, self.breaker.call, lambda: 1)
+
+        self.now += 5
+        self.assertAlmostEqual(0.55, self.breaker.state.admitted_ratio())
+        self.assertEqual(1, self.breaker.call(lambda: 1))
+
+        self.now += 5
+        self.assertEqual(1.0, self.breaker.state.admitted_ratio())
+
+    def test_exponential_ramp_up(self):
+        """CircuitBreaker: it should ramp up the share of calls let through
+        exponentially if asked to.
+        """
+        self.breaker = CircuitBreaker(slow_start=10,
+                                      slow_start_mode='exponential')
+        self._recover()
+        self.assertAlmostEqual(0.1, self.breaker.state.admitted_ratio())
+        self.now += 5
+        self.assertAlmostEqual(0.1 ** 0.5, self.breaker.state.admitted_ratio())
+        self.now += 5
+        self.assertEqual(1.0, self.breaker.state.admitted_ratio())
+
+    def test_no_ramp_up(self):
+        """CircuitBreaker: it should not ramp up the traffic when the circuit
+        is closed manually or slow start is disabled.
+        """
+        self.breaker.open()
+        self.breaker.close()
+        self.assertEqual(1.0, self.breaker.state.admitted_ratio())
+
+        self.breaker.slow_start = None
+        self._recover()
+        self.assertEqual(1.0, self.breaker.state.admitted_ratio())
+
+    def test_tighter_threshold(self):
+        """CircuitBreaker: it should scale the failures threshold down during
+        the warm-up period.
+        """
+        def err(): raise NotImplementedError()
+
+        self._recover()
+        pybreaker._random = lambda: 0.0
+        self.assertRaises(CircuitBreakerError, self.breaker.call, err)
+        self.assertEqual('open', self.breaker.current_state)
+
+
+class HealthCheckTestCase(unittest.TestCase):
+    """
+    Tests for the HealthCheck class.
+    """
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(reset_timeout=0.01)
+        self.healthy = False
+        self.checks = 0
+        self.wheel = TimerWheel(tick=0.005)
+
+    def check(self):
+        self.checks += 1
+        return self.healthy
+
+    def _wait_for(self, state):
+        for i in range(100):
+            if self.breaker.current_state == state:
+                break
+            sleep(0.01)
+        self.assertEqual(state, self.breaker.current_state)
+
+    def test_close(self):
+        """HealthCheck: it should close the circuit once a check succeeds.
+        """
+        health = HealthCheck(self.breaker, self.check, interval=0.01,
+                             scheduler=self.wheel)
+        self.breaker.open()
+        sleep(0.05)
+        self.assertTrue(self.checks > 1)
+        self.assertEqual('open', self.breaker.current_state)
+
+        self.healthy = True
+        self._wait_for('closed')
+        health.stop()
+
+    def test_no_live_trial_call(self):
+        """HealthCheck: it should keep the circuit open for live calls after
+        the reset timeout.
+        """
+        health = HealthCheck(self.breaker, self.check, interval=10,
+                             scheduler=self.wheel)
+        self.breaker.open()
+        sleep(0.02)
+        self.assertRaises(CircuitBreakerError, self.breaker.call, len, [])
+        self.assertEqual('open', self.breaker.current_state)
+
+        health.stop()
+        self.assertEqual(0, self.breaker.call(len, []))
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_half_open(self):
+        """HealthCheck: it should half-open the circuit if asked to.
+        """
+        self.healthy = True
+        self.breaker.open()
+        health = HealthCheck(self.breaker, self.check, interval=0.01,
+                             half_open=True, scheduler=self.wheel)
+        self._wait_for('half-open')
+        health.stop()
+
+    def test_failing_check(self):
+        """HealthCheck: it should count exceptions raised by the check as
+        failed checks.
+        """
+        def check():
+            self.checks += 1
+            raise IOError()
+        health = HealthCheck(self.breaker, check, interval=0.01,
+                             scheduler=self.wheel)
+        self.breaker.open()
+        sleep(0.05)
+        self.assertTrue(self.checks > 1)
+        self.assertEqual('open', self.breaker.current_state)
+        health.stop()
+
+    def test_slow_check(self):
+        """HealthCheck: it should not delay other timers while a check runs.
+        """
+        release = threading.Event()
+        def check():
+            release.wait(1)
+            return False
+
+        other = CircuitBreaker(reset_timeout=0.02, timer_wheel=self.wheel)
+        health = HealthCheck(self.breaker, check, interval=0.01,
+                             scheduler=self.wheel)
+        try:
+            self.breaker.open()
+            sleep(0.03)
+            other.open()
+            for i in range(50):
+                if other.current_state == 'half-open':
+                    break
+                sleep(0.01)
+            self.assertEqual('half-open', other.current_state)
+        finally:
+            release.set()
+            health.stop()
+
+    @unittest.skipIf(sys.version_info < (3, 5), 'requires asyncio')
+    def test_async_check(self):
+        """HealthCheck: it should run coroutine checks on an event loop.
+        """
+        import asyncio
+        from pybreaker.aio import AsyncioScheduler
+        loop = asyncio.new_event_loop()
+
+        # Defined through exec, as this module must still parse on Python 2
+        namespace = {}
+        exec('async def check():\n    return True', namespace)
+
+        try:
+            health = HealthCheck(self.breaker, namespace['check'],
+                                 interval=0.01,
+                                 scheduler=AsyncioScheduler(loop))
+            self.breaker.open()
+            for i in range(100):
+                if self.breaker.current_state == 'closed':
+                    break
+                loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual('closed', self.breaker.current_state)
+            health.stop()
+        finally:
+            loop.close()
+
+    @unittest.skipIf(sys.version_info < (3, 5), 'requires asyncio')
+    def test_async_check_running_loop(self):
+        """HealthCheck: it should schedule coroutine checks on the event loop
+        running when it is created, and require one otherwise.
+        """
+        import asyncio
+        loop = asyncio.new_event_loop()
+
+        namespace = {'HealthCheck': HealthCheck}
+        exec('async def check():\n    return True\n'
+             'async def attach(breaker, check):\n'
+             '    return HealthCheck(breaker, check, interval=0.01)',
+             namespace)
+        self.assertRaises(RuntimeError, HealthCheck, self.breaker,
+                          namespace['check'])
+
+        try:
+            health = loop.run_until_complete(
+                namespace['attach'](self.breaker, namespace['check']))
+            self.breaker.open()
+            for i in range(100):
+                if self.breaker.current_state == 'closed':
+                    break
+                loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual('closed', self.breaker.current_state)
+            health.stop()
+        finally:
+            loop.close()
+
+
+class TimerWheelTestCase(unittest.TestCase):
+    """
+    Tests for the TimerWheel class.
+    """
+
+    def setUp(self):
+        self.fired = threading.Event()
+
+    def test_schedule(self):
+        """TimerWheel: it should call the callback once the delay elapses.
+        """
+        wheel = TimerWheel(tick=0.005)
+        wheel.schedule(0.02, self.fired.set)
+        self.assertEqual(1, wheel.pending)
+        self.assertFalse(self.fired.is_set())
+        self.assertTrue(self.fired.wait(1))
+        self.assertEqual(0, wheel.pending)
+
+    def test_cancel(self):
+        """TimerWheel: it should not call the callback of a cancelled timer.
+        """
+        wheel = TimerWheel(tick=0.005)
+        timer = wheel.schedule(0.02, self.fired.set)
+        timer.cancel()
+        self.assertEqual(0, wheel.pending)
+        self.assertFalse(self.fired.wait(0.05))
+
+    def test_cascade(self):
+        """TimerWheel: it should call the callbacks of timers beyond the
+        first wheel, and beyond the last one.
+        """
+        wheel = TimerWheel(tick=0.002, wheel_size=4, levels=2)
+        fired = []
+        for delay in (0.005, 0.02, 0.05):
+            wheel.schedule(delay, lambda delay=delay: fired.append(delay))
+        for i in range(100):
+            if len(fired) == 3:
+                break
+            sleep(0.01)
+        self.assertEqual([0.005, 0.02, 0.05], fired)
+
+    def test_breaker_half_opens_without_calls(self):
+        """CircuitBreaker: it should half-open the circuit once the reset
+        timeout elapses if given a timer wheel.
+        """
+        class Listener(CircuitBreakerListener):
+            def state_change(listener, cb, old_state, new_state):
+                if new_state.name == 'half-open':
+                    self.fired.set()
+
+        breaker = CircuitBreaker(reset_timeout=0.02, listeners=[Listener()],
+                                 timer_wheel=TimerWheel(tick=0.005))
+        breaker.open()
+        self.assertEqual('open', breaker.current_state)
+        self.assertTrue(self.fired.wait(1))
+        self.assertEqual('half-open', breaker.current_state)
+
+    def test_cancel_timer_on_leave(self):
+        """CircuitBreaker: it should cancel its timer when the circuit leaves
+        the "open" state.
+        """
+        wheel = TimerWheel(tick=0.005)
+        breaker = CircuitBreaker(reset_timeout=10, timer_wheel=wheel)
+        breaker.open()
+        self.assertEqual(1, wheel.pending)
+        breaker.open()
+        self.assertEqual(1, wheel.pending)
+        breaker.close()
+        self.assertEqual(0, wheel.pending)
+
+    def test_stale_timer(self):
+        """CircuitBreaker: it should not half-open a circuit that was closed
+        and reopened before the timer fired.
+        """
+        breaker = CircuitBreaker(reset_timeout=0.1,
+                                 timer_wheel=TimerWheel(tick=0.005))
+        breaker.open()
+        sleep(0.05)
+        breaker.close()
+        breaker.open()
+        sleep(0.08)
+        self.assertEqual('open', breaker.current_state)
+
+
+class EventRingTestCase(unittest.TestCase):
+    """
+    Tests for the EventRing class.
+    """
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(fail_max=2, name='db')
+        self.ring = EventRing(self.breaker, size=4)
+
+    def refuse(self):
+        raise ValueError('connection refused')
+
+    def test_record_events(self):
+        """EventRing: it should record calls and state changes in order.
+        """
+        self.breaker.call(len, [])
+        self.assertRaises(ValueError, self.breaker.call, self.refuse)
+        self.assertRaises(CircuitBreakerError, self.breaker.call, self.refuse)
+
+        events = self.ring.events()
+        self.assertEqual(['success', 'failure', 'state_change', 'failure'],
+                         [event[1] for event in events])
+        self.assertTrue(events[0][2] >= 0)
+        self.assertEqual((None, None), events[0][3:])
+        self.assertEqual(('ValueError', 'connection refused'), events[1][3:])
+        self.assertEqual((None, None, 'closed -> open'), events[2][2:])
+        self.assertTrue(events[0][0] <= events[3][0])
+
+    def test_keep_latest(self):
+        """EventRing: it should keep only the latest events.
+        """
+        for i in range(10):
+            self.breaker.call(len, range(i))
+        self.assertRaises(ValueError, self.breaker.call, self.refuse)
+        kinds = [event[1] for event in self.ring.events()]
+        self.assertEqual(['success'] * 3 + ['failure'], kinds)
+
+        self.ring.clear()
+        self.assertEqual([], self.ring.events())
+
+    def test_rejections(self):
+        """EventRing: it should only record rejected calls if asked to.
+        """
+        ring = EventRing(self.breaker, rejections=True)
+        self.breaker.open()
+        self.assertRaises(CircuitBreakerError, self.breaker.call, len, [])
+        self.assertEqual(['state_change'],
+                         [event[1] for event in self.ring.events()])
+        self.assertEqual(['state_change', 'rejected'],
+                         [event[1] for event in ring.events()])
+
+    def test_stop(self):
+        """EventRing: it should stop recording once stopped.
+        """
+        self.ring.stop()
+        self.breaker.call(len, [])
+        self.assertEqual([], self.ring.events())
+
+    def test_dump(self):
+        """EventRing: it should write one line per event.
+        """
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            from io import StringIO
+        self.breaker.call(len, [])
+        self.assertRaises(ValueError, self.breaker.call, self.refuse)
+        out = StringIO()
+        self.ring.dump(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(' db success ' in lines[0])
+        self.assertTrue(lines[1].endswith('ValueError: connection refused'))
+
+    @unittest.skipIf(not hasattr(signal, 'SIGUSR1'), 'requires SIGUSR1')
+    def test_dump_on_signal(self):
+        """EventRing: it should dump the events to a file on a signal.
+        """
+        from pybreaker.diagnostics import dump_on_signal
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        previous = dump_on_signal(path)
+        try:
+            self.assertRaises(ValueError, self.breaker.call, self.refuse)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            sleep(0.01)
+            with open(path) as f:
+                self.assertTrue('ValueError: connection refused' in f.read())
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+            os.remove(path)
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    """
+    Tests for the RetryPolicy and RetryBudget classes.
+    """
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(fail_max=5)
+        self.budget = RetryBudget(ratio=0.5, max_tokens=2)
+        self.policy = RetryPolicy(backoff=0, budget=self.budget)
+
+    def _flaky(self, failures, exc=NotImplementedError):
+        data = {'calls': 0}
+        def func():
+            data['calls'] += 1
+            if data['calls'] <= failures:
+                raise exc()
+            return data['calls']
+        return func
+
+    def test_retry_until_success(self):
+        """RetryPolicy: it should retry failed calls.
+        """
+        self.assertEqual(3, self.policy.call(self.breaker, self._flaky(2)))
+        self.assertEqual(0, self.breaker.fail_counter)
+
+    def test_max_attempts(self):
+        """RetryPolicy: it should give up after 'max_attempts' attempts.
+        """
+        func = self._flaky(3)
+        self.assertRaises(NotImplementedError, self.policy.call,
+                          self.breaker, func)
+        self.assertEqual(3, self.breaker.fail_counter)
+        self.assertEqual(4, func())
+
+    def test_no_retry_when_not_closed(self):
+        """RetryPolicy: it should not retry calls once the circuit is no
+        longer closed.
+        """
+        func = self._flaky(1)
+        self.breaker.half_open()
+        self.assertRaises(CircuitBreakerError, self.policy.call,
+                          self.breaker, func)
+        self.assertRaises(CircuitBreakerError, self.policy.call,
+                          self.breaker, func)
+        self.assertEqual('open', self.breaker.current_state)
+        self.assertEqual(2, func())
+
+    def test_no_retry_on_excluded_exception(self):
+        """RetryPolicy: it should only retry the 'retry_on' exceptions.
+        """
+        policy = RetryPolicy(backoff=0, budget=self.budget,
+                             retry_on=[IOError])
+        func = self._flaky(1)
+        self.assertRaises(NotImplementedError, policy.call, self.breaker, func)
+        self.assertEqual(2, func())
+
+    def test_retry_budget(self):
+        """RetryPolicy: it should not retry more than the retry budget allows.
+        """
+        breaker = CircuitBreaker(fail_max=10)
+        budget = RetryBudget(ratio=0.5, max_tokens=1)
+        policy = RetryPolicy(backoff=0, budget=budget)
+
+        func = self._flaky(10)
+        self.assertRaises(NotImplementedError, policy.call, breaker, func)
+        self.assertEqual(2, breaker.fail_counter)
+        self.assertEqual(0, budget.tokens)
+
+        # Half a token per first attempt is not enough for another retry
+        self.assertRaises(NotImplementedError, policy.call, breaker, func)
+        self.assertEqual(3, breaker.fail_counter)
+        self.assertEqual(0.5, budget.tokens)
+
+    def test_backoff(self):
+        """RetryPolicy: it should back off exponentially, with jitter.
+        """
+        policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertEqual([1, 2, 4, 5], [policy.backoff(n) for n in range(1, 5)])
+
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        for n in range(100):
+            self.assertTrue(0 <= policy.backoff(3) <= 4)
+
+    def test_default_budget(self):
+        """RetryPolicy: it should share the process-wide budget by default.
+        """
+        self.assertTrue(RetryPolicy().budget is RetryPolicy().budget)
+        self.assertTrue(RetryPolicy().budget is RetryPolicy.default_budget)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio requires Python 3.5+')
+class AsyncioTestCase(unittest.TestCase):
+    """
+    Tests for the asyncio variants.
+    """
+
+    def setUp(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self.breaker = CircuitBreaker(fail_max=2)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _future(self, result=None, exc=None):
+        def func():
+            fut = self.loop.create_future()
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+            return fut
+        return func
+
+    def test_call_async(self):
+        """CircuitBreaker: it should guard coroutines.
+        """
+        run = self.loop.run_until_complete
+        self.assertEqual(1, run(self.breaker.call_async(self._future(1))))
+        self.assertRaises(NotImplementedError, run, self.breaker.call_async(
+            self._future(exc=NotImplementedError())))
+        self.assertEqual(1, self.breaker.fail_counter)
+        self.assertRaises(CircuitBreakerError, run, self.breaker.call_async(
+            self._future(exc=NotImplementedError())))
+        self.assertEqual('open', self.breaker.current_state)
+
+    def test_call_async_failure_predicate(self):
+        """CircuitBreaker: it should apply the failure predicate to the
+        results of coroutines.
+        """
+        self.breaker.failure_predicate = lambda r: r is None
+        run = self.loop.run_until_complete
+        self.assertEqual(None, run(self.breaker.call_async(self._future())))
+        self.assertEqual(1, self.breaker.fail_counter)
+
+    def test_call_async_fallback(self):
+        """CircuitBreaker: it should return the fallback value for rejected
+        coroutines.
+        """
+        breaker = CircuitBreaker(fallback='busy')
+        breaker.open()
+        self.assertEqual('busy', self.loop.run_until_complete(
+            breaker.call_async(self._future(1))))
+
+    def test_decorate_coroutine_function(self):
+        """CircuitBreaker: it should decorate coroutine functions.
+        """
+        import inspect
+        # Defined through exec, as this module must still parse on Python 2
+        namespace = {}
+        exec('async def suc(value):\n    return value\n'
+             'async def err():\n    raise NotImplementedError()',
+             namespace)
+        suc = self.breaker(namespace['suc'])
+        err = self.breaker(namespace['err'])
+        self.assertTrue(inspect.iscoroutinefunction(suc))
+        self.assertEqual('suc', suc.__name__)
+
+        run = self.loop.run_until_complete
+        self.assertEqual(1, run(suc(1)))
+        self.assertRaises(NotImplementedError, run, err())
+        self.assertEqual(1, self.breaker.fail_counter)
+        self.assertEqual(1, run(suc(value=1)))
+        self.assertEqual(0, self.breaker.fail_counter)
+
+    @unittest.skipIf(sys.version_info < (3, 6), 'requires Python 3.6+')
+    def test_decorate_async_generator_function(self):
+        """CircuitBreaker: it should guard the iteration of async generators.
+        """
+        namespace = {}
+        exec('async def suc(n):\n    for i in range(n):\n        yield i\n'
+             'async def err():\n    yield 1\n'
+             '    raise NotImplementedError()\n'
+             'async def collect(agen):\n'
+             '    return [value async for value in agen]',
+             namespace)
+        suc = self.breaker(namespace['suc'])
+        err = self.breaker(namespace['err'])
+        collect = namespace['collect']
+
+        run = self.loop.run_until_complete
+        self.assertRaises(NotImplementedError, run, collect(err()))
+        self.assertEqual(1, self.breaker.fail_counter)
+        self.assertEqual([0, 1, 2], run(collect(suc(3))))
         self.assertEqual(0, self.breaker.fail_counter)
 
+        self.breaker.open()
+        self.assertRaises(CircuitBreakerError, suc, 3)
+
+    @unittest.skipIf(sys.version_info < (3, 6), 'requires Python 3.6+')
+    def test_async_generator_break(self):
+        """CircuitBreaker: it should count an async generator left before it
+        is exhausted neither as a success nor as a failure.
+        """
+        namespace = {}
+        exec('async def gen():\n    yield 1\n    yield 2\n'
+             'async def first(agen):\n'
+             '    async for value in agen:\n'
+             '        return value',
+             namespace)
+        gen = self.breaker(namespace['gen'])
+        first = namespace['first']
+
+        run = self.loop.run_until_complete
+        self.breaker.half_open()
+        self.assertEqual(1, run(first(gen())))
+        self.assertEqual('half-open', self.breaker.current_state)
+        self.assertEqual(0, self.breaker.call(int))
+        self.assertEqual('closed', self.breaker.current_state)
+
+    def test_hedged_call_async(self):
+        """HedgedGroup: it should hedge slow coroutines on another replica.
+        """
+        import asyncio
+        breakers = [CircuitBreaker(), CircuitBreaker()]
+        group = HedgedGroup(zip('ab', breakers), hedge_delay=0.05)
+        delays = {'a': 0.5, 'b': 0}
+        def func(target):
+            return asyncio.sleep(delays[target], result=target)
+
+        run = self.loop.run_until_complete
+        self.assertEqual('b', run(group.call_async(func)))
+        self.assertEqual(0, breakers[0].fail_counter)
+
+        delays['a'] = 0
+        self.assertEqual('a', run(group.call_async(func)))
+
+    def test_trace_call_async(self):
+        """TracingListener: it should record a span for each coroutine.
+        """
+        tracer = InMemoryTracer()
+        self.breaker.add_listener(TracingListener(tracer))
+        self.loop.run_until_complete(self.breaker.call_async(self._future(1)))
+        self.assertEqual('success',
+                         tracer.spans[0].attributes['circuit_breaker.outcome'])
+        self.assertTrue('circuit_breaker.duration' in tracer.spans[0].attributes)
+
+    def test_retry_async(self):
+        """RetryPolicy: it should retry coroutines.
+        """
+        policy = RetryPolicy(backoff=0, budget=RetryBudget())
+        futures = [self._future(exc=IOError()), self._future(2)]
+        def func():
+            return futures.pop(0)()
+
+        run = self.loop.run_until_complete
+        self.assertEqual(2, run(policy.call_async(self.breaker, func)))
+        self.assertEqual(0, self.breaker.fail_counter)
+
+
+
+@unittest.skipIf(futures is None, 'requires concurrent.futures')
+class HedgedGroupTestCase(unittest.TestCase):
+    """
+    Tests for the HedgedGroup class.
+    """
+
+    def setUp(self):
+        self.executor = futures.ThreadPoolExecutor(max_workers=4)
+        self.breakers = [CircuitBreaker(), CircuitBreaker()]
+        self.group = HedgedGroup(zip('ab', self.breakers),
+                                 executor=self.executor, hedge_delay=0.05)
+        self.calls = []
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def _backend(self, delays, failing=''):
+        def func(target):
+            self.calls.append(target)
+            sleep(delays.get(target, 0))
+            if target in failing:
+                raise NotImplementedError()
+            return target
+        return func
+
+    def test_fast_primary(self):
+        """HedgedGroup: it should not hedge calls that return in time.
+        """
+        self.assertEqual('a', self.group.call(self._backend({})))
+        self.assertEqual(['a'], self.calls)
+
+    def test_slow_primary(self):
+        """HedgedGroup: it should hedge slow calls on another replica and
+        return the first result.
+        """
+        class Listener(CircuitBreakerListener):
+            def __init__(self):
+                self.out = ''
+            def success(self, cb):
+                self.out += 'success'
+            def failure(self, cb, exc):
+                self.out += 'failure'
+
+        listener = Listener()
+        self.breakers[0].add_listener(listener)
+        self.assertEqual('b', self.group.call(self._backend({'a': 0.3})))
+        self.assertEqual(['a', 'b'], self.calls)
+
+        # The losing call counts neither as a success nor as a failure
+        sleep(0.35)
+        self.assertEqual('', listener.out)
+
+    def test_failed_primary(self):
+        """HedgedGroup: it should count failures of calls that are not
+        hedged.
+        """
+        func = self._backend({}, failing='a')
+        self.assertRaises(NotImplementedError, self.group.call, func)
+        self.assertEqual(1, self.breakers[0].fail_counter)
+        self.assertEqual(['a'], self.calls)
+
+    def test_skip_open_replicas(self):
+        """HedgedGroup: it should skip replicas whose circuit is open.
+        """
+        self.breakers[0].open()
+        self.assertEqual('b', self.group.call(self._backend({})))
+        self.assertEqual(['b'], self.calls)
+
+        self.breakers[1].open()
+        self.assertRaises(CircuitBreakerError, self.group.call,
+                          self._backend({}))
+
+    def test_release_cancelled_trial_call(self):
+        """HedgedGroup: it should let another trial call through when the
+        losing call was a trial call.
+        """
+        self.breakers[0].half_open()
+        self.assertEqual('b', self.group.call(self._backend({'a': 0.2})))
+        sleep(0.25)
+        self.assertEqual('half-open', self.breakers[0].current_state)
+        self.assertTrue(self.breakers[0].call(lambda: True))
+        self.assertEqual('closed', self.breakers[0].current_state)
+
+    def test_hedge_delay(self):
+        """HedgedGroup: it should derive the hedge delay from the latency
+        percentile of recent calls.
+        """
+        group = HedgedGroup([], initial_delay=0.5, percentile=95, window=100)
+        self.assertEqual(0.5, group.hedge_delay)
+        for n in range(100):
+            group._latency.add(n / 1000.0)
+        self.assertEqual(0.095, group.hedge_delay)
+
+
+
+@unittest.skipIf(futures is None, 'requires concurrent.futures')
+class BreakerExecutorTestCase(unittest.TestCase):
+    """
+    Tests for the BreakerExecutor class.
+    """
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(fail_max=2)
+        self.executor = BreakerExecutor(self.breaker,
+                                        futures.ThreadPoolExecutor(2))
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def _raise(self):
+        raise NotImplementedError()
+
+    def _wait(self, future):
+        """
+        Waits until the done-callbacks of `future` have run.
+        """
+        done = threading.Event()
+        future.add_done_callback(lambda f: done.set())
+        done.wait(5)
+        return future
+
+    def test_success(self):
+        """BreakerExecutor: it should record the success of a call once its
+        future is done.
+        """
+        self.breaker._inc_counter()
+        future = self._wait(self.executor.submit(lambda x: x, 2))
+        self.assertEqual(2, future.result())
+        self.assertEqual(0, self.breaker.fail_counter)
+
+    def test_failure(self):
+        """BreakerExecutor: it should record failures and open the circuit once
+        the threshold is reached.
+        """
+        future = self._wait(self.executor.submit(self._raise))
+        self.assertRaises(NotImplementedError, future.result)
+        self.assertEqual(1, self.breaker.fail_counter)
+
+        self._wait(self.executor.submit(self._raise))
+        self.assertEqual('open', self.breaker.current_state)
+        self.assertRaises(CircuitBreakerError, self.executor.submit, len, [])
+
+    def test_cancel(self):
+        """BreakerExecutor: it should release the trial call of a half-open
+        circuit if its future is cancelled.
+        """
+        self.breaker.half_open()
+        blocker = futures.ThreadPoolExecutor(1)
+        executor = BreakerExecutor(self.breaker, blocker)
+        try:
+            event = threading.Event()
+            executor.executor.submit(event.wait)
+            future = executor.submit(len, [])
+            self.assertRaises(CircuitBreakerError, executor.submit, len, [])
+            self.assertTrue(future.cancel())
+            event.set()
+            self._wait(executor.submit(len, []))
+            self.assertEqual('closed', self.breaker.current_state)
+        finally:
+            event.set()
+            blocker.shutdown()
+
+    def test_map(self):
+        """BreakerExecutor: it should map a function over iterables.
+        """
+        self.assertEqual([1, 4, 9], list(self.executor.map(pow, [1, 2, 3],
+                                                           [2, 2, 2])))
+
+    def test_map_rejected(self):
+        """BreakerExecutor: it should cancel the calls already submitted by
+        map if a later call is rejected.
+        """
+        self.breaker.half_open()
+        blocker = futures.ThreadPoolExecutor(1)
+        executor = BreakerExecutor(self.breaker, blocker)
+        calls = []
+        try:
+            event = threading.Event()
+            executor.executor.submit(event.wait)
+            self.assertRaises(CircuitBreakerError, executor.map,
+                              calls.append, [1, 2])
+            event.set()
+            self._wait(executor.submit(len, []))
+            self.assertEqual([], calls)
+            self.assertEqual('closed', self.breaker.current_state)
+        finally:
+            event.set()
+            blocker.shutdown()
+
+    def test_process_pool(self):
+        """BreakerExecutor: it should record the outcome of calls made in
+        worker processes in the parent's circuit breaker.
+        """
+        executor = BreakerExecutor(self.breaker,
+                                   futures.ProcessPoolExecutor(1))
+        with executor:
+            future = self._wait(executor.submit(pow, 2, 3))
+            self.assertEqual(8, future.result())
+            future = self._wait(executor.submit(pow, 'a', 2))
+            self.assertRaises(TypeError, future.result)
+        self.assertEqual(1, self.breaker.fail_counter)
+
+
+class CircuitBreakerPoolTestCase(unittest.TestCase):
+    """
+    Tests for the CircuitBreakerPool class.
+    """
+
+    def setUp(self):
+        self.breakers = [CircuitBreaker(fail_max=1) for i in range(3)]
+        self.pool = CircuitBreakerPool(zip('abc', self.breakers))
+        self._random = pybreaker.pool._random
+
+    def tearDown(self):
+        pybreaker.pool._random = self._random
+
+    def test_call(self):
+        """CircuitBreakerPool: it should call the function on one of the
+        endpoints.
+        """
+        self.assertTrue(self.pool.call(lambda target: target) in 'abc')
+        self.assertEqual(('a', 'b', 'c'), self.pool.available)
+
+    def test_skip_open_endpoints(self):
+        """CircuitBreakerPool: it should only pick endpoints whose circuit is
+        closed.
+        """
+        def err(target):
+            if target == 'b':
+                raise NotImplementedError()
+            return target
+
+        targets = set()
+        for n in range(100):
+            try:
+                targets.add(self.pool.call(err))
+            except (NotImplementedError, CircuitBreakerError):
+                pass
+        self.assertEqual(set('ac'), targets)
+        self.assertEqual(('a', 'c'), self.pool.available)
+
+        self.breakers[1].close()
+        self.assertEqual(('a', 'c', 'b'), self.pool.available)
+
+        for breaker in self.breakers:
+            breaker.open()
+        self.assertRaises(CircuitBreakerError, self.pool.call, err)
+
+    def test_probe_half_open_endpoints(self):
+        """CircuitBreakerPool: it should only send a probe share of the calls
+        to half-open endpoints.
+        """
+        self.breakers[1].half_open()
+        pybreaker.pool._random = lambda: 0.5
+        for n in range(10):
+            self.assertNotEqual('b', self.pool.call(lambda target: target))
+
+        pybreaker.pool._random = lambda: 0.04
+        self.assertEqual('b', self.pool.call(lambda target: target))
+        self.assertEqual('closed', self.breakers[1].current_state)
+
+    def test_least_loaded_endpoint(self):
+        """CircuitBreakerPool: it should prefer endpoints with fewer calls in
+        flight and lower failure rates.
+        """
+        pool = CircuitBreakerPool(zip('ab', self.breakers))
+        a, b = pool._endpoints
+
+        a.inflight = 5
+        for n in range(10):
+            self.assertEqual('b', pool.call(lambda target: target))
+
+        a.inflight, a.failure_rate = 0, 0.5
+        b.inflight = 2
+        for n in range(10):
+            self.assertEqual('b', pool.call(lambda target: target))
+
+
+class KeyedCircuitBreakerTestCase(unittest.TestCase):
+    """
+    Tests for the KeyedCircuitBreaker class.
+    """
+
+    def setUp(self):
+        self.breaker = KeyedCircuitBreaker(lambda tenant, *args: tenant,
+                                           fail_max=2, max_keys=3)
+
+    def _raise(self, tenant):
+        raise NotImplementedError()
+
+    def test_isolated_keys(self):
+        """KeyedCircuitBreaker: it should open the circuit of the failing key
+        only.
+        """
+        self.assertRaises(NotImplementedError, self.breaker.call,
+                          self._raise, 'a')
+        self.assertEqual(1, self.breaker.fail_counter('a'))
+        self.assertRaises(CircuitBreakerError, self.breaker.call,
+                          self._raise, 'a')
+        self.assertEqual('open', self.breaker.current_state('a'))
+
+        self.assertRaises(CircuitBreakerError, self.breaker.call, len, 'a')
+        self.assertEqual(1, self.breaker.call(len, 'b'))
+        self.assertEqual('closed', self.breaker.current_state('b'))
+
+    def test_success_resets_counter(self):
+        """KeyedCircuitBreaker: it should reset the failure counter of a key
+        after a success.
+        """
+        self.assertRaises(NotImplementedError, self.breaker.call,
+                          self._raise, 'a')
+        self.breaker.call(len, 'a')
+        self.assertEqual(0, self.breaker.fail_counter('a'))
+
+    def test_excluded_exceptions(self):
+        """KeyedCircuitBreaker: it should not count excluded exceptions as
+        failures.
+        """
+        breaker = KeyedCircuitBreaker(lambda tenant: tenant,
+                                      exclude=[NotImplementedError])
+        self.assertRaises(NotImplementedError, breaker.call, self._raise, 'a')
+        self.assertEqual(0, breaker.fail_counter('a'))
+
+    def test_trial_call(self):
+        """KeyedCircuitBreaker: it should let a single trial call through once
+        the timeout elapses, and close or reopen the circuit of the key.
+        """
+        breaker = KeyedCircuitBreaker(lambda tenant, *args: tenant,
+                                      reset_timeout=0.05)
+        breaker.open('a')
+        self.assertRaises(CircuitBreakerError, breaker.call, len, 'a')
+
+        sleep(0.05)
+        self.assertRaises(CircuitBreakerError, breaker.call, self._raise, 'a')
+        self.assertEqual('open', breaker.current_state('a'))
+
+        sleep(0.05)
+        def trial(tenant):
+            self.assertEqual('half-open', breaker.current_state(tenant))
+            self.assertRaises(CircuitBreakerError, breaker.call, len, tenant)
+            return tenant
+        self.assertEqual('a', breaker.call(trial, 'a'))
+        self.assertEqual('closed', breaker.current_state('a'))
+
+    def test_lru_eviction(self):
+        """KeyedCircuitBreaker: it should evict a key that was not used
+        recently once the maximum number of keys is reached.
+        """
+        for tenant in 'abc':
+            self.breaker.open(tenant)
+        self.assertEqual(3, len(self.breaker))
+
+        self.breaker.call(len, 'd')
+        self.assertEqual(3, len(self.breaker))
+        self.assertEqual('closed', self.breaker.current_state('a'))
+        self.assertEqual('open', self.breaker.current_state('b'))
+
+        self.assertRaises(CircuitBreakerError, self.breaker.call, len, 'b')
+        self.breaker.call(len, 'e')
+        self.assertEqual('open', self.breaker.current_state('b'))
+        self.assertEqual('closed', self.breaker.current_state('c'))
+
+    def test_colliding_keys(self):
+        """KeyedCircuitBreaker: it should keep finding the keys whose hashes
+        collide once one of them is evicted.
+        """
+        class Key(object):
+            def __init__(self, hash):
+                self.hash = hash
+
+            def __hash__(self):
+                return self.hash
+
+        # The fourth key goes outside the run of entries of the first three,
+        # so that evicting the first one leaves a gap in that run
+        run = [(self.breaker._home(42) + i) % 8 for i in range(3)]
+        fourth = 0
+        while self.breaker._home(fourth) in run:
+            fourth += 1
+        tenants = [Key(42), Key(42), Key(42), Key(fourth)]
+        for tenant in tenants[:3]:
+            self.breaker.open(tenant)
+        self.breaker.call(lambda tenant: None, tenants[3])
+        self.assertEqual(['closed', 'open', 'open', 'closed'],
+                         [self.breaker.current_state(t) for t in tenants])
+
+    def test_decorator(self):
+        """KeyedCircuitBreaker: it should be a decorator.
+        """
+        @self.breaker
+        def suc(tenant, value):
+            "Docstring"
+            return value
+
+        self.assertEqual('Docstring', suc.__doc__)
+        self.assertEqual(1, suc('a', 1))
+        self.breaker.open('a')
+        self.assertRaises(CircuitBreakerError, suc, 'a', 1)
+        self.assertEqual(1, suc('b', 1))
+
+
+class CompositeCircuitBreakerTestCase(unittest.TestCase):
+    """
+    Tests for the CompositeCircuitBreaker class.
+    """
+
+    def setUp(self):
+        self.hosts = [CircuitBreaker(reset_timeout=0.05) for i in range(4)]
+        self.composite = CompositeCircuitBreaker(self.hosts, threshold=0.5)
+
+    def test_threshold(self):
+        """CompositeCircuitBreaker: it should open once the threshold share of
+        its children is open, and close again when it no longer is.
+        """
+        self.hosts[0].open()
+        self.assertEqual(1, self.composite.open_count)
+        self.assertEqual('closed', self.composite.current_state)
+
+        self.hosts[1].open()
+        self.assertEqual(2, self.composite.open_count)
+        self.assertEqual('open', self.composite.current_state)
+
+        self.hosts[0].close()
+        self.assertEqual(1, self.composite.open_count)
+        self.assertEqual('closed', self.composite.current_state)
+
+    def test_reject_through_closed_children(self):
+        """CompositeCircuitBreaker: it should reject calls through its closed
+        children while open.
+        """
+        self.hosts[0].open()
+        self.hosts[1].open()
+        self.assertRaises(CircuitBreakerError, self.hosts[2].call, lambda: True)
+        self.assertEqual(0, self.hosts[2].fail_counter)
+        self.assertEqual('closed', self.hosts[2].current_state)
+
+        self.hosts[1].close()
+        self.assertTrue(self.hosts[2].call(lambda: True))
+
+    def test_reject_through_throttled_children(self):
+        """CompositeCircuitBreaker: it should reject calls through its
+        throttled children while open.
+        """
+        self.hosts[0].open()
+        self.hosts[1].open()
+        self.hosts[2].throttle()
+        self.assertEqual(0, self.hosts[2].state.reject_probability)
+        self.assertRaises(CircuitBreakerError, self.hosts[2].call, lambda: True)
+
+        self.hosts[1].close()
+        self.assertTrue(self.hosts[2].call(lambda: True))
+
+    def test_add_while_changing(self):
+        """CompositeCircuitBreaker: it should count the open children right
+        when they change state while being added.
+        """
+        import random
+        for n in range(20):
+            hosts = [CircuitBreaker() for i in range(6)]
+            composite = CompositeCircuitBreaker(threshold=0.9)
+            stop = threading.Event()
+
+            def flip():
+                while not stop.is_set():
+                    host = random.choice(hosts)
+                    if random.random() < 0.5:
+                        host.open()
+                    else:
+                        host.close()
+
+            thread = threading.Thread(target=flip)
+            thread.start()
+            try:
+                for host in hosts:
+                    composite.add(host)
+            finally:
+                stop.set()
+                thread.join()
+            self.assertEqual(sum(1 for host in hosts
+                                 if host.current_state == 'open'),
+                             composite.open_count)
+
+    def test_recovery(self):
+        """CompositeCircuitBreaker: it should let the trial calls of its open
+        children through, and close once they succeed.
+        """
+        self.hosts[0].open()
+        self.hosts[1].open()
+        sleep(0.05)
+        self.assertTrue(self.hosts[0].call(lambda: True))
+        self.assertEqual('closed', self.composite.current_state)
+
+    def test_hierarchy(self):
+        """CompositeCircuitBreaker: it should propagate state changes up the
+        hierarchy and reject calls at the highest open level.
+        """
+        self.hosts = [CircuitBreaker() for i in range(4)]
+        rack_a = CompositeCircuitBreaker(self.hosts[:2], name='rack-a')
+        rack_b = CompositeCircuitBreaker(self.hosts[2:], name='rack-b')
+        dc = CompositeCircuitBreaker([rack_a, rack_b], name='dc')
+        self.assertTrue(rack_a.parent is dc)
+        self.assertTrue(self.hosts[0].parent is rack_a)
+
+        self.hosts[0].open()
+        self.assertEqual('open', rack_a.current_state)
+        self.assertEqual('open', dc.current_state)
+        try:
+            self.hosts[1].call(lambda: True)
+            self.fail('CircuitBreakerError not raised')
+        except CircuitBreakerError as e:
+            self.assertTrue('dc' in str(e))
+        self.assertRaises(CircuitBreakerError, self.hosts[3].call, lambda: True)
+
+        self.hosts[0].close()
+        self.assertEqual('closed', dc.current_state)
+        self.assertTrue(self.hosts[3].call(lambda: True))
+
+    def test_single_parent(self):
+        """CompositeCircuitBreaker: it should not add a child that belongs to
+        another composite circuit breaker.
+        """
+        self.assertRaises(ValueError, CompositeCircuitBreaker, self.hosts[:1])
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'requires PEP 562')
+class LazyImportTestCase(unittest.TestCase):
+    """
+    Tests for the lazy import of the optional subsystems.
+    """
+
+    def _imported_by(self, code):
+        import os, subprocess
+        script = ('import sys; before = set(sys.modules); %s; '
+                  'print(" ".join(set(sys.modules) - before))' % code)
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=os.path.dirname(__file__) or '.')
+        return set(output.decode().split())
+
+    def test_core_import(self):
+        """LazyImport: it should not import the optional subsystems, nor
+        the heavier standard library modules, along with the core.
+        """
+        imported = self._imported_by('import pybreaker')
+        self.assertTrue('pybreaker' in imported)
+        for name in imported:
+            self.assertFalse(name.startswith('pybreaker.'), name)
+        for name in ('random', 'datetime', 'asyncio', 'concurrent.futures'):
+            self.assertFalse(name in imported, name)
+
+    def test_lazy_attribute(self):
+        """LazyImport: it should import a subsystem on first access.
+        """
+        imported = self._imported_by('import pybreaker; pybreaker.RetryPolicy')
+        self.assertTrue('pybreaker.retry' in imported)
+        self.assertFalse('pybreaker.hedging' in imported)
+        self.assertTrue(pybreaker.RetryPolicy is pybreaker.retry.RetryPolicy)
+        self.assertRaises(AttributeError, getattr, pybreaker, 'NoSuchName')
+
 
 import threading
 from types import MethodType
@@ -656,3 +2727,148 @@ class CircuitBreakerThreadsTestCase(unittest.TestCase):
         self.breaker.add_listener(SleepListener())
         self._start_threads(trigger_error, 3)
         self.assertEqual(self.breaker.fail_max, self.breaker.fail_counter)
+
+
+class CircuitBreakerStressTestCase(unittest.TestCase):
+    """
+    Stress tests meant to catch races that only show up when threads actually
+    run in parallel, e.g. on free-threaded CPython builds. They should pass on
+    interpreters with and without a GIL.
+    """
+
+    threads = 16
+
+    def _start_threads(self, target, n):
+        """
+        Starts `n` threads that calls `target` and waits for them to finish.
+        Returns the unexpected exceptions raised by `target`.
+        """
+        errors = []
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for i in range(n)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        return errors
+
+    def test_calls_run_in_parallel(self):
+        """CircuitBreaker: it should not hold its lock while the guarded
+        operation runs.
+        """
+        breaker = CircuitBreaker()
+        cond = threading.Condition()
+        data = {'inside': 0}
+
+        def wait_for_all():
+            with cond:
+                data['inside'] += 1
+                cond.notify_all()
+                while data['inside'] < self.threads:
+                    cond.wait(5)
+                return data['inside']
+
+        errors = self._start_threads(lambda: breaker.call(wait_for_all),
+                                     self.threads)
+        self.assertEqual([], errors)
+        self.assertEqual(self.threads, data['inside'])
+
+    def test_outcomes_under_load(self):
+        """CircuitBreaker: it should record every outcome exactly once under
+        concurrent load.
+        """
+        class CountListener(CircuitBreakerListener):
+            def __init__(self):
+                self.successes = self.failures = 0
+            def success(self, cb):
+                self.successes += 1
+            def failure(self, cb, exc):
+                self.failures += 1
+
+        listener = CountListener()
+        breaker = CircuitBreaker(fail_max=10 ** 6, listeners=[listener])
+
+        def suc(): return True
+        def err(): raise NotImplementedError()
+
+        def trigger():
+            for n in range(500):
+                if n % 3:
+                    breaker.call(suc)
+                else:
+                    try: breaker.call(err)
+                    except NotImplementedError: pass
+                    breaker.call_future(None)
+                    breaker.handle_error(Exception())
+
+        self.assertEqual([], self._start_threads(trigger, self.threads))
+        self.assertEqual(self.threads * 333, listener.successes)
+        self.assertEqual(self.threads * 167 * 2, listener.failures)
+        self.assertEqual('closed', breaker.current_state)
+
+    def test_state_changes_under_load(self):
+        """CircuitBreaker: it should swap states atomically while calls are
+        going through.
+        """
+        class StateListener(CircuitBreakerListener):
+            def __init__(self):
+                self.changes = []
+            def state_change(self, cb, old_state, new_state):
+                self.changes.append((old_state, new_state))
+
+        listener = StateListener()
+        breaker = CircuitBreaker(fail_max=5, reset_timeout=0,
+                                 listeners=[listener])
+
+        def call():
+            for n in range(300):
+                try:
+                    if n % 2:
+                        breaker.call(lambda: True)
+                    else:
+                        breaker.call(lambda: 1 / 0)
+                except (CircuitBreakerError, ZeroDivisionError):
+                    pass
+                if n % 50 == 0:
+                    breaker.open()
+                elif n % 50 == 25:
+                    breaker.close()
+
+        self.assertEqual([], self._start_threads(call, self.threads))
+
+        # Every transition starts from the state the previous one ended in
+        for previous, current in zip(listener.changes, listener.changes[1:]):
+            self.assertTrue(previous[1] is current[0])
+        self.assertTrue(listener.changes[-1][1] is breaker.state)
+
+    def test_single_trial_call_under_load(self):
+        """CircuitBreaker: it should let a single trial call through when the
+        circuit is half-open, even when calls run in parallel.
+        """
+        breaker = CircuitBreaker()
+        breaker.half_open()
+        release = threading.Event()
+        data = {'calls': 0, 'rejected': 0}
+        lock = threading.Lock()
+
+        def trial():
+            with lock:
+                data['calls'] += 1
+            release.wait(5)
+            return True
+
+        def call():
+            try:
+                breaker.call(trial)
+            except CircuitBreakerError:
+                with lock:
+                    data['rejected'] += 1
+                    if data['rejected'] == self.threads - 1:
+                        release.set()
+
+        self.assertEqual([], self._start_threads(call, self.threads))
+        self.assertEqual(1, data['calls'])
+        self.assertEqual(self.threads - 1, data['rejected'])
+        self.assertEqual('closed', breaker.current_state)